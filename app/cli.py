@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from app.core.search_index import rebuild_index
+from app.core.indexes import ensure_indexes, check_route_queries
+from app.core.usage import backfill_rollups
+from app.core.folders import rebuild_folder_counts
+from app.core.facets import rebuild_facets
+from app.core.similarity import backfill_signatures
+from app.core.content import migrate_content, tier_content
+from app.core.seed import demo_tokens, seed_demo
+from app.core.audit_store import migrate_legacy, prune_partitions
+from app.core.utils import dedupe_tags
+from app.config import settings
+
+# Maintenance commands: python -m app.cli <command>
+
+
+async def _reindex(args) -> None:
+    n = await rebuild_index(batch_size=args.batch_size)
+    print(f"Indexed {n} documents")
+
+
+async def _ensure_indexes(args) -> None:
+    await ensure_indexes()
+    print("Indexes ensured")
+
+
+async def _dedupe_tags(args) -> None:
+    n = await dedupe_tags()
+    print(f"Merged away {n} duplicate tags")
+
+
+async def _check_indexes(args) -> None:
+    if args.ensure:
+        await ensure_indexes()
+    report = await check_route_queries()
+    for row in report:
+        flag = "COLLSCAN" if row["collscan"] else "ok"
+        print(f"{flag:9} {row['collection']:16} {row['route']}  [{', '.join(row['stages'])}]")
+    if any(row["collscan"] for row in report):
+        sys.exit(1)
+
+
+async def _backfill_usage(args) -> None:
+    n = await backfill_rollups(batch_size=args.batch_size)
+    print(f"Wrote {n} usage rollups")
+
+
+async def _reconcile_folders(args) -> None:
+    n = await rebuild_folder_counts()
+    print(f"Rebuilt {n} folder counts")
+
+
+async def _rebuild_facets(args) -> None:
+    n = await rebuild_facets(batch_size=args.batch_size)
+    print(f"Indexed tag membership of {n} documents")
+
+
+async def _backfill_signatures(args) -> None:
+    n = await backfill_signatures(batch_size=args.batch_size)
+    print(f"Signed {n} documents")
+
+
+async def _migrate_content(args) -> None:
+    chunks, docs = await migrate_content(batch_size=args.batch_size)
+    print(f"Compressed {chunks} chunks, moved {docs} inline bodies to the content store")
+
+
+async def _tier_content(args) -> None:
+    n = await tier_content(datetime.utcnow() - timedelta(days=args.older_than_days), batch_size=args.batch_size)
+    print(f"Moved {n} bodies to the cold tier")
+
+
+async def _seed(args) -> None:
+    print("Seeded demo data" if await seed_demo() else "Demo data already seeded")
+    for role, token in demo_tokens().items():
+        print(f"{role} token (use as Bearer): {token}")
+
+
+async def _prune_audit(args) -> None:
+    dropped = await prune_partitions(args.keep_months)
+    print(f"Dropped {len(dropped)} audit partitions" + (f": {', '.join(dropped)}" if dropped else ""))
+
+
+async def _migrate_audit(args) -> None:
+    n = await migrate_legacy(batch_size=args.batch_size)
+    print(f"Copied {n} audit entries into monthly partitions")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="DocFlow maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="write the demo user's folders and documents (once)")
+    p.set_defaults(func=_seed)
+
+    p = sub.add_parser("reindex", help="rebuild the full-text search index from all documents")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=_reindex)
+
+    p = sub.add_parser("ensure-indexes", help="create all indexes declared in app.core.indexes")
+    p.set_defaults(func=_ensure_indexes)
+
+    p = sub.add_parser("dedupe-tags", help="merge tags sharing an owner and name, so owner_name_unique can be built")
+    p.set_defaults(func=_dedupe_tags)
+
+    p = sub.add_parser("check-indexes", help="explain() every route query; exit 1 on any COLLSCAN")
+    p.add_argument("--ensure", action="store_true", help="ensure indexes before checking")
+    p.set_defaults(func=_check_indexes)
+
+    p = sub.add_parser("backfill-usage", help="rebuild per-user monthly usage rollups from the usages history; "
+                                               "run with actions stopped")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=_backfill_usage)
+
+    p = sub.add_parser("reconcile-folders", help="rebuild folder_counts from primary document_tags links")
+    p.set_defaults(func=_reconcile_folders)
+
+    p = sub.add_parser("rebuild-facets", help="reassign document ordinals and rebuild tag_members from document_tags; "
+                                              "run with uploads and actions stopped")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=_rebuild_facets)
+
+    p = sub.add_parser("backfill-signatures", help="compute near-duplicate signatures for documents without one")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=_backfill_signatures)
+
+    p = sub.add_parser("migrate-content", help="compress stored bodies and move long inline ones to document_chunks")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=_migrate_content)
+
+    p = sub.add_parser("tier-content", help="move bodies of old documents to the cold tier (CONTENT_COLD_DIR)")
+    p.add_argument("--older-than-days", type=int, default=settings.CONTENT_COLD_AFTER_DAYS)
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=_tier_content)
+
+    p = sub.add_parser("prune-audit", help="drop monthly audit partitions past the retention window")
+    p.add_argument("--keep-months", type=int, default=settings.AUDIT_RETENTION_MONTHS)
+    p.set_defaults(func=_prune_audit)
+
+    p = sub.add_parser("migrate-audit", help="copy the legacy audit_logs collection into monthly partitions")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(func=_migrate_audit)
+
+    args = parser.parse_args(argv)
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
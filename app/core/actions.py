@@ -0,0 +1,194 @@
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.db import db, get_client
+from app.schemas import ActionRunIn, ActionScope, CurrentUser
+from app.core.utils import mock_processor, new_id, find_or_create_tag, log_audit
+from app.core.search_index import index_many, term_counts
+from app.core.scope import iter_scope
+from app.core.usage import record_usage, refund_usage
+from app.core.folders import bump_folders
+from app.core.content import ContentWriter, read_samples
+from app.core.cache import bump_versions
+from app.core.facets import add_members, assign_ordinals, remove_members
+
+# Scoped action execution, shared by the synchronous route and the job workers.
+
+ACTION_CREDITS = 5
+SAMPLE_LEN = 200
+
+# only the sample is projected; inline bodies are cut down server side
+CONTEXT_PROJECTION = {
+    "filename": 1,
+    "chunked": 1,
+    "tier": 1,
+    "codec": 1,
+    "linked": 1,
+    "duplicate_of": 1,
+    "sample": {"$substrCP": [{"$ifNull": ["$text_content", ""]}, 0, SAMPLE_LEN]},
+}
+
+
+async def iter_context(user: CurrentUser, scope: ActionScope) -> AsyncIterator[list[dict]]:
+    async for batch in iter_scope(user, scope.type, scope.name, scope.ids, projection=CONTEXT_PROJECTION,
+                                  batch_size=settings.ACTION_BATCH_SIZE):
+        # copies stored as links take the original's sample
+        linked = {d["duplicate_of"] for d in batch if d.get("linked")}
+        originals = {d["_id"]: d for d in await db.documents.aggregate([
+            {"$match": {"_id": {"$in": list(linked)}}}, {"$project": CONTEXT_PROJECTION}]).to_list(None)} if linked else {}
+        chunked = await read_samples([d for d in (*batch, *originals.values()) if d.get("chunked")], SAMPLE_LEN)
+
+        def sample(d):
+            if d.get("linked"):
+                d = originals.get(d["duplicate_of"], {"_id": None})
+            return chunked.get(d["_id"], d.get("sample", ""))
+
+        yield [{"id": d["_id"], "title": d["filename"], "sample": sample(d)} for d in batch]
+
+
+def _run_id(user: CurrentUser, request_key: str) -> str:
+    return f"action:{user.id}:{request_key}"
+
+
+async def _replay(user: CurrentUser, request_key: Optional[str]) -> Optional[dict]:
+    if not request_key:
+        return None
+    row = await db.usages.find_one({"_id": _run_id(user, request_key)}, {"result": 1})
+    return row["result"] if row else None
+
+
+async def run_action(user: CurrentUser, body: ActionRunIn, request_key: Optional[str] = None) -> dict:
+    # a repeated request_key returns the first run's result without running or charging again
+    replayed = await _replay(user, request_key)
+    if replayed is not None:
+        return replayed
+
+    scope = body.scope
+    # outputs are written while the scope streams through the processor
+    text_out = ContentWriter(new_id()) if 'make_document' in body.actions else None
+    csv_out = ContentWriter(new_id()) if 'make_csv' in body.actions else None
+    writers = [w for w in (text_out, csv_out) if w]
+    try:
+        processed = await mock_processor(scope.model_dump(), iter_context(user, scope), text_out, csv_out)
+    except BaseException:
+        for writer in writers:
+            await writer.discard()
+        raise
+
+    now = datetime.utcnow()
+    outputs = []
+    if text_out:
+        outputs.append(("document", text_out, {
+            "_id": text_out.document_id, "owner_id": user.id, "filename": f"generated_{int(now.timestamp())}.md",
+            "mime": "text/markdown", **processed['text'], "created_at": now}))
+    if csv_out:
+        outputs.append(("csv", csv_out, {
+            "_id": csv_out.document_id, "owner_id": user.id, "filename": f"result_{int(now.timestamp())}.csv",
+            "mime": "text/csv", **processed['csv'], "created_at": now}))
+    created = [{"type": kind, "id": doc["_id"]} for kind, _, doc in outputs]
+    result = {"created": created, "credits_charged": ACTION_CREDITS}
+
+    try:
+        await commit_action(user, outputs, result, request_key)
+    except DuplicateKeyError:
+        # a concurrent request with the same key committed first; everything of ours is undone
+        for writer in writers:
+            await writer.discard()
+        replayed = await _replay(user, request_key)
+        if replayed is None:
+            raise
+        return replayed
+    except BaseException:
+        for writer in writers:
+            await writer.discard()
+        raise
+    await log_audit(user.id, 'actions.run', 'Action', None, {"scope": scope.model_dump(), "created": created})
+    return result
+
+
+async def commit_action(user: CurrentUser, outputs: list[tuple], result: dict, request_key: Optional[str]) -> None:
+    # outputs: (kind, writer, document). The usage row is the run record: it is written with
+    # the result, under the request key when there is one, so charge and replay record are one write.
+    docs = [doc for _, _, doc in outputs]
+    postings = [(user.id, doc["_id"], writer.terms.counts + term_counts(doc["filename"])) for _, writer, doc in outputs]
+    usage_id = _run_id(user, request_key) if request_key else None
+    usage = {"result": result}
+
+    if settings.ACTION_TRANSACTIONS:
+        # all or nothing (needs a replica set); the session runs its writes one after another
+        async def write_all(session):
+            tag = await find_or_create_tag(user.id, 'generated', session=session)
+            if docs:
+                await db.documents.insert_many(docs, session=session)
+                await db.document_tags.insert_many(_links(docs, tag), session=session)
+                await index_many(postings, session=session)
+                await bump_folders({(user.id, 'generated'): len(docs)}, session=session)
+                first = await assign_ordinals(user.id, len(docs), session=session)
+                await add_members(user.id, _members(docs, first), session=session)
+            await record_usage(user.id, ACTION_CREDITS, usage_id=usage_id, extra=usage, session=session)
+
+        async with await get_client().start_session() as session:
+            await session.with_transaction(write_all)
+        await bump_versions(user.id)
+        return
+
+    # two concurrent rounds (3 round trips: the charge is an insert then a rollup $inc):
+    # outputs, postings and the tag first, then links, counts and the charge, so the charge
+    # is never written before the outputs it pays for. A failure in either round undoes the
+    # round-1 writes before the caller discards the bodies they point to.
+    usage_id = usage_id or new_id()
+    tag, first, inserted, indexed = await asyncio.gather(find_or_create_tag(user.id, 'generated'),
+                                                         assign_ordinals(user.id, len(docs)) if docs else _noop(),
+                                                         db.documents.insert_many(docs) if docs else _noop(),
+                                                         index_many(postings),
+                                                         return_exceptions=True)
+    failed = [r for r in (tag, first, inserted, indexed) if isinstance(r, BaseException)]
+    if failed:
+        await _undo(user, docs, [], [], {})
+        raise failed[0]
+    links = _links(docs, tag)
+    members = _members(docs, first)
+    folders = {(user.id, 'generated'): len(docs)}
+    results = await asyncio.gather(
+        record_usage(user.id, ACTION_CREDITS, usage_id=usage_id, extra=usage),
+        db.document_tags.insert_many(links) if links else _noop(),
+        add_members(user.id, members),
+        bump_folders(folders),
+        bump_versions(user.id),
+        return_exceptions=True,
+    )
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        charge, counted = results[0], not isinstance(results[3], BaseException)
+        # a failed bump_folders may have applied in part: see reconcile-folders
+        await _undo(user, docs, links, members, folders if counted else {})
+        if not isinstance(charge, BaseException):
+            await refund_usage(charge)
+        elif not isinstance(charge, DuplicateKeyError):
+            # the usage row may be in while its rollups are not; a duplicate key is the winner's row
+            await db.usages.delete_one({"_id": usage_id})
+        raise failed[0]
+
+
+def _links(docs: list[dict], tag: dict) -> list[dict]:
+    return [{"_id": new_id(), "document_id": d["_id"], "tag_id": tag["_id"], "is_primary": True} for d in docs]
+
+
+def _members(docs: list[dict], first: Optional[int]) -> list[tuple]:
+    return [(first + i, d["_id"], 'generated', []) for i, d in enumerate(docs)]
+
+
+async def _undo(user: CurrentUser, docs: list[dict], links: list[dict], members: list[tuple], folders: dict) -> None:
+    ids = [d["_id"] for d in docs]
+    if ids:
+        await asyncio.gather(db.documents.delete_many({"_id": {"$in": ids}}),
+                             db.search_postings.delete_many({"document_id": {"$in": ids}}),
+                             db.document_tags.delete_many({"_id": {"$in": [link["_id"] for link in links]}}),
+                             remove_members(user.id, members),
+                             bump_folders({key: -n for key, n in folders.items()}))
+
+
+async def _noop() -> None:
+    return None
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from app.config import settings
+from app.core.audit_store import insert_entries
+
+# Buffered audit writer: entries are queued in memory and written to their monthly partition
+# once AUDIT_BATCH_SIZE entries are waiting or AUDIT_FLUSH_INTERVAL has passed.
+# A full queue blocks submitters (backpressure) rather than dropping entries.
+# Callers that must know the entry is stored call write_audit(..., durable=True) (or run with
+# AUDIT_DURABILITY=sync) and get the flush result.
+
+log = logging.getLogger(__name__)
+
+
+class AuditSink:
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int, retries: int = 3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "queued": 0, "written": 0, "failed": 0, "flushes": 0,
+            "flush_seconds_total": 0.0, "flush_seconds_max": 0.0, "last_flush_seconds": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, entries: list[dict], wait: bool = False) -> None:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for entry in entries:
+            fut = loop.create_future() if wait else None
+            await self._queue.put((entry, fut))
+            self.stats["queued"] += 1
+            if fut:
+                futures.append(fut)
+        if futures:
+            await asyncio.gather(*futures)
+
+    async def stop(self) -> None:
+        # drain whatever is queued, then stop
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+        # anything submitted after the stop marker
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                await self._flush([item])
+
+    async def _flush(self, batch: list[tuple[dict, Optional[asyncio.Future]]]) -> None:
+        entries = [entry for entry, _ in batch]
+        start = time.perf_counter()
+        error = None
+        for attempt in range(self.retries):
+            try:
+                await insert_entries(entries)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        elapsed = time.perf_counter() - start
+        self.stats["flushes"] += 1
+        self.stats["last_flush_seconds"] = elapsed
+        self.stats["flush_seconds_total"] += elapsed
+        self.stats["flush_seconds_max"] = max(self.stats["flush_seconds_max"], elapsed)
+        if error is None:
+            self.stats["written"] += len(entries)
+        else:
+            self.stats["failed"] += len(entries)
+            log.error("audit flush of %d entries failed: %s", len(entries), error)
+        for _, fut in batch:
+            if fut and not fut.done():
+                if error is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(error)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "queue_depth": self.queue_depth(), "running": self.running}
+
+
+sink: Optional[AuditSink] = None
+
+
+async def start_audit_sink() -> None:
+    global sink
+    if sink is None:
+        sink = AuditSink(settings.AUDIT_BATCH_SIZE, settings.AUDIT_FLUSH_INTERVAL, settings.AUDIT_MAX_QUEUE)
+    sink.start()
+
+
+async def stop_audit_sink() -> None:
+    global sink
+    if sink is not None:
+        await sink.stop()
+        sink = None
+
+
+async def write_audit(entries: list[dict], durable: Optional[bool] = None) -> None:
+    # durable=None follows AUDIT_DURABILITY; without a running sink entries are written directly
+    if not entries:
+        return
+    if durable is None:
+        durable = settings.AUDIT_DURABILITY == "sync"
+    if sink is not None and sink.running:
+        await sink.submit(entries, wait=durable)
+    else:
+        await insert_entries(entries)
@@ -0,0 +1,152 @@
+import base64
+import json
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+from app.db import db
+
+# Audit storage, partitioned by month: entries for 2025-11 live in audit_logs_202511.
+# Retention drops whole partitions, and every partition carries the same indexes, all
+# ending in (at, _id) so they serve the keyset order used for pagination.
+
+PREFIX = "audit_logs_"
+PARTITION_RE = re.compile(rf"^{PREFIX}(\d{{6}})$")
+
+PARTITION_INDEXES = [
+    IndexModel([("at", DESCENDING), ("_id", DESCENDING)], name="at_id"),
+    IndexModel([("userId", ASCENDING), ("at", DESCENDING), ("_id", DESCENDING)], name="user_at_id"),
+    IndexModel([("action", ASCENDING), ("at", DESCENDING), ("_id", DESCENDING)], name="action_at_id"),
+    IndexModel([("entityType", ASCENDING), ("entityId", ASCENDING), ("at", DESCENDING), ("_id", DESCENDING)],
+               name="entity_at_id"),
+]
+
+_ensured: set[str] = set()
+
+
+def partition_name(at: datetime) -> str:
+    return f"{PREFIX}{at:%Y%m}"
+
+
+async def ensure_partition(name: str) -> None:
+    if name not in _ensured:
+        await db[name].create_indexes(PARTITION_INDEXES)
+        _ensured.add(name)
+
+
+async def insert_entries(entries: list[dict]) -> None:
+    by_partition: dict[str, list[dict]] = {}
+    for entry in entries:
+        by_partition.setdefault(partition_name(entry["at"]), []).append(entry)
+    for name, rows in by_partition.items():
+        await ensure_partition(name)
+        try:
+            await db[name].insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            # entries carry their own _id, so a retried batch only hits duplicates
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+
+async def list_partitions() -> list[str]:
+    # newest first
+    names = await db.list_collection_names(filter={"name": {"$regex": PARTITION_RE.pattern}})
+    return sorted(names, reverse=True)
+
+
+# Keyset cursor over (at, _id), newest first
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps({"at": row["at"].isoformat(), "id": row["_id"]}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # stored `at` values are naive UTC; offset-aware inputs are converted to match
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return naive_utc(datetime.fromisoformat(data["at"])), data["id"]
+
+
+def build_filter(user_id: Optional[str] = None, action: Optional[str] = None, entity_type: Optional[str] = None,
+                 entity_id: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 after: Optional[tuple[datetime, str]] = None) -> dict:
+    query: dict = {}
+    if user_id is not None:
+        query["userId"] = user_id
+    if action is not None:
+        query["action"] = action
+    if entity_type is not None:
+        query["entityType"] = entity_type
+    if entity_id is not None:
+        query["entityId"] = entity_id
+    at: dict = {}
+    if since is not None:
+        at["$gte"] = since
+    if until is not None:
+        at["$lt"] = until
+    if at:
+        query["at"] = at
+    if after is not None:
+        after_at, after_id = after
+        keyset = {"$or": [{"at": {"$lt": after_at}}, {"at": after_at, "_id": {"$lt": after_id}}]}
+        query = {"$and": [query, keyset]} if query else keyset
+    return query
+
+
+async def iter_entries(query: dict, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       after: Optional[tuple[datetime, str]] = None, limit: Optional[int] = None,
+                       projection: Optional[dict] = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+    # walks the partitions newest first, skipping months outside [since, until] / after the cursor
+    newest = min(filter(None, [until, after[0] if after else None]), default=None)
+    remaining = limit
+    for name in await list_partitions():
+        month = PARTITION_RE.match(name).group(1)
+        if newest is not None and month > f"{newest:%Y%m}":
+            continue
+        if since is not None and month < f"{since:%Y%m}":
+            break
+        cursor = db[name].find(query, projection).sort([("at", DESCENDING), ("_id", DESCENDING)]).batch_size(batch_size)
+        if remaining is not None:
+            cursor = cursor.limit(remaining)
+        async for row in cursor:
+            yield row
+            if remaining is not None:
+                remaining -= 1
+        if remaining is not None and remaining <= 0:
+            return
+
+
+async def prune_partitions(keep_months: int, now: Optional[datetime] = None) -> list[str]:
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (keep_months - 1)
+    oldest_kept = f"{index // 12:04d}{index % 12 + 1:02d}"
+    dropped = []
+    for name in await list_partitions():
+        if PARTITION_RE.match(name).group(1) < oldest_kept:
+            await db.drop_collection(name)
+            _ensured.discard(name)
+            dropped.append(name)
+    return dropped
+
+
+async def migrate_legacy(batch_size: int = 1000) -> int:
+    # copy the unpartitioned audit_logs collection into monthly partitions; safe to re-run
+    moved = 0
+    batch = []
+    async for row in db.audit_logs.find({}).batch_size(batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await insert_entries(batch)
+            moved += len(batch)
+            batch = []
+    if batch:
+        await insert_entries(batch)
+        moved += len(batch)
+    return moved
@@ -1,29 +1,122 @@
 import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
 from fastapi import Depends, Request, HTTPException
-from jose import jwt
+from jose import JWTError
+from app.config import settings
 from app.schemas import CurrentUser
 
-# Decode token accepting either unsigned JWT or base64 JSON (for dev convenience)
+# Token verification
+# - JWTs are verified against JWT_SECRET (HS*) or JWT_PUBLIC_KEY (RS*/ES*).
+# - With AUTH_ALLOW_UNSIGNED (dev default) unsigned JWTs and base64 JSON tokens are
+#   accepted too, and JWTs are only verified when a key is configured.
+# Verified users are cached per token hash, bounded by size and TTL and never past `exp`.
+
+
+def _verification_key() -> Optional[str]:
+    if any(alg.startswith("HS") for alg in settings.JWT_ALGORITHMS):
+        return settings.JWT_SECRET or None
+    return settings.JWT_PUBLIC_KEY or None
+
+
 def _decode_token(token: str) -> dict:
     try:
         if token.count('.') == 2:
-            return jwt.get_unverified_claims(token)
-        data = base64.b64decode(token).decode()
-        import json
-        return json.loads(data)
-    except Exception as e:
+            # jose.jwt pulls in the crypto backends; it is loaded by the first JWT, not at startup
+            from jose import jwt
+            key = _verification_key()
+            if key:
+                return jwt.decode(token, key, algorithms=settings.JWT_ALGORITHMS, options={"verify_aud": False})
+            if not settings.AUTH_ALLOW_UNSIGNED:
+                raise HTTPException(401, "Token verification is not configured")
+            claims = jwt.get_unverified_claims(token)
+        elif settings.AUTH_ALLOW_UNSIGNED:
+            claims = json.loads(base64.b64decode(token).decode())
+        else:
+            raise HTTPException(401, "Unsigned tokens are not accepted")
+    except HTTPException:
+        raise
+    except (JWTError, ValueError) as e:
         raise HTTPException(401, f"Invalid token: {e}")
+    if not isinstance(claims, dict):
+        raise HTTPException(401, "Bad token claims")
+    exp = claims.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp <= time.time()):
+        raise HTTPException(401, "Token expired")
+    return claims
 
-async def get_current_user(req: Request) -> CurrentUser:
-    authz = req.headers.get("Authorization") or req.headers.get("authorization")
-    if not authz or not authz.startswith("Bearer "):
-        raise HTTPException(401, "Missing bearer token")
-    token = authz[len("Bearer ") :].strip()
-    claims = _decode_token(token)
+
+def _user_from_claims(claims: dict) -> CurrentUser:
     for key in ("sub","email","role"):
         if key not in claims:
             raise HTTPException(401, "Bad token claims")
-    return CurrentUser(id=claims["sub"], email=claims["email"], role=claims["role"])
+    try:
+        return CurrentUser(id=claims["sub"], email=claims["email"], role=claims["role"])
+    except ValueError:
+        raise HTTPException(401, "Bad token claims")
+
+
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[bytes, tuple[CurrentUser, float]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        user, expires = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+
+    def put(self, token: str, user: CurrentUser, exp: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if exp is None else min(self.ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        key = self._key(token)
+        self._entries[key] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+
+def resolve_token(token: str) -> CurrentUser:
+    user = token_cache.get(token)
+    if user is None:
+        claims = _decode_token(token)
+        user = _user_from_claims(claims)
+        token_cache.put(token, user, claims.get("exp"))
+    return user
+
+
+async def get_current_user(req: Request) -> CurrentUser:
+    authz = req.headers.get("Authorization")
+    if not authz or not authz.startswith("Bearer "):
+        raise HTTPException(401, "Missing bearer token")
+    return resolve_token(authz[len("Bearer ") :].strip())
 
 # RBAC helpers
 
@@ -36,4 +129,4 @@ def require_role(allowed: list[str]):
 
 def write_guard(user: CurrentUser):
     if user.role in ("support","moderator"):
-        raise HTTPException(403, "Read-only role")
\ No newline at end of file
+        raise HTTPException(403, "Read-only role")
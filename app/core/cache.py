@@ -0,0 +1,97 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from fastapi import Request, Response
+from pymongo import UpdateOne
+from app.config import settings
+from app.schemas import CurrentUser
+from app.db import db
+from app.core.fastjson import dumps
+
+# Response cache for the dashboard reads (folders, metrics, folder listings).
+# Every tenant has a version counter in `cache_versions`, and ALL_TENANTS has one for the
+# admin-wide views. Writes bump the writer's counter and ALL_TENANTS; a cached body is only
+# served while the counter it was computed under is still current, so all workers see an
+# upload at once. TTL bounds what the counters don't cover (day/month rollover, maintenance
+# commands). Bodies are kept serialized, with an ETag for If-None-Match -> 304.
+
+ALL_TENANTS = "*"
+
+
+def tenant_of(user: CurrentUser) -> str:
+    # admin views are cached separately from per-user views
+    return ALL_TENANTS if user.role == 'admin' else user.id
+
+
+async def bump_versions(*tenants: str) -> None:
+    ops = [UpdateOne({"_id": t}, {"$inc": {"v": 1}}, upsert=True) for t in {*tenants, ALL_TENANTS}]
+    await db.cache_versions.bulk_write(ops, ordered=False)
+
+
+async def current_version(tenant: str) -> int:
+    doc = await db.cache_versions.find_one({"_id": tenant}, {"v": 1})
+    return doc["v"] if doc else 0
+
+
+class CachedBody:
+    __slots__ = ("version", "body", "etag", "expires")
+
+    def __init__(self, version: int, body: bytes, expires: float):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.expires = expires
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, CachedBody] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: tuple, version: int) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version or entry.expires <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: tuple, version: int, body: bytes) -> CachedBody:
+        entry = CachedBody(version, body, time.monotonic() + self.ttl)
+        if self.maxsize > 0 and self.ttl > 0:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
+
+
+async def cached_response(request: Request, user: CurrentUser, key: tuple,
+                          compute: Callable[[], Awaitable]) -> Response:
+    tenant = tenant_of(user)
+    # read the version before computing: a write that lands in between only makes the
+    # stored body newer than its version, never older
+    version = await current_version(tenant)
+    full_key = (tenant, *key)
+    entry = response_cache.get(full_key, version)
+    if entry is None:
+        entry = response_cache.put(full_key, version, dumps(await compute()))
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if entry.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,158 @@
+import re
+import string
+import time
+from typing import Optional
+from app.config import settings
+from app.db import db
+
+# OCR text classifier. Matching is case-insensitive substring matching on the lowercased
+# text, earlier categories win. Short term lists are checked with `in` (CPython's substring
+# search beats any regex there); long per-tenant lists are compiled into one trie-shaped
+# regex per category, so the cost no longer grows with the number of terms.
+# Unsubscribe targets: literal pre-checks decide which of the mailto/URL/email patterns
+# can match at all, so most texts never run the email pattern.
+# Term lists live in classifier_terms ({_id: tenant or "*", official: [...], ad: [...]})
+# and are reloaded per tenant every CLASSIFIER_RELOAD_SECONDS.
+
+FINANCIAL_TERMS = ['invoice','statement','bank','legal','court','tax','gst','pan','account']
+PROMO_TERMS = ['sale','discount','offer','deal','promo','unsubscribe','limited time']
+
+CATEGORIES = ("official", "ad")
+DEFAULT_TERMS = {"official": FINANCIAL_TERMS, "ad": PROMO_TERMS}
+ALL_TENANTS = "*"
+MAX_TERMS = 5000
+MAX_TERM_LEN = 64
+
+# Lists up to this size are checked with `in`. On ~5.8k-char OCR texts (bench_classifier)
+# the default lists take ~75us that way; one pattern holding both categories as named groups
+# takes ~390us, and the unsubscribe pre-checks as one pattern ~365us against ~10us for the
+# three find()s. The regex engine only pays off once a list is long (1000 terms: ~215us
+# compiled, ~1470us with `in`).
+INLINE_TERMS = 32
+
+MAILTO_RE = re.compile(r'mailto:([^\s>]+)', re.I)
+URL_RE = re.compile(r'https?://[^\s>]+', re.I)
+EMAIL_RE = re.compile(r'[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}', re.I)
+# what EMAIL_RE's local part matches (re.I also folds U+017F and U+212A into s/k)
+EMAIL_LOCAL = frozenset(string.ascii_letters + string.digits + "._%+-\u017f\u212a")
+
+
+def _trie_pattern(terms: list[str]) -> str:
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    # a term ending here is already a match, so longer terms below it can be dropped
+    if "" in node:
+        return ""
+    branches = [re.escape(ch) + _node_pattern(child) for ch, child in sorted(node.items())]
+    return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+
+def normalize_terms(terms: list[str]) -> list[str]:
+    return list(dict.fromkeys(t.strip().lower() for t in terms if t and t.strip()))
+
+
+class Classifier:
+    def __init__(self, terms: dict[str, list[str]]):
+        self.terms = {cat: normalize_terms(terms.get(cat) or []) for cat in CATEGORIES}
+        self._matchers = []
+        for cat in CATEGORIES:
+            values = self.terms[cat]
+            if len(values) <= INLINE_TERMS:
+                self._matchers.append((cat, tuple(values), None))
+            else:
+                self._matchers.append((cat, (), re.compile(_trie_pattern(values))))
+
+    def classify(self, text: str) -> str:
+        t = (text or "").lower()
+        for cat, values, pattern in self._matchers:
+            if (pattern.search(t) if pattern else any(w in t for w in values)):
+                return cat
+        return 'unknown'
+
+    def unsubscribe(self, text: str) -> Optional[dict]:
+        # each search starts where its literal first occurs instead of at 0
+        if not text:
+            return None
+        t = text.lower()
+        aligned = len(t) == len(text)
+        at = t.find("mailto:")
+        if at >= 0:
+            m = MAILTO_RE.search(text, at if aligned else 0)
+            if m:
+                return {"channel":"email","target":m.group(1)}
+        at = t.find("http")
+        if at >= 0:
+            m = URL_RE.search(text, at if aligned else 0)
+            if m:
+                return {"channel":"url","target":m.group(0)}
+        at = text.find("@")
+        if at >= 0:
+            # the leftmost address starts at the beginning of the run before the first "@"
+            while at > 0 and text[at - 1] in EMAIL_LOCAL:
+                at -= 1
+            m = EMAIL_RE.search(text, at)
+            if m:
+                return {"channel":"email","target":m.group(0)}
+        return None
+
+
+default_classifier = Classifier(DEFAULT_TERMS)
+
+
+class ClassifierRegistry:
+    # per-tenant classifiers; tenants with identical term lists share one compiled engine
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._tenants: dict[str, tuple[Classifier, float]] = {}
+        self._compiled: dict[tuple, Classifier] = {}
+
+    async def get(self, tenant: str) -> Classifier:
+        entry = self._tenants.get(tenant)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        docs = {d["_id"]: d async for d in db.classifier_terms.find({"_id": {"$in": [tenant, ALL_TENANTS]}})}
+        terms = {}
+        for cat in CATEGORIES:
+            for source in (docs.get(tenant), docs.get(ALL_TENANTS), DEFAULT_TERMS):
+                if source and source.get(cat) is not None:
+                    terms[cat] = source[cat]
+                    break
+        key = tuple(tuple(terms[cat]) for cat in CATEGORIES)
+        classifier = self._compiled.get(key)
+        if classifier is None:
+            if len(self._compiled) >= 256:
+                self._compiled.clear()
+            classifier = self._compiled[key] = Classifier(terms)
+        if len(self._tenants) >= 10000:
+            self._tenants.clear()
+        self._tenants[tenant] = (classifier, time.monotonic() + self.ttl)
+        return classifier
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        if tenant is None or tenant == ALL_TENANTS:
+            self._tenants.clear()
+        else:
+            self._tenants.pop(tenant, None)
+
+
+classifiers = ClassifierRegistry(settings.CLASSIFIER_RELOAD_SECONDS)
+
+
+async def set_terms(tenant: str, terms: dict[str, Optional[list[str]]]) -> dict:
+    # None leaves a category as is; [] clears it for the tenant
+    update = {cat: normalize_terms(terms[cat]) for cat in CATEGORIES if terms.get(cat) is not None}
+    for cat, values in update.items():
+        if len(values) > MAX_TERMS or any(len(t) > MAX_TERM_LEN for t in values):
+            raise ValueError(f"{cat}: at most {MAX_TERMS} terms of up to {MAX_TERM_LEN} characters")
+    if update:
+        await db.classifier_terms.update_one({"_id": tenant}, {"$set": update}, upsert=True)
+    classifiers.invalidate(tenant)
+    return (await classifiers.get(tenant)).terms
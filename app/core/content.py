@@ -0,0 +1,268 @@
+import asyncio
+import codecs
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Iterator, Optional
+from fastapi import HTTPException, UploadFile
+from app.config import settings
+from app.db import db
+from app.core.search_index import TermCounter, tokenize
+from app.core.objectstore import cold_store
+
+# Document bodies. Bodies up to INLINE_TEXT_MAX chars stay inline in documents.text_content
+# (a separate read would cost more than the bytes); anything longer is written, compressed,
+# to document_chunks ({document_id, seq, codec, z}) while it is being written, so a body is
+# never held in memory as a whole and documents stay small. Bodies of old documents can be
+# moved to the cold tier (one compressed object per document, see app.core.objectstore).
+# Chunks written before compression keep their text in `data`; readers accept both.
+
+# what a reader needs to find a body
+BODY_FIELDS = {"text_content": 1, "chunked": 1, "tier": 1, "codec": 1}
+COLD = "cold"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("CONTENT_CODEC=zstd needs the zstandard package") from None
+    return zstandard
+
+
+def compressor(codec: str):
+    # an object with compress(bytes) and flush()
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=settings.CONTENT_COMPRESSION_LEVEL).compressobj()
+    if codec == "zlib":
+        return zlib.compressobj(settings.CONTENT_COMPRESSION_LEVEL)
+    raise ValueError(f"unknown codec {codec!r}")
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    c = compressor(codec)
+    return c.compress(data) + c.flush()
+
+
+def iter_decompressed(data: bytes, codec: str, size: int, limit: Optional[int] = None) -> Iterator[bytes]:
+    # decompresses `size` bytes at a time, and stops after `limit` bytes; `data` may be a prefix
+    if codec == "zstd":
+        reader = _zstd().ZstdDecompressor().stream_reader(data)
+        read = reader.read
+    elif codec == "zlib":
+        d = zlib.decompressobj()
+        pending = [data]
+
+        def read(n):
+            out = d.decompress(pending[0], n)
+            pending[0] = d.unconsumed_tail
+            return out
+    else:
+        raise ValueError(f"unknown codec {codec!r}")
+    produced = 0
+    while limit is None or produced < limit:
+        out = read(size if limit is None else min(size, limit - produced))
+        if not out:
+            return
+        produced += len(out)
+        yield out
+
+
+def decompress(data: bytes, codec: str, limit: Optional[int] = None) -> bytes:
+    return b"".join(iter_decompressed(data, codec, 1 << 20, limit))
+
+
+def _chunk_text(chunk: dict, limit: Optional[int] = None) -> str:
+    # limit: only that many chars are needed
+    if "data" in chunk:
+        return chunk["data"] if limit is None else chunk["data"][:limit]
+    raw = decompress(chunk["z"], chunk["codec"], None if limit is None else limit * 4)
+    text = raw.decode("utf-8", errors="ignore")
+    return text if limit is None else text[:limit]
+
+
+def _encode_chunks(document_id: str, first: int, pieces: list[str], codec: str) -> list[dict]:
+    return [{"_id": f"{document_id}:{first + i}", "document_id": document_id, "seq": first + i,
+             "codec": codec, "z": compress(piece.encode(), codec)}
+            for i, piece in enumerate(pieces)]
+
+
+def _prepend_chunk(chunk: dict, head: str, codec: str) -> dict:
+    return _encode_chunks(chunk["document_id"], chunk["seq"], [head + _chunk_text(chunk)], codec)[0]
+
+
+class ContentWriter:
+    def __init__(self, document_id: str, inline_max: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.document_id = document_id
+        self.inline_max = settings.INLINE_TEXT_MAX if inline_max is None else inline_max
+        self.chunk_size = chunk_size or settings.CONTENT_CHUNK_SIZE
+        self.codec = settings.CONTENT_CODEC
+        self.terms = TermCounter()
+        self.size = 0
+        self.chunks = 0
+        self.stored = 0
+        self._buffer: list[str] = []
+        self._buffered = 0
+
+    async def write(self, text: str) -> None:
+        if not text:
+            return
+        self.terms.feed(text)
+        self.size += len(text)
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.chunk_size:
+            await self._spill(final=False)
+
+    async def _spill(self, final: bool) -> None:
+        data = "".join(self._buffer)
+        pieces = []
+        while len(data) >= self.chunk_size or (final and data):
+            pieces.append(data[:self.chunk_size])
+            data = data[self.chunk_size:]
+        if pieces:
+            # zlib/zstd release the GIL, so compression runs beside the event loop
+            rows = await asyncio.to_thread(_encode_chunks, self.document_id, self.chunks, pieces, self.codec)
+            await db.document_chunks.insert_many(rows)
+            self.chunks += len(rows)
+            self.stored += sum(len(r["z"]) for r in rows)
+        self._buffer = [data] if data else []
+        self._buffered = len(data)
+
+    async def close(self, head: str = "") -> dict:
+        # fields to merge into the document; `head` is prepended to the body, for
+        # writers whose first line is only known once everything else is written
+        self.terms.finish()
+        self.terms.counts.update(tokenize(head))
+        self.size += len(head)
+        if not self.chunks and self.size <= self.inline_max:
+            return {"text_content": head + "".join(self._buffer), "size": self.size}
+        if not self.chunks and head:
+            self._buffer.insert(0, head)
+            head = ""
+        await self._spill(final=True)
+        if head:
+            first = await db.document_chunks.find_one({"_id": f"{self.document_id}:0"})
+            # a full chunk decompressed and compressed again: off the event loop, like _spill
+            row = await asyncio.to_thread(_prepend_chunk, first, head, self.codec)
+            await db.document_chunks.replace_one({"_id": row["_id"]}, row)
+            self.stored += len(row["z"]) - len(first.get("z", b""))
+        return {"chunked": True, "chunks": self.chunks, "size": self.size, "stored": self.stored}
+
+    async def discard(self) -> None:
+        self._buffer, self._buffered = [], 0
+        if self.chunks:
+            await db.document_chunks.delete_many({"document_id": self.document_id})
+            self.chunks = self.stored = 0
+
+
+async def read_upload(file: UploadFile, writer: ContentWriter, max_bytes: Optional[int] = None) -> int:
+    # stream an UploadFile into writer, decoding UTF-8 incrementally; 413 past max_bytes
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(413, f"Upload exceeds {max_bytes} bytes")
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    total = 0
+    while True:
+        data = await file.read(settings.UPLOAD_READ_SIZE)
+        if not data:
+            break
+        total += len(data)
+        if total > max_bytes:
+            await writer.discard()
+            raise HTTPException(413, f"Upload exceeds {max_bytes} bytes")
+        await writer.write(decoder.decode(data))
+    await writer.write(decoder.decode(b"", final=True))
+    return total
+
+
+async def iter_text(doc: dict) -> AsyncIterator[str]:
+    # doc carries BODY_FIELDS; chunks are decompressed one at a time as the caller consumes them
+    if doc.get("linked"):
+        # stored as a copy: the body is the original's
+        doc = await db.documents.find_one({"_id": doc["duplicate_of"]}, BODY_FIELDS) or {}
+    if doc.get("tier") == COLD:
+        data = await cold_store.get(doc["_id"])
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        for piece in iter_decompressed(data, doc["codec"], settings.CONTENT_CHUNK_SIZE):
+            yield decoder.decode(piece)
+        yield decoder.decode(b"", final=True)
+        return
+    if not doc.get("chunked"):
+        yield doc.get("text_content") or ""
+        return
+    async for chunk in db.document_chunks.find({"document_id": doc["_id"]}).sort("seq", 1):
+        yield _chunk_text(chunk)
+
+
+async def load_text(doc: dict) -> str:
+    return "".join([piece async for piece in iter_text(doc)])
+
+
+async def read_samples(docs: list[dict], length: int = 200) -> dict[str, str]:
+    # first `length` chars per document: chunked bodies only read (and decompress) the start
+    # of their first chunk, cold ones the start of their object
+    samples = {d["_id"]: (d.get("text_content") or "")[:length] for d in docs if not d.get("chunked")}
+    chunked = [d["_id"] for d in docs if d.get("chunked") and d.get("tier") != COLD]
+    if chunked:
+        async for chunk in db.document_chunks.find({"document_id": {"$in": chunked}, "seq": 0}):
+            samples[chunk["document_id"]] = _chunk_text(chunk, length)
+    for d in docs:
+        if d.get("tier") == COLD:
+            # a compressed prefix is enough for the first `length` chars of any sane body
+            data = await cold_store.get(d["_id"], max(4096, length * 4))
+            samples[d["_id"]] = decompress(data, d["codec"], length * 4).decode("utf-8", errors="ignore")[:length]
+    return samples
+
+
+async def move_to_store(doc: dict) -> bool:
+    # an inline body past INLINE_TEXT_MAX into compressed chunks
+    text = doc.get("text_content") or ""
+    if doc.get("chunked") or len(text) <= settings.INLINE_TEXT_MAX:
+        return False
+    # chunks of an earlier interrupted run are replaced
+    await db.document_chunks.delete_many({"document_id": doc["_id"]})
+    writer = ContentWriter(doc["_id"], inline_max=0)
+    await writer.write(text)
+    body = await writer.close()
+    await db.documents.update_one({"_id": doc["_id"]}, {"$set": body, "$unset": {"text_content": ""}})
+    return True
+
+
+async def move_to_cold(doc: dict) -> bool:
+    # the whole body as one compressed object in the cold tier; its chunks go once the
+    # document points there. Inline bodies are small and stay where they are.
+    if not doc.get("chunked") or doc.get("tier") == COLD:
+        return False
+    codec = settings.CONTENT_CODEC
+    c = compressor(codec)
+    parts = [c.compress(piece.encode()) async for piece in iter_text(doc)]
+    parts.append(c.flush())
+    data = b"".join(parts)
+    await cold_store.put(doc["_id"], data)
+    await db.documents.update_one({"_id": doc["_id"]}, {"$set": {"tier": COLD, "codec": codec, "stored": len(data)}})
+    await db.document_chunks.delete_many({"document_id": doc["_id"]})
+    return True
+
+
+async def migrate_content(batch_size: int = 500) -> tuple[int, int]:
+    # moves bodies stored before compression: long inline bodies and uncompressed chunks.
+    # Safe to re-run. Returns (chunks compressed, documents moved).
+    compressed = moved = 0
+    async for chunk in db.document_chunks.find({"data": {"$exists": True}}).batch_size(batch_size):
+        row = _encode_chunks(chunk["document_id"], chunk["seq"], [chunk["data"]], settings.CONTENT_CODEC)[0]
+        await db.document_chunks.replace_one({"_id": chunk["_id"]}, row)
+        compressed += 1
+    # `size` is the body length; documents without one are checked as they come
+    query = {"chunked": {"$ne": True}, "text_content": {"$exists": True},
+             "$or": [{"size": {"$gt": settings.INLINE_TEXT_MAX}}, {"size": {"$exists": False}}]}
+    async for doc in db.documents.find(query, BODY_FIELDS).batch_size(batch_size):
+        moved += await move_to_store(doc)
+    return compressed, moved
+
+
+async def tier_content(older_than: datetime, batch_size: int = 500) -> int:
+    moved = 0
+    query = {"chunked": True, "tier": {"$ne": COLD}, "created_at": {"$lt": older_than}}
+    async for doc in db.documents.find(query, BODY_FIELDS).batch_size(batch_size):
+        moved += await move_to_cold(doc)
+    return moved
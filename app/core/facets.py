@@ -0,0 +1,179 @@
+from collections import OrderedDict, defaultdict
+from typing import Optional
+from pymongo import ReturnDocument, UpdateOne
+from app.config import settings
+from app.db import db
+from app.core.cache import bump_versions, current_version
+
+# Tag membership index for faceted browsing. Every document gets a per-owner ordinal, and
+# tag_members keeps, per (owner, primary|secondary, tag, block of BLOCK ordinals), the member
+# ordinals with their document ids. Reads turn an owner's lists into Python int bitmaps, so
+# "folder F with tags A and B" is a couple of ANDs and each facet count one AND plus bit_count().
+# Bitmaps are cached per owner until the owner's cache version (app.core.cache) moves.
+
+BLOCK = 4096
+PRIMARY, SECONDARY = "p", "s"
+
+
+async def assign_ordinals(owner_id: str, n: int, session=None) -> int:
+    # reserves n ordinals for owner_id; returns the first
+    row = await db.doc_ordinals.find_one_and_update({"_id": owner_id}, {"$inc": {"n": n}}, upsert=True,
+                                                    return_document=ReturnDocument.AFTER, session=session)
+    return row["n"] - n
+
+
+def _groups(members: list[tuple]) -> dict[tuple, tuple[list, list]]:
+    # members: (ordinal, document_id, primary tag, secondary tags)
+    groups = defaultdict(lambda: ([], []))
+    for ordinal, document_id, primary, secondary in members:
+        for kind, names in ((PRIMARY, [primary] if primary else []), (SECONDARY, secondary)):
+            for name in dict.fromkeys(names):
+                ords, ids = groups[(kind, name, ordinal // BLOCK)]
+                ords.append(ordinal)
+                ids.append(document_id)
+    return groups
+
+
+def _block_id(owner_id: str, kind: str, block: int, name: str) -> str:
+    return f"{owner_id}:{kind}:{block}:{name}"
+
+
+async def add_members(owner_id: str, members: list[tuple], session=None) -> None:
+    ops = [UpdateOne({"_id": _block_id(owner_id, kind, block, name)},
+                     {"$push": {"ords": {"$each": ords}, "ids": {"$each": ids}},
+                      "$setOnInsert": {"owner_id": owner_id, "kind": kind, "tag": name, "block": block}},
+                     upsert=True)
+           for (kind, name, block), (ords, ids) in _groups(members).items()]
+    if ops:
+        await db.tag_members.bulk_write(ops, ordered=False, session=session)
+
+
+async def remove_members(owner_id: str, members: list[tuple]) -> None:
+    ops = [UpdateOne({"_id": _block_id(owner_id, kind, block, name)},
+                     {"$pull": {"ords": {"$in": ords}, "ids": {"$in": ids}}})
+           for (kind, name, block), (ords, ids) in _groups(members).items()]
+    if ops:
+        await db.tag_members.bulk_write(ops, ordered=False)
+
+
+def _bitmap(ords: list[int]) -> int:
+    if not ords:
+        return 0
+    buf = bytearray(max(ords) // 8 + 1)
+    for o in ords:
+        buf[o >> 3] |= 1 << (o & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _ordinals_desc(bits: int, stop: Optional[int] = None) -> list[int]:
+    # set bits, highest first; with `stop`, only scans from the top until that many are found
+    if stop is None:
+        return [i for i, b in enumerate(bin(bits)[:1:-1]) if b == "1"][::-1]
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    out = []
+    for i in range(len(data) - 1, -1, -1):
+        byte = data[i]
+        if byte:
+            out.extend(i * 8 + j for j in range(7, -1, -1) if byte >> j & 1)
+            if len(out) >= stop:
+                break
+    return out
+
+
+class OwnerFacets:
+    def __init__(self, version: int, members: dict[tuple[str, str], list[int]], ids: dict[int, str]):
+        self.version = version
+        self.ids = ids
+        self.bitmaps = {key: _bitmap(ords) for key, ords in members.items()}
+        self.all = 0
+        for (kind, _), bits in self.bitmaps.items():
+            if kind == PRIMARY:
+                self.all |= bits
+
+    def select(self, folder: Optional[str] = None, tags: list[str] = ()) -> int:
+        bits = self.bitmaps.get((PRIMARY, folder), 0) if folder else self.all
+        for tag in tags:
+            bits &= self.bitmaps.get((SECONDARY, tag), 0)
+        return bits
+
+    def facet_counts(self, bits: int) -> list[dict]:
+        counts = [{"name": name, "count": (bits & tag_bits).bit_count()}
+                  for (kind, name), tag_bits in self.bitmaps.items() if kind == SECONDARY]
+        return sorted((c for c in counts if c["count"]), key=lambda c: (-c["count"], c["name"]))
+
+    def document_ids(self, bits: int, offset: int = 0, limit: Optional[int] = None) -> list[str]:
+        # newest (highest ordinal) first
+        ords = _ordinals_desc(bits, None if limit is None else offset + limit)
+        return [self.ids[o] for o in ords[offset:None if limit is None else offset + limit]]
+
+
+class FacetCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._owners: OrderedDict[str, OwnerFacets] = OrderedDict()
+
+    async def get(self, owner_id: str) -> OwnerFacets:
+        # version first: a write landing during the load only makes the bitmaps newer
+        version = await current_version(owner_id)
+        facets = self._owners.get(owner_id)
+        if facets is not None and facets.version == version:
+            self._owners.move_to_end(owner_id)
+            return facets
+        members, ids = defaultdict(list), {}
+        async for row in db.tag_members.find({"owner_id": owner_id}, {"kind": 1, "tag": 1, "ords": 1, "ids": 1}):
+            members[(row["kind"], row["tag"])].extend(row["ords"])
+            ids.update(zip(row["ords"], row["ids"]))
+        facets = OwnerFacets(version, members, ids)
+        if self.maxsize > 0:
+            self._owners[owner_id] = facets
+            while len(self._owners) > self.maxsize:
+                self._owners.popitem(last=False)
+        return facets
+
+    def clear(self) -> None:
+        self._owners.clear()
+
+
+facet_cache = FacetCache(settings.FACET_CACHE_OWNERS)
+
+
+async def rebuild_facets(batch_size: int = 1000) -> int:
+    # recompute ordinals and tag_members from document_tags, oldest documents first. Run it with
+    # uploads and actions stopped: members written meanwhile can be wiped, or share an ordinal
+    pipeline = [
+        {"$lookup": {"from": "documents", "localField": "document_id", "foreignField": "_id", "as": "doc"}},
+        {"$unwind": "$doc"},
+        {"$lookup": {"from": "tags", "localField": "tag_id", "foreignField": "_id", "as": "tag"}},
+        {"$unwind": "$tag"},
+        {"$group": {"_id": "$document_id", "owner_id": {"$first": "$doc.owner_id"},
+                    "created_at": {"$first": "$doc.created_at"},
+                    "links": {"$push": {"name": "$tag.name", "primary": "$is_primary"}}}},
+        {"$sort": {"owner_id": 1, "created_at": 1, "_id": 1}},
+    ]
+    await db.tag_members.delete_many({})
+    owner, members, next_ord, total = None, [], 0, 0
+
+    async def flush():
+        if members:
+            # reserve before use; $max never hands out again what the live counter already has
+            await db.doc_ordinals.update_one({"_id": owner}, {"$max": {"n": next_ord}}, upsert=True)
+            await add_members(owner, members)
+            members.clear()
+
+    owners = []
+    async for row in db.document_tags.aggregate(pipeline, allowDiskUse=True):
+        if row["owner_id"] != owner:
+            await flush()
+            owner, next_ord = row["owner_id"], 0
+            owners.append(owner)
+        primary = next((link["name"] for link in row["links"] if link["primary"]), None)
+        members.append((next_ord, row["_id"], primary, [link["name"] for link in row["links"] if not link["primary"]]))
+        next_ord += 1
+        total += 1
+        if len(members) >= batch_size:
+            await flush()
+    await flush()
+    if owners:
+        await bump_versions(*owners)
+    facet_cache.clear()
+    return total
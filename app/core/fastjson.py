@@ -0,0 +1,26 @@
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+# Fast path for list endpoints: rows come from Mongo already projected to the response
+# shape, so they are written straight to JSON bytes instead of being built into models and
+# validated again against the route's response_model (which stays, for the OpenAPI schema).
+# Datetimes come out as isoformat(), the same as the default JSON response.
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    # ObjectId and anything else Mongo hands back that JSON lacks
+    return str(value)
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
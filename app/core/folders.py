@@ -0,0 +1,56 @@
+from typing import Optional
+from pymongo import UpdateOne
+from app.db import db
+
+# Folder counts: primary-link counts per (owner, tag name), maintained on every
+# primary link write so folder listings never touch document_tags.
+
+
+def _bump(owner_id: str, name: str, delta: int) -> UpdateOne:
+    return UpdateOne({"owner_id": owner_id, "name": name}, {"$inc": {"count": delta}}, upsert=True)
+
+
+async def bump_folder(owner_id: str, name: str, delta: int = 1) -> None:
+    await db.folder_counts.update_one({"owner_id": owner_id, "name": name}, {"$inc": {"count": delta}}, upsert=True)
+
+
+async def bump_folders(deltas: dict[tuple[str, str], int], session=None) -> None:
+    # deltas: {(owner_id, name): delta}
+    ops = [_bump(owner_id, name, delta) for (owner_id, name), delta in deltas.items() if delta]
+    if ops:
+        await db.folder_counts.bulk_write(ops, ordered=False, session=session)
+
+
+async def list_folder_counts(owner_id: Optional[str]) -> list[dict]:
+    # owner_id=None: admin view, counts summed across owners per name
+    if owner_id is not None:
+        rows = db.folder_counts.find({"owner_id": owner_id, "count": {"$gt": 0}}, {"_id": 0, "name": 1, "count": 1})
+        return await rows.to_list(None)
+    pipeline = [
+        {"$match": {"count": {"$gt": 0}}},
+        {"$group": {"_id": "$name", "count": {"$sum": "$count"}}},
+        {"$project": {"_id": 0, "name": "$_id", "count": 1}},
+    ]
+    return await db.folder_counts.aggregate(pipeline).to_list(None)
+
+
+async def count_folders(owner_id: Optional[str]) -> int:
+    if owner_id is not None:
+        return await db.folder_counts.count_documents({"owner_id": owner_id, "count": {"$gt": 0}})
+    return len(await db.folder_counts.distinct("name", {"count": {"$gt": 0}}))
+
+
+async def rebuild_folder_counts() -> int:
+    # recompute from document_tags; $out swaps the collection in atomically
+    pipeline = [
+        {"$match": {"is_primary": True}},
+        {"$lookup": {"from": "documents", "localField": "document_id", "foreignField": "_id", "as": "doc"}},
+        {"$unwind": "$doc"},
+        {"$lookup": {"from": "tags", "localField": "tag_id", "foreignField": "_id", "as": "tag"}},
+        {"$unwind": "$tag"},
+        {"$group": {"_id": {"owner_id": "$doc.owner_id", "name": "$tag.name"}, "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "owner_id": "$_id.owner_id", "name": "$_id.name", "count": 1}},
+        {"$out": "folder_counts"},
+    ]
+    await db.document_tags.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    return await db.folder_counts.count_documents({})
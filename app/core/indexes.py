@@ -0,0 +1,139 @@
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.config import settings
+from app.db import db
+from app.core.audit_store import ensure_partition, partition_name
+from app.core.utils import dedupe_tags
+
+# Index bootstrap: every hot query has a backing index, ensured at startup.
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "tags": [
+        IndexModel([("owner_id", ASCENDING), ("name", ASCENDING)], unique=True, name="owner_name_unique"),
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    "document_tags": [
+        IndexModel([("tag_id", ASCENDING), ("is_primary", ASCENDING)], name="tag_primary"),
+        IndexModel([("document_id", ASCENDING)], name="document"),
+    ],
+    "documents": [
+        IndexModel([("owner_id", ASCENDING), ("created_at", DESCENDING)], name="owner_created"),
+        IndexModel([("owner_id", ASCENDING), ("sim_bands", ASCENDING)], name="owner_sim_bands"),
+    ],
+    "document_chunks": [
+        IndexModel([("document_id", ASCENDING), ("seq", ASCENDING)], name="document_seq"),
+    ],
+    "tasks": [
+        IndexModel([("user_id", ASCENDING), ("at", DESCENDING)], name="user_at"),
+        IndexModel([("at", DESCENDING)], name="at"),
+    ],
+    "action_jobs": [
+        IndexModel([("status", ASCENDING), ("user_seq", ASCENDING), ("created_at", ASCENDING)], name="status_seq"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+    ],
+    "folder_counts": [
+        IndexModel([("owner_id", ASCENDING), ("name", ASCENDING)], unique=True, name="owner_name_unique"),
+    ],
+    "rate_counters": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_ttl"),
+    ],
+    "ocr_events": [
+        IndexModel([("at", ASCENDING)], expireAfterSeconds=settings.OCR_DEDUPE_DAYS * 86400, name="at_ttl"),
+    ],
+    "tag_members": [
+        IndexModel([("owner_id", ASCENDING)], name="owner"),
+    ],
+    "search_postings": [
+        IndexModel([("owner_id", ASCENDING), ("term", ASCENDING), ("document_id", ASCENDING)], name="owner_term_doc"),
+        IndexModel([("term", ASCENDING), ("document_id", ASCENDING)], name="term_doc"),
+    ],
+}
+
+
+async def ensure_indexes() -> None:
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # owner_name_unique cannot be built over duplicate tags from before it existed:
+            # merge them (same as `python -m app.cli dedupe-tags`) and try again
+            if collection != "tags" or e.code != 11000:
+                raise
+            await dedupe_tags()
+            await db[collection].create_indexes(models)
+    # audit partitions are created on first write; make sure the current month is ready
+    await ensure_partition(partition_name(datetime.utcnow()))
+
+
+# Representative route queries, checked with explain(). Values are placeholders;
+# only the shape of the filter/sort matters to the planner.
+def _route_queries() -> list[dict]:
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    audit = partition_name(day)
+    keyset = [("at", DESCENDING), ("_id", DESCENDING)]
+    return [
+        {"route": "upload_doc: find_or_create_tag", "collection": "tags", "filter": {"owner_id": "u", "name": "n"}},
+        {"route": "scope: folder tags (user)", "collection": "tags", "filter": {"name": "n", "owner_id": "u"}},
+        {"route": "scope: folder tags (admin)", "collection": "tags", "filter": {"name": "n"}},
+        {"route": "scope: primary links", "collection": "document_tags", "filter": {"tag_id": "t", "is_primary": True}},
+        {"route": "scope: files", "collection": "documents", "filter": {"_id": {"$in": ["d"]}, "owner_id": "u"}},
+        {"route": "actions: chunked samples", "collection": "document_chunks",
+         "filter": {"document_id": {"$in": ["d"]}, "seq": 0}},
+        {"route": "list_folders / metrics: folder counts", "collection": "folder_counts",
+         "filter": {"owner_id": "u", "count": {"$gt": 0}}},
+        {"route": "metrics: docs_total", "collection": "documents", "filter": {"owner_id": "u"}},
+        {"route": "metrics: tasks_today (user)", "collection": "tasks", "filter": {"at": {"$gte": day}, "user_id": "u"}},
+        {"route": "metrics: tasks_today (admin)", "collection": "tasks", "filter": {"at": {"$gte": day}}},
+        {"route": "ocr webhooks: task rate limit", "collection": "rate_counters",
+         "filter": {"_id": "ocr_tasks:u:s:2025-01-01"}},
+        {"route": "usage_month / metrics: usage rollup", "collection": "usage_rollups",
+         "filter": {"_id": "actions_run:u:2025-01"}},
+        {"route": "action workers: claim", "collection": "action_jobs", "filter": {"status": "queued"},
+         "sort": [("user_seq", ASCENDING), ("created_at", ASCENDING)], "limit": 1},
+        {"route": "action workers: lease expiry", "collection": "action_jobs",
+         "filter": {"status": "running", "lease_until": {"$lt": day}}},
+        {"route": "audit_log", "collection": audit, "filter": {}, "sort": keyset, "limit": 200},
+        {"route": "audit_log: page", "collection": audit,
+         "filter": {"$or": [{"at": {"$lt": day}}, {"at": day, "_id": {"$lt": "a"}}]}, "sort": keyset, "limit": 200},
+        {"route": "audit_log: userId", "collection": audit, "filter": {"userId": "u", "at": {"$gte": day}},
+         "sort": keyset, "limit": 200},
+        {"route": "audit_log: action", "collection": audit, "filter": {"action": "a"}, "sort": keyset, "limit": 200},
+        {"route": "audit_log: entity", "collection": audit, "filter": {"entityType": "t", "entityId": "e"},
+         "sort": keyset, "limit": 200},
+        {"route": "upload dedupe: signature bands", "collection": "documents",
+         "filter": {"owner_id": "u", "sim_bands": {"$in": [1, 2]}}},
+        {"route": "facets: owner tag bitmaps", "collection": "tag_members", "filter": {"owner_id": "u"}},
+        {"route": "search: postings", "collection": "search_postings",
+         "filter": {"term": {"$in": ["t"]}, "owner_id": "u", "document_id": {"$in": ["d"]}}},
+        {"route": "search: postings (admin)", "collection": "search_postings",
+         "filter": {"term": {"$in": ["t"]}, "document_id": {"$in": ["d"]}}},
+    ]
+
+
+def _stages(plan) -> set[str]:
+    found = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            found.add(plan["stage"])
+        for value in plan.values():
+            found |= _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            found |= _stages(value)
+    return found
+
+
+async def check_route_queries() -> list[dict]:
+    report = []
+    for q in _route_queries():
+        cursor = db[q["collection"]].find(q["filter"])
+        if q.get("sort"):
+            cursor = cursor.sort(q["sort"])
+        if q.get("limit"):
+            cursor = cursor.limit(q["limit"])
+        explain = await cursor.explain()
+        stages = _stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        report.append({"route": q["route"], "collection": q["collection"], "stages": sorted(stages),
+                       "collscan": "COLLSCAN" in stages})
+    return report
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.db import db
+from app.core.utils import new_id, resolve_tags, audit_entry, log_audit_many
+from app.core.search_index import index_many, term_counts
+from app.core.folders import bump_folders
+from app.core.content import ContentWriter
+from app.core.cache import bump_versions
+from app.core.facets import add_members, assign_ordinals, remove_members
+from app.core.similarity import bands, find_duplicates, simhash, to_stored
+
+log = logging.getLogger(__name__)
+
+# Document ingestion shared by single and batch uploads. A staged document has its
+# body already written (inline or chunked); commit_documents writes everything else
+# with one bulk call per collection.
+#
+# Near-duplicates (app.core.similarity), by dedupe mode: "reject" fails the item, "link"
+# stores it without a body and pointing at the original, "flag" stores it in full and
+# marks it. Either way a stored copy carries `duplicate_of`.
+
+
+def stage(index: int, filename: str, mime: Optional[str], primary: str, secondary: list[str], writer: ContentWriter,
+          body: dict) -> dict:
+    return {
+        "index": index,
+        "filename": filename,
+        "mime": mime or "text/plain",
+        "primary": primary,
+        "secondary": [n for n in dict.fromkeys(secondary) if n and n != primary],
+        "writer": writer,
+        "body": body,
+    }
+
+
+async def stage_text(index: int, filename: str, mime: Optional[str], primary: str, secondary: list[str], text: str) -> dict:
+    writer = ContentWriter(new_id())
+    await writer.write(text)
+    body = await writer.close()
+    return stage(index, filename, mime, primary, secondary, writer, body)
+
+
+def item_error(index: int, filename: Optional[str], error: str, code: int = 400) -> dict:
+    # `code` is the HTTP status a single upload answers with; batch responses leave it out
+    return {"index": index, "filename": filename, "status": "error", "error": error, "code": code}
+
+
+def _write_error_code(err: dict) -> int:
+    # duplicate key and document validation are the caller's to fix; anything else is ours
+    return {11000: 409, 121: 422}.get(err.get("code"), 500)
+
+
+async def _undo(owner_id: str, docs: list[dict], links: list[dict], members: list[tuple] = (),
+                folders: Optional[dict] = None) -> None:
+    ids = [d["_id"] for d in docs]
+    if ids:
+        await asyncio.gather(db.documents.delete_many({"_id": {"$in": ids}}),
+                             db.search_postings.delete_many({"document_id": {"$in": ids}}),
+                             db.document_tags.delete_many({"_id": {"$in": [link["_id"] for link in links]}}),
+                             remove_members(owner_id, list(members)),
+                             bump_folders({key: -n for key, n in (folders or {}).items()}))
+
+
+async def commit_documents(owner_id: str, staged: list[dict], dedupe: Optional[str] = None) -> tuple[list[dict], list[dict]]:
+    # returns (created documents, per-item results)
+    if not staged:
+        return [], []
+    dedupe = dedupe or settings.DEDUPE_MODE
+    # body terms only: filename terms are added when indexing
+    signatures = [simhash(s["writer"].terms.counts) for s in staged]
+    if dedupe == "off":
+        originals = [None] * len(staged)
+    else:
+        originals = await find_duplicates(owner_id, [(s["writer"].document_id, sig) for s, sig in zip(staged, signatures)],
+                                          settings.DEDUPE_MAX_DISTANCE)
+    kept = [i for i, original in enumerate(originals) if not (original and dedupe == "reject")]
+    tags = await resolve_tags(owner_id, [n for i in kept for n in (staged[i]["primary"], *staged[i]["secondary"])])
+
+    now = datetime.utcnow()
+    docs = []
+    for i in kept:
+        s, sig, original = staged[i], signatures[i], originals[i]
+        doc = {"_id": s["writer"].document_id, "owner_id": owner_id, "filename": s["filename"], "mime": s["mime"]}
+        if original and dedupe == "link":
+            # the original's body stands in for this one
+            doc.update(size=s["body"]["size"], linked=True)
+        else:
+            doc.update(s["body"])
+        if sig is not None:
+            doc.update(simhash=to_stored(sig), sim_bands=bands(sig))
+        if original:
+            doc["duplicate_of"] = original
+        doc["created_at"] = now
+        docs.append(doc)
+    # failed items: index -> (status code, message)
+    failed: dict[int, tuple[int, str]] = {}
+    try:
+        if docs:
+            await db.documents.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed[kept[err["index"]]] = (_write_error_code(err), err.get("errmsg", "write failed"))
+
+    created = [(i, staged[i], d) for i, d in zip(kept, docs) if i not in failed]
+    links = []
+    for _, s, d in created:
+        links.append({"_id": new_id(), "document_id": d["_id"], "tag_id": tags[s["primary"]]["_id"], "is_primary": True})
+        links.extend({"_id": new_id(), "document_id": d["_id"], "tag_id": tags[n]["_id"], "is_primary": False}
+                     for n in s["secondary"])
+    try:
+        if links:
+            await db.document_tags.insert_many(links, ordered=False)
+    except BulkWriteError as e:
+        # a document missing any of its links is undone and reported, the rest go on
+        broken = {links[err["index"]]["document_id"] for err in e.details.get("writeErrors", [])}
+        await _undo(owner_id, [d for _, _, d in created if d["_id"] in broken],
+                    [link for link in links if link["document_id"] in broken])
+        failed.update((i, (500, "tag links write failed")) for i, _, d in created if d["_id"] in broken)
+        created = [c for c in created if c[2]["_id"] not in broken]
+        links = [link for link in links if link["document_id"] not in broken]
+
+    folders = Counter((owner_id, s["primary"]) for _, s, _ in created)
+    members, counted = [], False
+    try:
+        # linked copies are found by filename only; their body terms are the original's
+        await index_many([(owner_id, d["_id"], term_counts(s["filename"]) if d.get("linked")
+                           else s["writer"].terms.counts + term_counts(s["filename"])) for _, s, d in created])
+        await bump_folders(folders)
+        counted = True
+        if created:
+            first = await assign_ordinals(owner_id, len(created))
+            members = [(first + n, d["_id"], s["primary"], s["secondary"]) for n, (_, s, d) in enumerate(created)]
+            await add_members(owner_id, members)
+            await bump_versions(owner_id)
+    except Exception:
+        # rather than leave documents missing from search, folder counts or facets, the batch
+        # is undone (a failed bump_folders may have applied in part: see reconcile-folders)
+        log.exception("upload of %d documents for %s undone", len(created), owner_id)
+        await _undo(owner_id, [d for _, _, d in created], links, members, folders if counted else {})
+        failed.update((i, (503, "write failed, retry the upload")) for i, _, _ in created)
+        created = []
+    try:
+        await log_audit_many([
+            audit_entry(owner_id, 'document.upload', 'Document', d["_id"],
+                        {"filename": d["filename"], "primaryTag": s["primary"],
+                         **({"duplicateOf": d["duplicate_of"]} if d.get("duplicate_of") else {})})
+            for _, s, d in created
+        ])
+    except Exception:
+        # the documents are stored by now; a lost audit entry does not fail their upload
+        log.exception("audit of %d uploads for %s failed", len(created), owner_id)
+
+    docs_by_index = dict(zip(kept, docs))
+    results = []
+    for i, s in enumerate(staged):
+        if i not in docs_by_index:
+            await s["writer"].discard()
+            results.append({**item_error(s["index"], s["filename"], f"Duplicate of {originals[i]}", 409),
+                            "duplicate_of": originals[i]})
+        elif i in failed:
+            await s["writer"].discard()
+            code, error = failed[i]
+            results.append(item_error(s["index"], s["filename"], error, code))
+        else:
+            doc = docs_by_index[i]
+            if doc.get("linked"):
+                await s["writer"].discard()
+            results.append({"index": s["index"], "filename": s["filename"], "status": "created", "id": doc["_id"],
+                            **({"duplicate_of": doc["duplicate_of"]} if doc.get("duplicate_of") else {})})
+    return [d for _, _, d in created], results
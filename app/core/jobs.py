@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from app.config import settings
+from app.db import db
+from app.schemas import ActionRunIn, CurrentUser
+from app.core.utils import new_id
+from app.core.actions import run_action
+
+# Action jobs: /v1/actions/run enqueues into action_jobs and a pool of asyncio
+# workers claims them with an atomic find_one_and_update.
+#
+# Fairness: each job gets a per-user sequence number and workers claim the lowest
+# one first, so users are served round-robin instead of first-come-first-served.
+# A user's next number never starts below the last claimed number (the "clock"),
+# so a user who has been idle cannot jump ahead of everyone with a burst.
+
+log = logging.getLogger(__name__)
+
+CLOCK_ID = "__clock__"
+
+
+async def enqueue_action(user: CurrentUser, body: ActionRunIn, request_key: Optional[str] = None) -> dict:
+    clock = await db.action_job_seqs.find_one({"_id": CLOCK_ID})
+    floor = (clock or {}).get("seq", 0)
+    seq = await db.action_job_seqs.find_one_and_update(
+        {"_id": user.id},
+        [{"$set": {"seq": {"$max": [{"$add": [{"$ifNull": ["$seq", 0]}, 1]}, floor]}}}],
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    job = {
+        "_id": new_id(),
+        "user_id": user.id,
+        "user": user.model_dump(),
+        "payload": body.model_dump(),
+        "request_key": request_key,
+        "status": "queued",
+        "user_seq": seq["seq"],
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+    }
+    await db.action_jobs.insert_one(job)
+    if pool is not None:
+        pool.notify()
+    return job
+
+
+async def claim_job(worker_id: str) -> Optional[dict]:
+    now = datetime.utcnow()
+    job = await db.action_jobs.find_one_and_update(
+        {"status": "queued"},
+        {"$set": {"status": "running", "started_at": now, "worker": worker_id,
+                  "lease_until": now + timedelta(seconds=settings.ACTION_JOB_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("user_seq", 1), ("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        await db.action_job_seqs.update_one({"_id": CLOCK_ID}, {"$max": {"seq": job["user_seq"]}}, upsert=True)
+    return job
+
+
+async def run_job(job: dict) -> None:
+    try:
+        # the job id keys the run when the client gave none, so a job re-run after its lease
+        # expired does not charge twice
+        result = await run_action(CurrentUser(**job["user"]), ActionRunIn(**job["payload"]),
+                                  job.get("request_key") or job["_id"])
+    except Exception as e:
+        log.exception("action job %s failed", job["_id"])
+        update = {"status": "failed", "error": str(e)}
+    else:
+        update = {"status": "done", "result": result}
+    update["finished_at"] = datetime.utcnow()
+    await db.action_jobs.update_one({"_id": job["_id"], "worker": job["worker"]}, {"$set": update})
+
+
+async def process_next_job(worker_id: str = "inline") -> bool:
+    job = await claim_job(worker_id)
+    if not job:
+        return False
+    await run_job(job)
+    return True
+
+
+async def requeue_expired() -> int:
+    # jobs whose worker died mid-run go back to the queue, up to the attempt limit
+    now = datetime.utcnow()
+    expired = {"status": "running", "lease_until": {"$lt": now}}
+    await db.action_jobs.update_many({**expired, "attempts": {"$gte": settings.ACTION_JOB_MAX_ATTEMPTS}},
+                                     {"$set": {"status": "failed", "error": "lease expired", "finished_at": now}})
+    res = await db.action_jobs.update_many(expired, {"$set": {"status": "queued"}, "$unset": {"worker": ""}})
+    return res.modified_count
+
+
+class ActionWorkerPool:
+    def __init__(self, concurrency: int, poll_seconds: Optional[float] = None):
+        self.concurrency = concurrency
+        self.poll_seconds = settings.ACTION_JOB_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        self._stop.clear()
+        prefix = new_id()[:8]
+        self._tasks = [asyncio.create_task(self._worker(f"{prefix}-{i}")) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # let running jobs finish; anything still running after timeout is re-queued by lease expiry
+        self._stopping = True
+        self._stop.set()
+        self._wake.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, worker_id: str) -> None:
+        while not self._stopping:
+            # clear before claiming so a notify() during the claim is not lost
+            self._wake.clear()
+            try:
+                if await process_next_job(worker_id):
+                    continue
+            except Exception:
+                log.exception("action worker %s", worker_id)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _reaper(self) -> None:
+        while not self._stopping:
+            try:
+                if await requeue_expired():
+                    self._wake.set()
+            except Exception:
+                log.exception("action job reaper")
+            try:
+                await asyncio.wait_for(self._stop.wait(), settings.ACTION_JOB_LEASE_SECONDS / 2)
+            except asyncio.TimeoutError:
+                pass
+
+
+pool: Optional[ActionWorkerPool] = None
+
+
+async def start_workers() -> None:
+    global pool
+    if settings.ACTION_WORKERS > 0 and pool is None:
+        pool = ActionWorkerPool(settings.ACTION_WORKERS)
+        pool.start()
+
+
+async def stop_workers() -> None:
+    global pool
+    if pool is not None:
+        await pool.stop()
+        pool = None
@@ -0,0 +1,50 @@
+import asyncio
+import os
+from typing import Optional
+from app.config import settings
+
+# Cold tier for document bodies: one object per key under CONTENT_COLD_DIR. A local
+# stand-in for an object store (S3/GCS): put/get/delete of whole objects by key, file IO
+# off the event loop, writes made visible atomically by rename.
+
+
+class LocalObjectStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        # fan out by prefix so no directory grows too large
+        return os.path.join(self.root, key[:2], key)
+
+    def _put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _get(self, key: str, length: Optional[int]) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read(-1 if length is None else length)
+
+    def _delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._put, key, data)
+
+    async def get(self, key: str, length: Optional[int] = None) -> bytes:
+        # the first `length` bytes only, when given
+        return await asyncio.to_thread(self._get, key, length)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+
+cold_store = LocalObjectStore(settings.CONTENT_COLD_DIR)
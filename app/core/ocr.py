@@ -0,0 +1,127 @@
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from pymongo.errors import BulkWriteError
+from app.db import db
+from app.schemas import CurrentUser, OCRIn
+from app.core.classifier import classifiers
+from app.core.ratelimit import ocr_task_limiter
+from app.core.utils import audit_entry, log_audit_many, new_id
+from app.core.cache import bump_versions
+
+# Batch OCR ingestion. Each (user, source, imageId) is recorded once in ocr_events, so a
+# retried batch returns the original results instead of creating tasks again. Task slots
+# are reserved with one limiter call per source, and events, tasks and audits are each
+# written with one bulk call.
+
+
+def event_id(user_id: str, source: str, image_id: str) -> str:
+    return f"{user_id}:{source}:{image_id}"
+
+
+def ocr_error(index: int, error: str, source: Optional[str] = None, image_id: Optional[str] = None) -> dict:
+    return {"index": index, "source": source, "imageId": image_id, "status": "error", "error": error}
+
+
+def _task_out(task: Optional[dict]) -> Optional[dict]:
+    return {"id": task["_id"], "channel": task["channel"], "target": task["target"]} if task else None
+
+
+def _duplicate(index: int, event: dict) -> dict:
+    return {"index": index, "source": event["source"], "imageId": event["imageId"], "status": "duplicate",
+            "classification": event["classification"], "task_created": bool(event.get("task")),
+            "task": event.get("task")}
+
+
+async def ingest_ocr_batch(user: CurrentUser, items: list[tuple[int, OCRIn]]) -> list[dict]:
+    results: list[dict] = []
+    fresh: dict[str, tuple[int, OCRIn]] = {}
+    repeats: list[tuple[int, str]] = []
+    for index, payload in items:
+        if not (payload.source and payload.imageId and payload.text):
+            results.append(ocr_error(index, "source,imageId,text required", payload.source, payload.imageId))
+            continue
+        key = event_id(user.id, payload.source, payload.imageId)
+        if key in fresh:
+            repeats.append((index, key))
+        else:
+            fresh[key] = (index, payload)
+
+    # retries of earlier batches
+    events: dict[str, dict] = {}
+    if fresh:
+        async for event in db.ocr_events.find({"_id": {"$in": list(fresh)}}):
+            events[event["_id"]] = event
+            index, _ = fresh.pop(event["_id"])
+            results.append(_duplicate(index, event))
+
+    now = datetime.utcnow()
+    classifier = await classifiers.get(user.id)
+    ordered = sorted(fresh.items(), key=lambda kv: kv[1][0])
+    classified, wanted = {}, Counter()
+    for key, (index, payload) in ordered:
+        cls = classifier.classify(payload.text)
+        unsub = classifier.unsubscribe(payload.text) if cls == 'ad' else None
+        classified[key] = (cls, unsub)
+        if unsub:
+            wanted[payload.source] += 1
+    left = {source: await ocr_task_limiter.reserve(user.id, source, n, at=now) for source, n in wanted.items()}
+    granted = dict(left)
+
+    new_events, tasks = [], {}
+    for key, (index, payload) in ordered:
+        cls, unsub = classified[key]
+        task = None
+        if unsub and left[payload.source] > 0:
+            left[payload.source] -= 1
+            task = {"_id": new_id(), "user_id": user.id, "status": 'pending', "channel": unsub['channel'],
+                    "target": unsub['target'], "source": payload.source, "at": now}
+            tasks[key] = task
+        new_events.append({"_id": key, "user_id": user.id, "source": payload.source, "imageId": payload.imageId,
+                           "classification": cls, "task": _task_out(task), "at": now})
+
+    # claim the events first: a concurrent retry that got there first wins, and its items become duplicates
+    lost = set()
+    if new_events:
+        try:
+            await db.ocr_events.insert_many(new_events, ordered=False)
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            lost = {new_events[err["index"]]["_id"] for err in e.details["writeErrors"]}
+    if lost:
+        async for event in db.ocr_events.find({"_id": {"$in": list(lost)}}):
+            events[event["_id"]] = event
+            results.append(_duplicate(fresh[event["_id"]][0], event))
+
+    claimed = [e for e in new_events if e["_id"] not in lost]
+    created = [tasks[e["_id"]] for e in claimed if e["_id"] in tasks]
+    # hand back slots reserved for items another request claimed first
+    unused = Counter(granted)
+    unused.subtract(task["source"] for task in created)
+    for source, n in unused.items():
+        await ocr_task_limiter.release(user.id, source, n, at=now)
+    if created:
+        await db.tasks.insert_many(created, ordered=False)
+        await bump_versions(user.id)
+
+    audits = []
+    for event in claimed:
+        index, payload = fresh[event["_id"]]
+        events[event["_id"]] = event
+        audits.append(audit_entry(user.id, 'webhook.ocr.ingest', 'WebhookEvent', payload.imageId,
+                                  {"source": payload.source, "cls": event["classification"]}))
+        if event["task"]:
+            audits.append(audit_entry(user.id, 'task.create', 'Task', event["task"]["id"],
+                                      {"channel": event["task"]["channel"], "target": event["task"]["target"],
+                                       "source": payload.source}))
+        results.append({"index": index, "source": payload.source, "imageId": payload.imageId, "status": "processed",
+                        "classification": event["classification"], "task_created": bool(event["task"]),
+                        "task": event["task"]})
+    await log_audit_many(audits)
+
+    # repeats inside this batch report the result of their first occurrence
+    for index, key in repeats:
+        if key in events:
+            results.append(_duplicate(index, events[key]))
+    return sorted(results, key=lambda r: r["index"])
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.db import db
+
+# Per-day counters in rate_counters ({_id: "<scope>:<user>:<source>:<day>", n, expires_at}).
+# reserve() checks and takes slots in one atomic pipeline update, so concurrent callers
+# can never go past the limit, and there is no count query. Slots that end up unused are
+# handed back with release(), to the day they were reserved on. Keys that hit their limit are remembered in-process until
+# the day rolls over, so a flood of over-limit calls never reaches Mongo.
+
+
+def _day(now: datetime) -> str:
+    return now.strftime("%Y-%m-%d")
+
+
+class DailyLimiter:
+    def __init__(self, scope: str, default_limit: int, limits: Optional[dict[str, int]] = None):
+        self.scope = scope
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self._exhausted: set[str] = set()
+        self._exhausted_day = ""
+
+    def limit_for(self, source: str) -> int:
+        return self.limits.get(source, self.default_limit)
+
+    def _key(self, user_id: str, source: str, day: str) -> str:
+        return f"{self.scope}:{user_id}:{source}:{day}"
+
+    async def reserve(self, user_id: str, source: str, n: int = 1, at: Optional[datetime] = None) -> int:
+        # takes up to n slots for the day of `at` (default now) and returns how many were granted
+        now = at or datetime.utcnow()
+        day = _day(now)
+        if day != self._exhausted_day:
+            self._exhausted, self._exhausted_day = set(), day
+        key = self._key(user_id, source, day)
+        limit = self.limit_for(source)
+        if n <= 0 or key in self._exhausted:
+            return 0
+        used = {"$ifNull": ["$n", 0]}
+        expires = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=2)
+        update = [
+            {"$set": {"granted": {"$min": [n, {"$max": [0, {"$subtract": [limit, used]}]}]}, "expires_at": expires}},
+            {"$set": {"n": {"$add": [used, "$granted"]}}},
+        ]
+        for attempt in range(2):
+            try:
+                doc = await db.rate_counters.find_one_and_update({"_id": key}, update, upsert=True,
+                                                                 return_document=ReturnDocument.AFTER)
+                break
+            except DuplicateKeyError:
+                # two first-of-the-day upserts raced; the loser retries as an update
+                if attempt:
+                    raise
+        if doc["n"] >= limit:
+            self._exhausted.add(key)
+        return doc["granted"]
+
+    async def release(self, user_id: str, source: str, n: int = 1, *, at: datetime) -> None:
+        # `at` is the time passed to reserve(): a release after midnight goes to the day it came from
+        if n <= 0:
+            return
+        key = self._key(user_id, source, _day(at))
+        await db.rate_counters.update_one({"_id": key, "n": {"$gte": n}}, {"$inc": {"n": -n}})
+        self._exhausted.discard(key)
+
+
+ocr_task_limiter = DailyLimiter("ocr_tasks", settings.OCR_TASKS_PER_DAY, settings.OCR_TASK_LIMITS)
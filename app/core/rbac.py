@@ -1,13 +1,4 @@
-from fastapi import Depends, HTTPException
-from app.core.auth import get_current_user, CurrentUser
+# RBAC helpers live in app.core.auth; kept here for existing imports.
+from app.core.auth import get_current_user, require_role, write_guard, CurrentUser
 
-def require_role(allowed: list[str]):
-    async def _inner(user: CurrentUser = Depends(get_current_user)):
-        if user.role not in allowed:
-            raise HTTPException(403, "Forbidden")
-        return user
-    return _inner
-
-def write_guard(user: CurrentUser):
-    if user.role in ("support","moderator"):
-        raise HTTPException(403, "Read-only role")
\ No newline at end of file
+__all__ = ["get_current_user", "require_role", "write_guard", "CurrentUser"]
@@ -0,0 +1,53 @@
+from typing import AsyncIterator, Optional
+from app.db import db
+from app.schemas import CurrentUser
+
+# Scope resolution: folder/files scope -> documents in one query, tenant isolation applied inside it.
+
+
+def owner_filter(user: CurrentUser) -> dict:
+    return {} if user.role == 'admin' else {"owner_id": user.id}
+
+
+def scope_cursor(user: CurrentUser, scope_type: str, name: Optional[str] = None, ids: Optional[list[str]] = None,
+                 projection: Optional[dict] = None, batch_size: int = 500):
+    owner = owner_filter(user)
+    if scope_type == "folder":
+        # tag(s) -> primary links -> documents, all server side
+        pipeline = [
+            {"$match": {"name": name, **owner}},
+            {"$project": {"_id": 1}},
+            {"$lookup": {"from": "document_tags", "localField": "_id", "foreignField": "tag_id", "as": "link"}},
+            {"$unwind": "$link"},
+            {"$match": {"link.is_primary": True}},
+            {"$lookup": {"from": "documents", "localField": "link.document_id", "foreignField": "_id", "as": "doc"}},
+            {"$unwind": "$doc"},
+            {"$replaceRoot": {"newRoot": "$doc"}},
+        ]
+        if owner:
+            pipeline.append({"$match": owner})
+        if projection:
+            pipeline.append({"$project": projection})
+        return db.tags.aggregate(pipeline, batchSize=batch_size)
+    pipeline = [{"$match": {"_id": {"$in": list(ids or [])}, **owner}}]
+    if projection:
+        pipeline.append({"$project": projection})
+    return db.documents.aggregate(pipeline, batchSize=batch_size)
+
+
+async def resolve_scope(user: CurrentUser, scope_type: str, name: Optional[str] = None, ids: Optional[list[str]] = None,
+                        projection: Optional[dict] = None) -> list[dict]:
+    return await scope_cursor(user, scope_type, name, ids, projection).to_list(None)
+
+
+async def iter_scope(user: CurrentUser, scope_type: str, name: Optional[str] = None, ids: Optional[list[str]] = None,
+                     projection: Optional[dict] = None, batch_size: int = 500) -> AsyncIterator[list[dict]]:
+    # stream the scope in batches so callers never hold the whole folder
+    batch = []
+    async for doc in scope_cursor(user, scope_type, name, ids, projection, batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,123 @@
+import re
+from collections import Counter
+from typing import Optional
+from pymongo.errors import BulkWriteError
+from app.db import db
+
+# Inverted index: one posting per (document, term), scoped by owner.
+# _id is "<document_id>:<term>" so re-indexing a document is idempotent.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+TRAILING_TOKEN_RE = re.compile(r"[a-z0-9]+$")
+MAX_TERM_LEN = 64
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if len(t) <= MAX_TERM_LEN]
+
+
+def term_counts(*texts: Optional[str]) -> Counter:
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text))
+    return counts
+
+
+class TermCounter:
+    # incremental term_counts() for text that arrives in pieces; a token split
+    # across two pieces is held back until the next piece (or finish()) completes it
+    def __init__(self):
+        self.counts = Counter()
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        text = self._tail + text.lower()
+        m = TRAILING_TOKEN_RE.search(text)
+        if m:
+            # anything longer than MAX_TERM_LEN is dropped anyway, so the tail stays bounded
+            self._tail = text[m.start():][-(MAX_TERM_LEN + 1):]
+            text = text[:m.start()]
+        else:
+            self._tail = ""
+        self.counts.update(tokenize(text))
+
+    def finish(self) -> Counter:
+        self.counts.update(tokenize(self._tail))
+        self._tail = ""
+        return self.counts
+
+
+def query_terms(q: str) -> list[str]:
+    # dedupe but keep the caller's order
+    return list(dict.fromkeys(tokenize(q)))
+
+
+async def index_terms(owner_id: str, document_id: str, counts: Counter) -> None:
+    await index_many([(owner_id, document_id, counts)])
+
+
+async def index_many(entries: list[tuple[str, str, Counter]], session=None) -> None:
+    # entries: (owner_id, document_id, term counts); one insert_many for all of them
+    postings = [
+        {"_id": f"{document_id}:{term}", "owner_id": owner_id, "term": term, "document_id": document_id, "tf": tf}
+        for owner_id, document_id, counts in entries
+        for term, tf in counts.items()
+    ]
+    if not postings:
+        return
+    try:
+        await db.search_postings.insert_many(postings, ordered=False, session=session)
+    except BulkWriteError as e:
+        # duplicates mean the document was already indexed
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def index_document(doc: dict) -> None:
+    await index_terms(doc["owner_id"], doc["_id"], term_counts(doc.get("text_content"), doc.get("filename")))
+
+
+async def search_postings(terms: list[str], owner_id: Optional[str] = None, document_ids: Optional[list[str]] = None,
+                          rank: bool = True, offset: int = 0, limit: int = 50) -> tuple[int, list[str]]:
+    # AND semantics: a document matches when it has a posting for every term
+    if not terms:
+        return 0, []
+    match: dict = {"term": {"$in": terms}}
+    if owner_id is not None:
+        match["owner_id"] = owner_id
+    if document_ids is not None:
+        match["document_id"] = {"$in": document_ids}
+    order = {"score": -1, "_id": 1} if rank else {"_id": 1}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$document_id", "hits": {"$sum": 1}, "score": {"$sum": "$tf"}}},
+        {"$match": {"hits": len(terms)}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "page": [{"$sort": order}, {"$skip": offset}, {"$limit": limit}, {"$project": {"_id": 1}}],
+        }},
+    ]
+    rows = await db.search_postings.aggregate(pipeline).to_list(1)
+    if not rows:
+        return 0, []
+    total = rows[0]["total"][0]["n"] if rows[0]["total"] else 0
+    return total, [r["_id"] for r in rows[0]["page"]]
+
+
+async def rebuild_index(batch_size: int = 500) -> int:
+    # app.core.content builds on this module
+    from app.core.content import BODY_FIELDS, iter_text
+
+    await db.search_postings.delete_many({})
+    indexed = 0
+    cursor = db.documents.find({}, {"owner_id": 1, "filename": 1, **BODY_FIELDS}).batch_size(batch_size)
+    async for doc in cursor:
+        if doc.get("chunked"):
+            counter = TermCounter()
+            async for piece in iter_text(doc):
+                counter.feed(piece)
+            await index_terms(doc["owner_id"], doc["_id"], counter.finish() + term_counts(doc.get("filename")))
+        else:
+            await index_document(doc)
+        indexed += 1
+    return indexed
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.db import db
+from app.core.ingest import commit_documents, stage_text
+
+# Demo data, written on request (`python -m app.cli seed`) instead of at startup. Documents
+# go through the normal ingest path, so postings, folder counts and facets exist for them.
+
+DEMO_USER = "u_demo"
+DEMO_DOCS = [
+    ("invoice_jan.txt", "invoices-2025", "Invoice #1001 Bank transfer GST"),
+    ("promo_letter.txt", "letters", "Limited time SALE unsubscribe: mailto:stop@brand.com"),
+]
+
+
+def demo_tokens() -> dict[str, str]:
+    def token(claims: dict) -> str:
+        return base64.b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode()
+
+    return {
+        "user": token({"sub": DEMO_USER, "email": "demo@example.com", "role": "user"}),
+        "admin": token({"sub": DEMO_USER, "email": "admin@example.com", "role": "admin"}),
+    }
+
+
+async def _claim_seed() -> bool:
+    # the marker makes concurrent or repeated runs seed once
+    try:
+        await db.app_state.insert_one({"_id": "demo_seed", "at": datetime.utcnow()})
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def seed_demo() -> bool:
+    # False when the demo data was already written
+    if not await _claim_seed():
+        return False
+    try:
+        now = datetime.utcnow()
+        await db.users.bulk_write([
+            UpdateOne({"_id": DEMO_USER}, {"$setOnInsert": {"email": "demo@example.com", "role": "user", "created_at": now}},
+                      upsert=True),
+            UpdateOne({"_id": "u_admin"}, {"$setOnInsert": {"email": "admin@example.com", "role": "admin", "created_at": now}},
+                      upsert=True),
+        ])
+        staged = [await stage_text(i, filename, "text/plain", folder, [], text)
+                  for i, (filename, folder, text) in enumerate(DEMO_DOCS)]
+        await commit_documents(DEMO_USER, staged)
+    except BaseException:
+        # release the marker so a failed seed can be run again
+        await db.app_state.delete_one({"_id": "demo_seed"})
+        raise
+    return True
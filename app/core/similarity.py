@@ -0,0 +1,150 @@
+import hashlib
+import math
+from collections import Counter, defaultdict
+from typing import Optional
+from app.db import db
+from app.core.content import BODY_FIELDS, iter_text
+from app.core.search_index import TermCounter
+
+# Near-duplicate detection. A document's signature is a 64-bit SimHash of its body terms
+# (weighted 1 + log tf, from the counts the ContentWriter already keeps), so copies that differ
+# by OCR noise land a few bits apart. For LSH the signature is cut into BANDS bands of 16 bits:
+# two signatures within MAX_DISTANCE <= BANDS - 1 bits agree on at least one whole band, so
+# candidates come from an exact match on `sim_bands` (multikey index) and are then checked
+# by Hamming distance. No pairwise pass over a folder.
+# A document stored as a copy keeps `duplicate_of`, always naming the first (root) document.
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+MAX_DISTANCE = BANDS - 1
+MIN_TERM_LEN = 3
+MODES = ("off", "flag", "link", "reject")
+# byte values with bit j set
+_WITH_BIT = [[v for v in range(256) if v >> j & 1] for j in range(8)]
+
+
+def simhash(counts: Counter) -> Optional[int]:
+    # None for bodies with nothing to fingerprint. Weights are summed per (byte position, byte
+    # value) first and spread to the 64 bits afterwards: 8 additions per term instead of ~32.
+    per_byte = [[0.0] * 256 for _ in range(BITS // 8)]
+    total = 0.0
+    for term, tf in counts.items():
+        if len(term) < MIN_TERM_LEN:
+            continue
+        w = 1 + math.log(tf)
+        total += w
+        for table, byte in zip(per_byte, hashlib.blake2b(term.encode(), digest_size=BITS // 8).digest()):
+            table[byte] += w
+    if not total:
+        return None
+    weights = [sum(map(table.__getitem__, _WITH_BIT[j])) for table in per_byte for j in range(8)]
+    # bit i is set when the terms with bit i set outweigh the rest
+    return sum(1 << i for i, w in enumerate(weights) if 2 * w > total)
+
+
+def bands(signature: int) -> list[int]:
+    # band index in the high bits, so equal values in different positions never match
+    mask = (1 << BAND_BITS) - 1
+    return [(i << BAND_BITS) | (signature >> (i * BAND_BITS) & mask) for i in range(BANDS)]
+
+
+def to_stored(signature: int) -> int:
+    # Mongo integers are signed 64-bit
+    return signature - (1 << BITS) if signature >= 1 << (BITS - 1) else signature
+
+
+def from_stored(value: int) -> int:
+    return value & ((1 << BITS) - 1)
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def signature_fields(counts: Counter) -> dict:
+    signature = simhash(counts)
+    if signature is None:
+        return {}
+    return {"simhash": to_stored(signature), "sim_bands": bands(signature)}
+
+
+def clusters(docs: list[dict], max_distance: int = MAX_DISTANCE) -> list[list[dict]]:
+    # docs carry simhash/sim_bands; returns groups of two or more, each document within
+    # max_distance of some other member. Exact copies share a signature, so the union-find
+    # runs over distinct signatures and buckets stay small.
+    by_signature = defaultdict(list)
+    for d in docs:
+        if d.get("simhash") is not None:
+            by_signature[from_stored(d["simhash"])].append(d)
+    signatures = list(by_signature)
+    parent = list(range(len(signatures)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets = defaultdict(list)
+    for i, signature in enumerate(signatures):
+        for band in bands(signature):
+            buckets[band].append(i)
+    for members in buckets.values():
+        for x, i in enumerate(members):
+            for j in members[x + 1:]:
+                ri, rj = find(i), find(j)
+                if ri != rj and distance(signatures[i], signatures[j]) <= max_distance:
+                    parent[rj] = ri
+    groups = defaultdict(list)
+    for i, signature in enumerate(signatures):
+        groups[find(i)].extend(by_signature[signature])
+    return [g for g in groups.values() if len(g) > 1]
+
+
+async def find_duplicates(owner_id: str, items: list[tuple[str, Optional[int]]],
+                          max_distance: int = MAX_DISTANCE) -> list[Optional[str]]:
+    # items: (document id, signature) of documents about to be stored, in order. For each, the
+    # root id of the closest stored document of owner_id, or of an earlier item, within
+    # max_distance; None for originals and unsigned items.
+    max_distance = min(max_distance, MAX_DISTANCE)
+    wanted = sorted({band for _, sig in items if sig is not None for band in bands(sig)})
+    buckets = defaultdict(list)
+    if wanted:
+        cursor = db.documents.find({"owner_id": owner_id, "sim_bands": {"$in": wanted}},
+                                   {"simhash": 1, "duplicate_of": 1}).sort("created_at", 1)
+        async for d in cursor:
+            signature = from_stored(d["simhash"])
+            for band in bands(signature):
+                buckets[band].append((signature, d.get("duplicate_of") or d["_id"]))
+    found = []
+    for document_id, sig in items:
+        if sig is None:
+            found.append(None)
+            continue
+        best = None
+        for band in bands(sig):
+            for other, root in buckets[band]:
+                d = distance(sig, other)
+                if d <= max_distance and (best is None or d < best[0]):
+                    best = (d, root)
+        found.append(best and best[1])
+        for band in bands(sig):
+            buckets[band].append((sig, found[-1] or document_id))
+    return found
+
+
+async def backfill_signatures(batch_size: int = 500) -> int:
+    # signs stored documents that predate signatures; copies stored as links are skipped
+    signed = 0
+    cursor = db.documents.find({"simhash": {"$exists": False}, "linked": {"$ne": True}},
+                               BODY_FIELDS).batch_size(batch_size)
+    async for doc in cursor:
+        counter = TermCounter()
+        async for piece in iter_text(doc):
+            counter.feed(piece)
+        fields = signature_fields(counter.finish())
+        if fields:
+            await db.documents.update_one({"_id": doc["_id"]}, {"$set": fields})
+            signed += 1
+    return signed
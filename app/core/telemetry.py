@@ -0,0 +1,189 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+from pymongo import monitoring
+
+# Request instrumentation, per process (each gunicorn worker reports its own numbers).
+# - TimingMiddleware times every request, labels it with the route template and adds a
+#   Server-Timing header (app time, Mongo time and command count).
+# - MongoCommandListener counts every Mongo command globally and, through a ContextVar,
+#   against the request that issued it. Motor runs pymongo in executor threads with a copy
+#   of the caller's context, so the listener sees the request even there.
+# render_prometheus() exposes all of it in the Prometheus text format.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class RequestStats:
+    __slots__ = ("commands", "db_seconds", "_lock")
+
+    def __init__(self):
+        self.commands = 0
+        self.db_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.commands += 1
+            self.db_seconds += seconds
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.latency: dict[tuple[str, str], Histogram] = {}
+            self.request_commands: dict[tuple[str, str], Histogram] = {}
+            self.request_db_seconds: dict[tuple[str, str], float] = {}
+            self.requests: dict[tuple[str, str, str], int] = {}
+            self.commands: dict[str, list] = {}  # name -> [count, seconds, failures]
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.request_commands.setdefault(key, Histogram(COMMAND_BUCKETS)).observe(stats.commands)
+            self.request_db_seconds[key] = self.request_db_seconds.get(key, 0.0) + stats.db_seconds
+            status_key = (method, route, str(status))
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+    def observe_command(self, name: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            row = self.commands.setdefault(name, [0, 0.0, 0])
+            row[0] += 1
+            row[1] += seconds
+            row[2] += failed
+
+
+registry = Registry()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._record(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._record(event, failed=True)
+
+    def _record(self, event, failed: bool) -> None:
+        seconds = event.duration_micros / 1e6
+        registry.observe_command(event.command_name, seconds, failed)
+        stats = _current.get()
+        if stats is not None:
+            stats.add(seconds)
+
+
+command_listener = MongoCommandListener()
+
+
+class TimingMiddleware:
+    # plain ASGI rather than BaseHTTPMiddleware: no extra task per request, and the
+    # ContextVar set here is the one the endpoint (and Motor's executor) sees
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - start) * 1000
+                timing = (f'app;dur={elapsed:.1f}, db;dur={stats.db_seconds * 1000:.1f};'
+                          f'desc="{stats.commands} commands"')
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # unmatched paths share one label so arbitrary URLs can't blow up cardinality
+            registry.observe_request(scope["method"], getattr(route, "path", "unmatched"), status,
+                                     time.perf_counter() - start, stats)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, series: dict, label_names: tuple) -> list[str]:
+    lines = []
+    for key, hist in sorted(series.items()):
+        labels = dict(zip(label_names, key))
+        cumulative = 0
+        for bound, n in zip(hist.buckets, hist.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    r = registry
+    with r._lock:
+        lines = [
+            "# HELP docflow_http_request_duration_seconds Request latency by route.",
+            "# TYPE docflow_http_request_duration_seconds histogram",
+            *_histogram_lines("docflow_http_request_duration_seconds", r.latency, ("method", "route")),
+            "# HELP docflow_http_requests_total Requests by route and status.",
+            "# TYPE docflow_http_requests_total counter",
+            *[f"docflow_http_requests_total{_labels(method=m, route=p, status=s)} {n}"
+              for (m, p, s), n in sorted(r.requests.items())],
+            "# HELP docflow_request_mongo_commands Mongo commands issued per request, by route.",
+            "# TYPE docflow_request_mongo_commands histogram",
+            *_histogram_lines("docflow_request_mongo_commands", r.request_commands, ("method", "route")),
+            "# HELP docflow_request_mongo_seconds_total Time spent in Mongo commands, by route.",
+            "# TYPE docflow_request_mongo_seconds_total counter",
+            *[f"docflow_request_mongo_seconds_total{_labels(method=m, route=p)} {s}"
+              for (m, p), s in sorted(r.request_db_seconds.items())],
+            "# HELP docflow_mongo_commands_total Mongo commands by name (requests and background work).",
+            "# TYPE docflow_mongo_commands_total counter",
+            *[f"docflow_mongo_commands_total{_labels(command=c)} {row[0]}" for c, row in sorted(r.commands.items())],
+            "# HELP docflow_mongo_command_seconds_total Mongo command time by name.",
+            "# TYPE docflow_mongo_command_seconds_total counter",
+            *[f"docflow_mongo_command_seconds_total{_labels(command=c)} {row[1]}" for c, row in sorted(r.commands.items())],
+            "# HELP docflow_mongo_command_failures_total Failed Mongo commands by name.",
+            "# TYPE docflow_mongo_command_failures_total counter",
+            *[f"docflow_mongo_command_failures_total{_labels(command=c)} {row[2]}" for c, row in sorted(r.commands.items())],
+        ]
+    return "\n".join(lines) + "\n"
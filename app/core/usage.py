@@ -0,0 +1,90 @@
+from datetime import datetime
+from typing import Optional
+from pymongo import ReplaceOne, UpdateOne
+from app.db import db
+from app.core.utils import new_id
+
+# Usage rollups: one document per (kind, user, month), plus an all-users row,
+# kept current with $inc so monthly reads are point lookups.
+
+ALL_USERS = "*"
+
+
+def month_key(at: Optional[datetime] = None) -> str:
+    return (at or datetime.utcnow()).strftime('%Y-%m')
+
+
+def rollup_id(kind: str, user_id: str, month: str) -> str:
+    return f"{kind}:{user_id}:{month}"
+
+
+def _inc(kind: str, user_id: str, month: str, credits: int, count: int = 1) -> UpdateOne:
+    return UpdateOne(
+        {"_id": rollup_id(kind, user_id, month)},
+        {"$inc": {"credits": credits, "count": count}, "$setOnInsert": {"kind": kind, "user_id": user_id, "month": month}},
+        upsert=True,
+    )
+
+
+async def record_usage(user_id: str, credits: int, kind: str = "actions_run", usage_id: Optional[str] = None,
+                       extra: Optional[dict] = None, session=None) -> dict:
+    # a caller-chosen usage_id makes the charge idempotent: a second insert raises DuplicateKeyError
+    at = datetime.utcnow()
+    row = {"_id": usage_id or new_id(), "user_id": user_id, "credits": credits, "at": at, "kind": kind, **(extra or {})}
+    await db.usages.insert_one(row, session=session)
+    month = month_key(at)
+    await db.usage_rollups.bulk_write([_inc(kind, user_id, month, credits), _inc(kind, ALL_USERS, month, credits)],
+                                      ordered=False, session=session)
+    return row
+
+
+async def refund_usage(row: dict) -> None:
+    # reverses record_usage, for a charge whose run was undone after it was written
+    month = month_key(row["at"])
+    await db.usages.delete_one({"_id": row["_id"]})
+    await db.usage_rollups.bulk_write([_inc(row["kind"], user_id, month, -row["credits"], -1)
+                                       for user_id in (row["user_id"], ALL_USERS)], ordered=False)
+
+
+async def get_month_usage(user_id: Optional[str], month: Optional[str] = None, kind: str = "actions_run") -> dict:
+    # user_id=None reads the all-users rollup
+    month = month or month_key()
+    row = await db.usage_rollups.find_one({"_id": rollup_id(kind, user_id or ALL_USERS, month)})
+    return {"month": month, "credits": (row or {}).get("credits", 0), "count": (row or {}).get("count", 0)}
+
+
+async def backfill_rollups(batch_size: int = 1000) -> int:
+    # rebuild every rollup from the raw usages history; safe to re-run, but only with actions
+    # stopped: the replace overwrites any $inc a live action made since the aggregation read
+    pipeline = [
+        {"$group": {"_id": {"kind": "$kind", "user_id": "$user_id",
+                            "month": {"$dateToString": {"format": "%Y-%m", "date": "$at"}}},
+                    "credits": {"$sum": "$credits"}, "count": {"$sum": 1}}},
+    ]
+    totals: dict[tuple, list[int]] = {}
+    ops, written = [], 0
+
+    async def flush():
+        nonlocal ops, written
+        if ops:
+            await db.usage_rollups.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+
+    def replace(kind, user_id, month, credits, count) -> ReplaceOne:
+        _id = rollup_id(kind, user_id, month)
+        doc = {"_id": _id, "kind": kind, "user_id": user_id, "month": month, "credits": credits, "count": count}
+        return ReplaceOne({"_id": _id}, doc, upsert=True)
+
+    async for g in db.usages.aggregate(pipeline, allowDiskUse=True):
+        key = g["_id"]
+        ops.append(replace(key["kind"], key["user_id"], key["month"], g["credits"], g["count"]))
+        total = totals.setdefault((key["kind"], key["month"]), [0, 0])
+        total[0] += g["credits"]
+        total[1] += g["count"]
+        if len(ops) >= batch_size:
+            await flush()
+    for (kind, month), (credits, count) in totals.items():
+        ops.append(replace(kind, ALL_USERS, month, credits, count))
+    await flush()
+    return written
@@ -1,11 +1,13 @@
-import re
+import json
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from app.db import db
+from app.core.audit_sink import write_audit
+from app.core.classifier import default_classifier
 
-FINANCIAL_TERMS = ['invoice','statement','bank','legal','court','tax','gst','pan','account']
-PROMO_TERMS = ['sale','discount','offer','deal','promo','unsubscribe','limited time']
 
 # IDs
 
@@ -13,8 +15,8 @@ def new_id() -> str:
     return str(uuid.uuid4())
 
 # Audit
-async def log_audit(user_id: Optional[str], action: str, entity_type: str, entity_id: Optional[str], metadata: Optional[dict] = None):
-    entry = {
+def audit_entry(user_id: Optional[str], action: str, entity_type: str, entity_id: Optional[str], metadata: Optional[dict] = None) -> dict:
+    return {
         "_id": new_id(),
         "at": datetime.utcnow(),
         "userId": user_id,
@@ -23,16 +25,113 @@ async def log_audit(user_id: Optional[str], action: str, entity_type: str, entit
         "entityId": entity_id,
         "metadata": metadata,
     }
-    await db.audit_logs.insert_one(entry)
+
+# buffered through app.core.audit_sink; durable=True waits until the entry is written
+async def log_audit(user_id: Optional[str], action: str, entity_type: str, entity_id: Optional[str], metadata: Optional[dict] = None,
+                    durable: Optional[bool] = None):
+    await write_audit([audit_entry(user_id, action, entity_type, entity_id, metadata)], durable)
+
+async def log_audit_many(entries: list[dict], durable: Optional[bool] = None):
+    await write_audit(entries, durable)
 
 # Tags
-async def find_or_create_tag(owner_id: str, name: str) -> dict:
-    tag = await db.tags.find_one({"owner_id": owner_id, "name": name})
-    if tag:
-        return tag
-    tag = {"_id": new_id(), "name": name, "owner_id": owner_id, "created_at": datetime.utcnow()}
-    await db.tags.insert_one(tag)
-    return tag
+# atomic upsert backed by the unique (owner_id, name) index
+async def find_or_create_tag(owner_id: str, name: str, session=None) -> dict:
+    query = {"owner_id": owner_id, "name": name}
+    try:
+        return await db.tags.find_one_and_update(
+            query,
+            {"$setOnInsert": {"_id": new_id(), "created_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+    except DuplicateKeyError:
+        # lost a concurrent upsert race; the winner's tag is there now
+        return await db.tags.find_one(query, session=session)
+
+# resolve many tag names at once: one find, plus one bulk upsert only when some are new
+async def resolve_tags(owner_id: str, names: list[str]) -> dict[str, dict]:
+    names = list(dict.fromkeys(n for n in names if n))
+    if not names:
+        return {}
+    query = {"owner_id": owner_id, "name": {"$in": names}}
+    tags = {t["name"]: t async for t in db.tags.find(query)}
+    missing = [n for n in names if n not in tags]
+    if missing:
+        now = datetime.utcnow()
+        ops = [UpdateOne({"owner_id": owner_id, "name": n}, {"$setOnInsert": {"_id": new_id(), "created_at": now}}, upsert=True)
+               for n in missing]
+        try:
+            await db.tags.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # duplicate keys are concurrent creators winning the race
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        async for t in db.tags.find({"owner_id": owner_id, "name": {"$in": missing}}):
+            tags[t["name"]] = t
+    return tags
+
+# merge tags that share (owner_id, name), left by upserts that ran before the unique index
+# existed: links move to the oldest tag and the rest are deleted. Returns the number removed.
+async def dedupe_tags() -> int:
+    pipeline = [
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {"_id": {"owner_id": "$owner_id", "name": "$name"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]
+    removed = 0
+    async for group in db.tags.aggregate(pipeline, allowDiskUse=True):
+        keep, dupes = group["ids"][0], group["ids"][1:]
+        await db.document_tags.update_many({"tag_id": {"$in": dupes}}, {"$set": {"tag_id": keep}})
+        # a document linked to more than one of the copies keeps one link, the primary if any
+        links = [
+            {"$match": {"tag_id": keep}},
+            {"$sort": {"is_primary": -1, "_id": 1}},
+            {"$group": {"_id": "$document_id", "ids": {"$push": "$_id"}}},
+            {"$match": {"ids.1": {"$exists": True}}},
+        ]
+        extra = [i async for g in db.document_tags.aggregate(links, allowDiskUse=True) for i in g["ids"][1:]]
+        if extra:
+            await db.document_tags.delete_many({"_id": {"$in": extra}})
+        removed += (await db.tags.delete_many({"_id": {"$in": dupes}})).deleted_count
+    return removed
+
+# NDJSON request bodies: yields (line_no, record, error) per non-empty line
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple[int, Optional[dict], Optional[str]]]:
+    buf = b""
+    line_no = 0
+    skipping = False
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            nl = buf.find(b"\n")
+            if nl < 0:
+                break
+            line, buf = buf[:nl], buf[nl + 1:]
+            if skipping:
+                skipping = False
+                continue
+            if line.strip():
+                yield _ndjson_record(line_no, line)
+            line_no += 1
+        if len(buf) > max_line_bytes and not skipping:
+            yield line_no, None, f"line exceeds {max_line_bytes} bytes"
+            line_no += 1
+            skipping = True
+        if skipping:
+            buf = b""
+    if buf.strip() and not skipping:
+        yield _ndjson_record(line_no, buf)
+
+def _ndjson_record(line_no: int, line: bytes) -> tuple[int, Optional[dict], Optional[str]]:
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return line_no, None, f"invalid JSON: {e}"
+    if not isinstance(record, dict):
+        return line_no, None, "record must be a JSON object"
+    return line_no, record, None
 
 # naive search
 def naive_match(text: str, q: str) -> bool:
@@ -40,48 +139,38 @@ def naive_match(text: str, q: str) -> bool:
     return q.lower() in text.lower()
 
 # actions processor
-async def mock_processor(scope: dict, context: list[dict]) -> dict:
-    titles = ", ".join([c["title"] for c in context])
-    seed = sum(len(c["sample"]) for c in context)
-    summary = f"Scope={scope['type']}{(':'+scope['name']) if scope.get('name') else ''}; Docs={len(context)}; Titles=[{titles}]"
-    text_out = f"# Generated Summary\n{summary}\nSeed={seed}"
-    # CSV rows
-    rows = ["doc_id,title,sample_len"]
-    for c in context:
-        title = c["title"].replace("\\", "\\\\").replace('"', '""')
-        rows.append(f'{c["id"]},"{title}",{len(c["sample"])})')
-    csv_out = "\n".join(rows) + "\n"
-    return {"text": text_out, "csv": csv_out}
+# Consumes context batches ({id, title, sample}) and writes the summary / CSV to
+# ContentWriter-like sinks as it goes, so memory is bounded by the batch size.
+# The summary header needs the final doc count, so it is handed to close(head=...).
+async def mock_processor(scope: dict, batches: AsyncIterator[list[dict]], text_out=None, csv_out=None) -> dict:
+    docs = seed = 0
+    if csv_out:
+        await csv_out.write("doc_id,title,sample_len\n")
+    async for batch in batches:
+        if text_out and batch:
+            await text_out.write((", " if docs else "") + ", ".join(c["title"] for c in batch))
+        if csv_out:
+            rows = []
+            for c in batch:
+                title = c["title"].replace("\\", "\\\\").replace('"', '""')
+                rows.append(f'{c["id"]},"{title}",{len(c["sample"])})\n')
+            await csv_out.write("".join(rows))
+        docs += len(batch)
+        seed += sum(len(c["sample"]) for c in batch)
+    out = {"docs": docs, "seed": seed, "text": None, "csv": None}
+    if text_out:
+        await text_out.write(f"]\nSeed={seed}")
+        summary_head = f"Scope={scope['type']}{(':'+scope['name']) if scope.get('name') else ''}; Docs={docs}; Titles=["
+        out["text"] = await text_out.close(head=f"# Generated Summary\n{summary_head}")
+    if csv_out:
+        out["csv"] = await csv_out.close()
+    return out
 
 # classification
 def classify_text(text: str) -> str:
-    t = (text or "").lower()
-    if any(w in t for w in FINANCIAL_TERMS):
-        return 'official'
-    if any(w in t for w in PROMO_TERMS):
-        return 'ad'
-    return 'unknown'
+    return default_classifier.classify(text)
 
 # unsubscribe extraction
 
 def extract_unsubscribe(text: str) -> Optional[dict]:
-    m = re.search(r'mailto:([^\s>]+)', text, flags=re.I)
-    if m:
-        return {"channel":"email","target":m.group(1)}
-    m = re.search(r'https?://[^\s>]+', text, flags=re.I)
-    if m:
-        return {"channel":"url","target":m.group(0)}
-    m = re.search(r'[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}', text, flags=re.I)
-    if m:
-        return {"channel":"email","target":m.group(0)}
-    return None
-
-# rate limit: max 3 tasks/day/source/user
-async def can_create_task_today(user_id: str, source: str) -> bool:
-    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    count = await db.tasks.count_documents({
-        "user_id": user_id,
-        "source": source,
-        "at": {"$gte": start}
-    })
-    return count < 3
\ No newline at end of file
+    return default_classifier.unsubscribe(text)
@@ -1,12 +1,70 @@
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.config import settings
+from app.core.telemetry import command_listener
 
-load_dotenv()
+# One Motor client per process. It is created lazily (or by connect() in the app lifespan),
+# never at import time, so a gunicorn master that imports the app before forking does not
+# hand a live client and its sockets to every worker.
+# `db` is a proxy: `from app.db import db` works everywhere and always hits the current client.
 
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "docflow")
+_client: Optional[AsyncIOMotorClient] = None
 
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
 
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        "appname": settings.MONGO_APP_NAME,
+    }
+    # 0 means "driver default" for these
+    for key, value in (("maxIdleTimeMS", settings.MONGO_MAX_IDLE_TIME_MS),
+                       ("socketTimeoutMS", settings.MONGO_SOCKET_TIMEOUT_MS),
+                       ("waitQueueTimeoutMS", settings.MONGO_WAIT_QUEUE_TIMEOUT_MS)):
+        if value:
+            options[key] = value
+    if settings.MONGO_COMMAND_TRACING:
+        options["event_listeners"] = [command_listener]
+    return options
+
+
+def get_client() -> AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(settings.MONGO_URL, **client_options())
+    return _client
+
+
+def get_db() -> AsyncIOMotorDatabase:
+    return get_client()[settings.DB_NAME]
+
+
+def set_client(client) -> None:
+    # swap in another client (e.g. an in-memory stand-in for benchmarks) before first use
+    global _client
+    _client = client
+
+
+async def connect() -> AsyncIOMotorDatabase:
+    return get_db()
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+class _Database:
+    def __getattr__(self, name: str):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name: str):
+        return get_db()[name]
+
+
+db = _Database()
@@ -1,34 +1,67 @@
-import base64
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.db import db
-from app.routes import docs, actions, ocr, metrics, audit
-from app.core.utils import new_id
-from datetime import datetime
-
-app = FastAPI(title="DocFlow — FastAPI + MongoDB")
-
-app.include_router(docs.router)
-app.include_router(actions.router)
-app.include_router(ocr.router)
-app.include_router(metrics.router)
-app.include_router(audit.router)
-
-@app.on_event("startup")
-async def seed():
-    # seed demo user artifacts: tags/docs/links
-    if await db.documents.count_documents({}) == 0:
-        uid = "u_demo"
-        db.users.insert_one({"_id": uid, "email": "demo@example.com", "role": "user", "created_at": datetime.utcnow()})
-        db.users.insert_one({"_id": uid, "email": "admin@example.com", "role": "admin", "created_at": datetime.utcnow()})
-        invoices = {"_id": new_id(), "name": "invoices-2025", "owner_id": uid, "created_at": datetime.utcnow()}
-        letters  = {"_id": new_id(), "name": "letters",        "owner_id": uid, "created_at": datetime.utcnow()}
-        await db.tags.insert_many([invoices, letters])
-        d1 = {"_id": new_id(), "owner_id": uid, "filename": "invoice_jan.txt", "mime": "text/plain", "text_content": "Invoice #1001 Bank transfer GST", "created_at": datetime.utcnow()}
-        d2 = {"_id": new_id(), "owner_id": uid, "filename": "promo_letter.txt", "mime": "text/plain", "text_content": "Limited time SALE unsubscribe: mailto:stop@brand.com", "created_at": datetime.utcnow()}
-        await db.documents.insert_many([d1, d2])
-        await db.document_tags.insert_many([
-            {"_id": new_id(), "document_id": d1["_id"], "tag_id": invoices["_id"], "is_primary": True},
-            {"_id": new_id(), "document_id": d2["_id"], "tag_id": letters["_id"],  "is_primary": True},
-        ])
-    print("Demo token (use as Bearer):", base64.b64encode(b'{"sub":"u_demo","email":"demo@example.com","role":"user"}').decode()) 
-    print("Admin token (use as Bearer):", base64.b64encode(b'{"sub":"u_demo","email":"admin@example.com","role":"admin"}').decode())
\ No newline at end of file
+from starlette.exceptions import HTTPException
+from app.db import connect, close
+from app.routes import docs, actions, ocr, metrics, audit, classifier
+from app.core.indexes import ensure_indexes
+from app.core.jobs import start_workers, stop_workers
+from app.core.audit_sink import start_audit_sink, stop_audit_sink
+from app.core.telemetry import TimingMiddleware
+from app.config import settings
+
+# Application factory. Importing this module builds the app but opens nothing: the Motor
+# client is created by the first query (see app.db), indexes are ensured at startup only with
+# STARTUP_ENSURE_INDEXES, and demo data is written by `python -m app.cli seed`, never here.
+
+
+async def _warm_routes(app: FastAPI) -> None:
+    # FastAPI builds each route's dependency state on the first request that tries it; an
+    # unmatched path tries every route, so one here moves that work off the first real request
+    scope = {"type": "http", "method": "GET", "path": "/__warmup__", "root_path": "", "query_string": b"",
+             "headers": [], "app": app}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    try:
+        await app.router(scope, receive, send)
+    except HTTPException:
+        pass
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # runs once per worker process: each gets its own Motor client and background tasks
+    await connect()
+    try:
+        if settings.STARTUP_ENSURE_INDEXES:
+            await ensure_indexes()
+        await start_audit_sink()
+        await start_workers()
+        await _warm_routes(app)
+        yield
+    finally:
+        # also on a failed startup, so nothing started so far is left running
+        await stop_workers()
+        # after the workers, so audit entries from their last jobs are flushed
+        await stop_audit_sink()
+        await close()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="DocFlow — FastAPI + MongoDB", lifespan=lifespan)
+    if settings.REQUEST_TIMING:
+        app.add_middleware(TimingMiddleware)
+    app.include_router(docs.router)
+    app.include_router(actions.router)
+    app.include_router(ocr.router)
+    app.include_router(metrics.router)
+    app.include_router(audit.router)
+    app.include_router(classifier.router)
+    return app
+
+
+app = create_app()
@@ -1,22 +1,42 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.schemas import AuditOut
 from app.core.auth import require_role, CurrentUser
-from app.main import db
+from app.core.audit_store import build_filter, decode_cursor, encode_cursor, iter_entries, naive_utc
+from app.core.fastjson import FastJSONResponse, dumps
 
 router = APIRouter(tags=["Audit"])
 
+AUDIT_PROJECTION = {"at": 1, "userId": 1, "action": 1, "entityType": 1, "entityId": 1, "metadata": 1}
+
+
 @router.get("/v1/audit", response_model=list[AuditOut])
-async def audit_log(user: CurrentUser = Depends(require_role(["admin","support","moderator"]))):
-    cursor = db.audit_logs.find({}).sort("at", -1).limit(200)
-    out = []
-    async for row in cursor:
-        out.append({
-            "_id": row["_id"],
-            "at": row["at"],
-            "userId": row.get("userId"),
-            "action": row["action"],
-            "entityType": row["entityType"],
-            "entityId": row.get("entityId"),
-            "metadata": row.get("metadata"),
-        })
-    return out
\ No newline at end of file
+async def audit_log(userId: Optional[str] = None, action: Optional[str] = None,
+                    entityType: Optional[str] = None, entityId: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    cursor: Optional[str] = None, limit: int = Query(200, ge=1, le=1000),
+                    format: Literal["json","ndjson"] = "json",
+                    user: CurrentUser = Depends(require_role(["admin","support","moderator"]))):
+    # newest first; page with the X-Next-Cursor header. format=ndjson streams every match (no limit).
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(400, "Bad cursor")
+    # `at` is stored as naive UTC; compare (and pick partitions) in UTC whatever offset was sent
+    since, until = naive_utc(since), naive_utc(until)
+    query = build_filter(userId, action, entityType, entityId, since, until, after)
+
+    if format == "ndjson":
+        async def lines():
+            async for row in iter_entries(query, since, until, after, projection=AUDIT_PROJECTION):
+                yield dumps(row) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    rows = [row async for row in iter_entries(query, since, until, after, limit=limit, projection=AUDIT_PROJECTION)]
+    headers = {"X-Next-Cursor": encode_cursor(rows[-1])} if len(rows) == limit else None
+    # rows are already AuditOut-shaped (AUDIT_PROJECTION), so skip response_model validation
+    return FastJSONResponse(rows, headers=headers)
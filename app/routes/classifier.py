@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.schemas import ClassifierTermsIn, ClassifierTermsOut
+from app.core.auth import require_role, CurrentUser
+from app.core.classifier import classifiers, set_terms
+
+router = APIRouter(tags=["Classifier"])
+
+# tenant is a user id, or "*" for the defaults every tenant falls back to
+
+@router.get("/v1/classifier/terms/{tenant}", response_model=ClassifierTermsOut)
+async def get_terms(tenant: str, user: CurrentUser = Depends(require_role(["admin"]))):
+    classifier = await classifiers.get(tenant)
+    return ClassifierTermsOut(tenant=tenant, **classifier.terms)
+
+
+@router.put("/v1/classifier/terms/{tenant}", response_model=ClassifierTermsOut)
+async def put_terms(tenant: str, body: ClassifierTermsIn, user: CurrentUser = Depends(require_role(["admin"]))):
+    # takes effect here immediately and on other workers within CLASSIFIER_RELOAD_SECONDS
+    try:
+        terms = await set_terms(tenant, body.model_dump())
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return ClassifierTermsOut(tenant=tenant, **terms)
@@ -1,129 +1,191 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query
-from datetime import datetime
-from app.schemas import DocOut, SearchOut
+from typing import Literal
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Request
+from app.config import settings
+from app.schemas import DocOut, SearchOut, BatchUploadOut, FacetsOut, DuplicatesOut
 from app.core.auth import require_role, write_guard, CurrentUser
-from app.main import db
-from app.core.utils import new_id, find_or_create_tag, log_audit, naive_match
+from app.db import db
+from app.core.utils import new_id, iter_ndjson
+from app.core.search_index import query_terms, search_postings
+from app.core.scope import resolve_scope
+from app.core.folders import list_folder_counts
+from app.core.content import ContentWriter, read_upload
+from app.core.ingest import stage, stage_text, item_error, commit_documents
+from app.core.cache import cached_response
+from app.core.fastjson import FastJSONResponse
+from app.core.facets import facet_cache
+from app.core.similarity import MAX_DISTANCE, MODES, clusters
 
 router = APIRouter(tags=["Documents"])
 
-@router.post("/v1/docs", response_model=DocOut)
+DOC_PROJECTION = {"filename": 1, "created_at": 1, "duplicate_of": 1}
+DedupeMode = Literal[MODES]
+
+@router.post("/v1/docs", response_model=DocOut, response_model_exclude_none=True)
 async def upload_doc(
     primaryTag: str = Form(...),
     secondaryTags: list[str] = Form([]),
     file: UploadFile = File(...),
+    dedupe: DedupeMode | None = None,
     user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))
 ):
     write_guard(user)
-    content = (await file.read()).decode(errors="ignore")
-
-    # ensure primary tag
-    ptag = await find_or_create_tag(user.id, primaryTag)
-
-    # create doc
-    doc = {
-        "_id": new_id(),
-        "owner_id": user.id,
-        "filename": file.filename,
-        "mime": file.content_type or "text/plain",
-        "text_content": content,
-        "created_at": datetime.utcnow(),
-    }
-    await db.documents.insert_one(doc)
-
-    # link primary
-    await db.document_tags.insert_one({
-        "_id": new_id(),
-        "document_id": doc["_id"],
-        "tag_id": ptag["_id"],
-        "is_primary": True,
-    })
-
-    # link secondary
-    for name in secondaryTags:
-        if not name or name == primaryTag:
-            continue
-        t = await find_or_create_tag(user.id, name)
-        await db.document_tags.insert_one({
-            "_id": new_id(),
-            "document_id": doc["_id"],
-            "tag_id": t["_id"],
-            "is_primary": False,
-        })
-
-    await log_audit(user.id, 'document.upload', 'Document', doc["_id"], {"filename": doc["filename"], "primaryTag": primaryTag})
-    return DocOut(**doc)
-
-@router.get("/v1/folders")
-async def list_folders(user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
-    # aggregate primary counts per tag name for this user (or all if admin)
-    pipeline = [
-        {"$match": {"is_primary": True}},
-        {"$lookup": {"from": "documents", "localField": "document_id", "foreignField": "_id", "as": "doc"}},
-        {"$unwind": "$doc"},
-        # tenant isolation unless admin
-        {"$match": ({"doc.owner_id": user.id} if user.role != 'admin' else {})},
-        {"$lookup": {"from": "tags", "localField": "tag_id", "foreignField": "_id", "as": "tag"}},
-        {"$unwind": "$tag"},
-        {"$group": {"_id": "$tag.name", "count": {"$sum": 1}}},
-        {"$project": {"_id": 0, "name": "$_id", "count": 1}},
-    ]
-    results = await db.document_tags.aggregate(pipeline).to_list(None)
-    return results
+    # stream the body in; large bodies are spilled to chunks as they arrive
+    writer = ContentWriter(new_id())
+    await read_upload(file, writer)
+    body = await writer.close()
+
+    docs, results = await commit_documents(user.id, [stage(0, file.filename, file.content_type, primaryTag, secondaryTags, writer, body)],
+                                           dedupe)
+    if not docs:
+        raise HTTPException(results[0]["code"], results[0]["error"])
+    return DocOut(**docs[0])
+
+async def _reject_batch(staged: list[dict], detail: str) -> None:
+    for item in staged:
+        await item["writer"].discard()
+    raise HTTPException(413, detail)
+
+@router.post("/v1/docs/batch", response_model=BatchUploadOut)
+async def upload_batch(request: Request, dedupe: DedupeMode | None = None, user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # multipart: files=... with shared primaryTag/secondaryTags
+    # NDJSON: one {"filename","text","primaryTag","secondaryTags","mime"} record per line
+    write_guard(user)
+    content_type = request.headers.get("content-type", "")
+    staged, results, total = [], [], 0
+
+    if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        async for line_no, record, error in iter_ndjson(request.stream(), settings.MAX_UPLOAD_BYTES):
+            if line_no >= settings.MAX_BATCH_ITEMS:
+                await _reject_batch(staged, f"Batch exceeds {settings.MAX_BATCH_ITEMS} items")
+            if error:
+                results.append(item_error(line_no, None, error))
+                continue
+            filename, text, primary = record.get("filename"), record.get("text"), record.get("primaryTag")
+            secondary = record.get("secondaryTags") or []
+            if not (isinstance(filename, str) and isinstance(text, str) and isinstance(primary, str) and primary) \
+                    or not isinstance(secondary, list):
+                results.append(item_error(line_no, filename if isinstance(filename, str) else None,
+                                          "filename, text and primaryTag required"))
+                continue
+            total += len(text)
+            if total > settings.MAX_BATCH_BYTES:
+                await _reject_batch(staged, f"Batch exceeds {settings.MAX_BATCH_BYTES} bytes")
+            staged.append(await stage_text(line_no, filename, record.get("mime"), primary, secondary, text))
+    elif content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=settings.MAX_BATCH_ITEMS)
+        primary = form.get("primaryTag")
+        if not primary:
+            raise HTTPException(400, "primaryTag required")
+        secondary = form.getlist("secondaryTags")
+        for i, file in enumerate(form.getlist("files")):
+            writer = ContentWriter(new_id())
+            try:
+                await read_upload(file, writer)
+            except HTTPException as e:
+                results.append(item_error(i, file.filename, e.detail))
+                continue
+            body = await writer.close()
+            staged.append(stage(i, file.filename, file.content_type, primary, secondary, writer, body))
+            total += body["size"]
+            if total > settings.MAX_BATCH_BYTES:
+                await _reject_batch(staged, f"Batch exceeds {settings.MAX_BATCH_BYTES} bytes")
+    else:
+        raise HTTPException(415, "Use multipart/form-data or application/x-ndjson")
 
-@router.get("/v1/folders/{tag}/docs", response_model=list[DocOut])
-async def list_docs_in_folder(tag: str, user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
-    # find tag(s)
-    tag_query = {"name": tag}
-    if user.role != 'admin':
-        tag_query["owner_id"] = user.id
-    tags = await db.tags.find(tag_query).to_list(None)
-    if not tags:
-        return []
-    tag_ids = [t["_id"] for t in tags]
+    _, committed = await commit_documents(user.id, staged, dedupe)
+    items = sorted(results + committed, key=lambda r: r["index"])
+    created = sum(1 for r in items if r["status"] == "created")
+    return BatchUploadOut(created=created, failed=len(items) - created, items=items)
 
-    # find primary doc links
-    links = await db.document_tags.find({"tag_id": {"$in": tag_ids}, "is_primary": True}).to_list(None)
-    doc_ids = [link["document_id"] for link in links]
+@router.get("/v1/folders")
+async def list_folders(request: Request, user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # maintained per-owner counts (summed across owners for admin)
+    return await cached_response(request, user, ("folders",),
+                                 lambda: list_folder_counts(None if user.role == 'admin' else user.id))
 
-    # fetch documents with tenant isolation
-    doc_query = {"_id": {"$in": doc_ids}}
-    if user.role != 'admin':
-        doc_query["owner_id"] = user.id
-    docs = await db.documents.find(doc_query).to_list(None)
 
-    return [DocOut(**d) for d in docs]
+@router.get("/v1/folders/{tag}/docs", response_model=list[DocOut])
+async def list_docs_in_folder(tag: str, request: Request,
+                              user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # rows are projected to DocOut's fields and serialized as they are
+    return await cached_response(request, user, ("folder_docs", tag),
+                                 lambda: resolve_scope(user, "folder", name=tag, projection=DOC_PROJECTION))
+
+
+@router.get("/v1/folders/{tag}/duplicates", response_model=DuplicatesOut)
+async def folder_duplicates(tag: str, request: Request, maxDistance: int = Query(MAX_DISTANCE, ge=0, le=MAX_DISTANCE),
+                            user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # near-duplicate groups among the folder's documents, largest first; grouping goes
+    # through signature band buckets, not document pairs
+    async def compute():
+        docs = await resolve_scope(user, "folder", name=tag, projection={**DOC_PROJECTION, "simhash": 1})
+        groups = sorted(clusters(docs, maxDistance), key=len, reverse=True)
+        for group in groups:
+            group.sort(key=lambda d: d["created_at"])
+            for d in group:
+                del d["simhash"]
+        return {"clusters": [{"size": len(g), "documents": g} for g in groups]}
+
+    return await cached_response(request, user, ("duplicates", tag, maxDistance), compute)
+
+
+def _facet_owner(user: CurrentUser, owner_id: str | None) -> str:
+    # tag bitmaps are per owner; admins pick one with ownerId (default: their own)
+    if owner_id and owner_id != user.id and user.role != 'admin':
+        raise HTTPException(403, "ownerId is admin only")
+    return owner_id or user.id
+
+
+async def _load_docs(ids: list[str]) -> list[dict]:
+    found = await db.documents.find({"_id": {"$in": ids}}, DOC_PROJECTION).to_list(None) if ids else []
+    by_id = {d["_id"]: d for d in found}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+@router.get("/v1/facets", response_model=FacetsOut)
+async def facets(folder: str | None = None, tags: list[str] = Query(default=[]), ownerId: str | None = None,
+                 offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500),
+                 user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # documents in `folder` (all folders when omitted) carrying every secondary tag in `tags`,
+    # newest first, plus secondary-tag counts over the whole match set
+    index = await facet_cache.get(_facet_owner(user, ownerId))
+    bits = index.select(folder, tags)
+    results = await _load_docs(index.document_ids(bits, offset, limit))
+    return FastJSONResponse({"count": bits.bit_count(), "results": results, "facets": index.facet_counts(bits)})
 
 
 @router.get("/v1/search", response_model=SearchOut)
 async def search(q: str, scope: str, name: str | None = None, ids: list[str] | None = Query(default=None),
+                 tags: list[str] | None = Query(default=None), ownerId: str | None = None,
+                 rank: bool = True, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500),
                  user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
     if scope not in {"folder","files"}:
         raise HTTPException(400, "scope must be either 'folder' or 'files'")
     if (scope == "folder" and ids) or (scope == "files" and name):
         raise HTTPException(400, "scope must be either folder or files, not both")
 
-    candidates = []
-    if scope == "folder":
-        if not name:
-            raise HTTPException(400, "Folder name required for folder scope")
-        tag_query = {"name": name}
-        if user.role != 'admin':
-            tag_query["owner_id"] = user.id
-        tag = await db.tags.find_one(tag_query)
-        if not tag:
-            return SearchOut(count=0, results=[])
-        # primary links for that tag
-        links = db.document_tags.find({"tag_id": tag["_id"], "is_primary": True})
-        async for link in links:
-            doc = await db.documents.find_one({"_id": link["document_id"]})
-            if doc and (user.role=='admin' or doc["owner_id"]==user.id):
-                candidates.append(doc)
+    if scope == "folder" and not name:
+        raise HTTPException(400, "Folder name required for folder scope")
+    owner_id = None if user.role == 'admin' else user.id
+    if tags:
+        # secondary-tag filter: the scope comes from one owner's tag bitmaps
+        owner_id = _facet_owner(user, ownerId)
+        index = await facet_cache.get(owner_id)
+        scope_ids = index.document_ids(index.select(name if scope == "folder" else None, tags))
+        if scope == "files":
+            wanted = set(ids or [])
+            scope_ids = [i for i in scope_ids if i in wanted]
+    elif scope == "folder":
+        scope_ids = [d["_id"] for d in await resolve_scope(user, "folder", name=name, projection={"_id": 1})]
     else:
-        for i in ids or []:
-            doc = await db.documents.find_one({"_id": i})
-            if doc and (user.role=='admin' or doc["owner_id"]==user.id):
-                candidates.append(doc)
+        scope_ids = list(ids or [])
+    if (scope == "folder" or tags) and not scope_ids:
+        return FastJSONResponse({"count": 0, "results": []})
+
+    # posting-list intersection; tenant isolation via the postings' owner_id
+    total, page_ids = await search_postings(query_terms(q), owner_id, scope_ids, rank=rank, offset=offset, limit=limit)
+    if not page_ids:
+        return FastJSONResponse({"count": total, "results": []})
 
-    results = [DocOut(**d) for d in candidates if naive_match(f"{d['text_content']} {d['filename']}", q)]
-    return SearchOut(count=len(results), results=results)
\ No newline at end of file
+    # only matching documents are loaded, and never their bodies
+    return FastJSONResponse({"count": total, "results": await _load_docs(page_ids)})
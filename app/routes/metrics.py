@@ -1,45 +1,51 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
 from datetime import datetime
 from app.schemas import MetricsOut
-from app.main import db
+from app.db import db
 from app.core.auth import require_role, CurrentUser
+from app.core.usage import get_month_usage
+from app.core.folders import count_folders
+from app.core import audit_sink
+from app.core.telemetry import render_prometheus
+from app.core.cache import cached_response
 
 router = APIRouter(tags=["Metrics"])
 
 @router.get("/v1/metrics", response_model=MetricsOut)
-async def metrics(user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+async def metrics(request: Request, user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # keyed by day so tasks_today (and the month rollup) roll over without a write
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return await cached_response(request, user, ("metrics", start.date().isoformat()), lambda: _metrics(user, start))
+
+async def _metrics(user: CurrentUser, start: datetime) -> MetricsOut:
     # docs total
     docs_filter = {} if user.role=='admin' else {"owner_id": user.id}
     docs_total = await db.documents.count_documents(docs_filter)
 
     # folders total (unique primary tag names)
-    pipeline = [
-        {"$match": {"is_primary": True}},
-        {"$lookup": {"from": "documents", "localField": "document_id", "foreignField": "_id", "as": "doc"}},
-        {"$unwind": "$doc"},
-        {"$match": ({} if user.role=='admin' else {"doc.owner_id": user.id})},
-        {"$lookup": {"from": "tags", "localField": "tag_id", "foreignField": "_id", "as": "tag"}},
-        {"$unwind": "$tag"},
-        {"$group": {"_id": "$tag.name"}},
-        {"$count": "folders_total"}
-    ]
-    rows = await db.document_tags.aggregate(pipeline).to_list(None)
-    folders_total = rows[0]["folders_total"] if rows else 0
+    folders_total = await count_folders(None if user.role == 'admin' else user.id)
 
     # actions this month
-    key = datetime.utcnow().strftime('%Y-%m')
-    actions_month = 0
-    async for u in db.usages.find({"kind":"actions_run"}):
-        if user.role!='admin' and u.get('user_id')!=user.id:
-            continue
-        if u['at'].strftime('%Y-%m') == key:
-            actions_month += 1
+    usage = await get_month_usage(None if user.role == 'admin' else user.id)
+    actions_month = usage["count"]
 
     # tasks today
-    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     tasks_filter = {"at": {"$gte": start}}
     if user.role != 'admin':
         tasks_filter["user_id"] = user.id
     tasks_today = await db.tasks.count_documents(tasks_filter)
 
-    return MetricsOut(docs_total=docs_total, folders_total=folders_total, actions_month=actions_month, tasks_today=tasks_today)
\ No newline at end of file
+    return MetricsOut(docs_total=docs_total, folders_total=folders_total, actions_month=actions_month, tasks_today=tasks_today)
+
+@router.get("/v1/metrics/audit")
+async def audit_sink_metrics(user: CurrentUser = Depends(require_role(["admin"]))):
+    # queue depth and flush latency of the buffered audit writer
+    if audit_sink.sink is None:
+        return {"running": False, "queue_depth": 0}
+    return audit_sink.sink.snapshot()
+
+@router.get("/v1/metrics/runtime", response_class=PlainTextResponse)
+async def runtime_metrics(user: CurrentUser = Depends(require_role(["admin"]))):
+    # per-route latency and Mongo command counts of this worker, Prometheus text format
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from datetime import datetime
-from app.schemas import OCRIn, OCRResp
+from pydantic import ValidationError
+from app.config import settings
+from app.schemas import OCRIn, OCRResp, OCRBatchOut
 from app.core.auth import require_role, write_guard, CurrentUser
-from app.core.utils import classify_text, extract_unsubscribe, can_create_task_today, new_id, log_audit
+from app.core.utils import new_id, log_audit, iter_ndjson
+from app.core.ratelimit import ocr_task_limiter
+from app.core.classifier import classifiers
+from app.core.ocr import ingest_ocr_batch, ocr_error
+from app.core.cache import bump_versions
 from app.db import db
 
 router = APIRouter(tags=["OCR"])
@@ -13,16 +19,61 @@ async def ocr_webhook(payload: OCRIn, user: CurrentUser = Depends(require_role([
     if not (payload.source and payload.imageId and payload.text):
         raise HTTPException(400, 'source,imageId,text required')
 
-    cls = classify_text(payload.text)
+    classifier = await classifiers.get(user.id)
+    cls = classifier.classify(payload.text)
     await log_audit(user.id, 'webhook.ocr.ingest', 'WebhookEvent', payload.imageId, {"source": payload.source, "cls": cls})
 
     task = None
     if cls == 'ad':
-        unsub = extract_unsubscribe(payload.text)
-        if unsub and await can_create_task_today(user.id, payload.source):
-            task = {"_id": new_id(), "user_id": user.id, "status": 'pending', "channel": unsub['channel'], "target": unsub['target'], "source": payload.source, "at": datetime.utcnow()}
-            await db.tasks.insert_one(task)
+        unsub = classifier.unsubscribe(payload.text)
+        now = datetime.utcnow()
+        if unsub and await ocr_task_limiter.reserve(user.id, payload.source, at=now):
+            task = {"_id": new_id(), "user_id": user.id, "status": 'pending', "channel": unsub['channel'], "target": unsub['target'], "source": payload.source, "at": now}
+            try:
+                await db.tasks.insert_one(task)
+            except Exception:
+                await ocr_task_limiter.release(user.id, payload.source, at=now)
+                raise
+            await bump_versions(user.id)
             await log_audit(user.id, 'task.create', 'Task', task["_id"], {"channel": task['channel'], "target": task['target'], "source": payload.source})
             task = {"id": task["_id"], "channel": task["channel"], "target": task["target"]}
 
-    return OCRResp(classification=cls, task_created=bool(task), task=task)
\ No newline at end of file
+    return OCRResp(classification=cls, task_created=bool(task), task=task)
+
+
+def _ocr_item(index: int, record, items: list, errors: list) -> None:
+    try:
+        items.append((index, OCRIn(**record)))
+    except (TypeError, ValidationError):
+        errors.append(ocr_error(index, "source,imageId,text required"))
+
+
+@router.post("/v1/webhooks/ocr/batch", response_model=OCRBatchOut)
+async def ocr_webhook_batch(request: Request, user: CurrentUser = Depends(require_role(["admin","user","support","moderator"]))):
+    # JSON array of OCRIn, or NDJSON with one OCRIn per line; (source, imageId) retries are idempotent
+    write_guard(user)
+    items, errors = [], []
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        async for line_no, record, error in iter_ndjson(request.stream(), settings.MAX_UPLOAD_BYTES):
+            if line_no >= settings.MAX_BATCH_ITEMS:
+                raise HTTPException(413, f"Batch exceeds {settings.MAX_BATCH_ITEMS} items")
+            if error:
+                errors.append(ocr_error(line_no, error))
+            else:
+                _ocr_item(line_no, record, items, errors)
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "Body must be a JSON array or NDJSON")
+        if not isinstance(body, list):
+            raise HTTPException(400, "Body must be a JSON array or NDJSON")
+        if len(body) > settings.MAX_BATCH_ITEMS:
+            raise HTTPException(413, f"Batch exceeds {settings.MAX_BATCH_ITEMS} items")
+        for i, record in enumerate(body):
+            _ocr_item(i, record, items, errors)
+
+    results = sorted(errors + await ingest_ocr_batch(user, items), key=lambda r: r["index"])
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("processed","duplicate","error")}
+    return OCRBatchOut(processed=counts["processed"], duplicates=counts["duplicate"], failed=counts["error"], items=results)
\ No newline at end of file
@@ -7,6 +7,20 @@ class DocOut(BaseModel):
     id: str = Field(alias="_id")
     filename: str
     created_at: datetime
+    duplicate_of: Optional[str] = None
+
+class BatchItemOut(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    status: Literal["created","error"]
+    id: Optional[str] = None
+    error: Optional[str] = None
+    duplicate_of: Optional[str] = None
+
+class BatchUploadOut(BaseModel):
+    created: int
+    failed: int
+    items: List[BatchItemOut]
 
 class FolderOut(BaseModel):
     name: str
@@ -16,6 +30,22 @@ class SearchOut(BaseModel):
     count: int
     results: List[DocOut]
 
+class FacetCount(BaseModel):
+    name: str
+    count: int
+
+class FacetsOut(BaseModel):
+    count: int
+    results: List[DocOut]
+    facets: List[FacetCount]
+
+class DuplicateClusterOut(BaseModel):
+    size: int
+    documents: List[DocOut]
+
+class DuplicatesOut(BaseModel):
+    clusters: List[DuplicateClusterOut]
+
 class ActionScope(BaseModel):
     type: Literal["folder","files"]
     name: Optional[str] = None
@@ -29,6 +59,18 @@ class ActionRunIn(BaseModel):
 class ActionRunOut(BaseModel):
     created: List[dict]
     credits_charged: int
+    job_id: Optional[str] = None
+    status: Literal["done","queued"] = "done"
+
+class ActionJobOut(BaseModel):
+    id: str = Field(alias="_id")
+    status: Literal["queued","running","done","failed"]
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    attempts: int = 0
+    result: Optional[ActionRunOut] = None
+    error: Optional[str] = None
 
 class OCRIn(BaseModel):
     source: str
@@ -41,6 +83,31 @@ class OCRResp(BaseModel):
     task_created: bool
     task: Optional[dict]
 
+class OCRBatchItemOut(BaseModel):
+    index: int
+    source: Optional[str] = None
+    imageId: Optional[str] = None
+    status: Literal["processed","duplicate","error"]
+    classification: Optional[Literal["official","ad","unknown"]] = None
+    task_created: bool = False
+    task: Optional[dict] = None
+    error: Optional[str] = None
+
+class OCRBatchOut(BaseModel):
+    processed: int
+    duplicates: int
+    failed: int
+    items: List[OCRBatchItemOut]
+
+class ClassifierTermsIn(BaseModel):
+    official: Optional[List[str]] = None
+    ad: Optional[List[str]] = None
+
+class ClassifierTermsOut(BaseModel):
+    tenant: str
+    official: List[str]
+    ad: List[str]
+
 class UsageMonthOut(BaseModel):
     month: str
     credits: int
@@ -42,3 +42,164 @@ def test_credits_tracking_on_scoped_actions(client, user_token):
     assert res.status_code == 200
     usage = res.json()
     assert usage["credits"] >= 5
+
+def test_usage_month_reads_rollup(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    before = client.get("/v1/actions/usage/month", headers=headers).json()["credits"]
+    payload = {
+        "scope": {"type": "files", "ids": []},
+        "messages": [{"role": "user", "content": "noop"}],
+        "actions": []
+    }
+    assert client.post("/v1/actions/run", json=payload, headers=headers).status_code == 200
+    after = client.get("/v1/actions/usage/month", headers=headers).json()
+    assert after["credits"] == before + 5
+
+async def test_async_mode_enqueues_job(client, user_token):
+    from app.core.jobs import process_next_job
+    headers = {"Authorization": f"Bearer {user_token}"}
+    payload = {
+        "scope": {"type": "folder", "name": "invoices"},
+        "messages": [{"role": "user", "content": "make csv"}],
+        "actions": ["make_csv"]
+    }
+    res = client.post("/v1/actions/run", params={"mode": "async"}, json=payload, headers=headers)
+    assert res.status_code == 202
+    job_id = res.json()["job_id"]
+    assert client.get(f"/v1/actions/jobs/{job_id}", headers=headers).json()["status"] == "queued"
+
+    while await process_next_job():
+        pass
+    job = client.get(f"/v1/actions/jobs/{job_id}", headers=headers).json()
+    assert job["status"] == "done"
+    assert job["result"]["created"][0]["type"] == "csv"
+
+async def test_mock_processor_streams_batches():
+    from app.core.utils import mock_processor
+    from app.core.content import ContentWriter
+
+    async def batches():
+        yield [{"id": "d1", "title": "a.txt", "sample": "xx"}]
+        yield [{"id": "d2", "title": 'b "q".txt', "sample": "yyy"}]
+
+    text_out, csv_out = ContentWriter("t"), ContentWriter("c")
+    out = await mock_processor({"type": "folder", "name": "inv"}, batches(), text_out, csv_out)
+    assert out["text"]["text_content"] == "# Generated Summary\nScope=folder:inv; Docs=2; Titles=[a.txt, b \"q\".txt]\nSeed=5"
+    assert out["csv"]["text_content"].splitlines() == ["doc_id,title,sample_len", 'd1,"a.txt",2)', 'd2,"b ""q"".txt",3)']
+
+def test_idempotency_key_replays_without_charging(client, user_token):
+    from app.core.utils import new_id
+    headers = {"Authorization": f"Bearer {user_token}", "Idempotency-Key": new_id()}
+    payload = {
+        "scope": {"type": "files", "ids": []},
+        "messages": [{"role": "user", "content": "both"}],
+        "actions": ["make_document", "make_csv"]
+    }
+    before = client.get("/v1/actions/usage/month", headers=headers).json()["credits"]
+    first = client.post("/v1/actions/run", json=payload, headers=headers).json()
+    again = client.post("/v1/actions/run", json=payload, headers=headers).json()
+    assert again == first and [c["type"] for c in first["created"]] == ["document", "csv"]
+    assert client.get("/v1/actions/usage/month", headers=headers).json()["credits"] == before + 5
+    folders = client.get("/v1/folders", headers=headers).json()
+    assert any(f["name"] == "generated" and f["count"] >= 2 for f in folders)
+
+
+async def test_concurrent_duplicate_commit_is_undone():
+    from pymongo.errors import DuplicateKeyError
+    from app.core.actions import commit_action
+    from app.core.content import ContentWriter
+    from app.db import db
+    from app.core.utils import new_id
+    from app.schemas import CurrentUser
+    user = CurrentUser(id=new_id(), email="d@x.com", role="user")
+    winner, loser, key = new_id(), new_id(), new_id()
+
+    async def outputs(doc_id):
+        writer = ContentWriter(doc_id)
+        await writer.write("generated body")
+        body = await writer.close()
+        return [("document", writer, {"_id": doc_id, "owner_id": user.id, "filename": f"{doc_id}.md", **body})]
+
+    await commit_action(user, await outputs(winner), {"created": [{"type": "document", "id": winner}]}, key)
+    with pytest.raises(DuplicateKeyError):
+        await commit_action(user, await outputs(loser), {"created": [{"type": "document", "id": loser}]}, key)
+    # the loser's writes are rolled back, the winner's stay
+    assert await db.documents.find_one({"_id": winner}) and not await db.documents.find_one({"_id": loser})
+    assert await db.search_postings.count_documents({"document_id": loser}) == 0
+    assert await db.document_tags.count_documents({"document_id": loser}) == 0
+    folder = await db.folder_counts.find_one({"owner_id": user.id, "name": "generated"})
+    assert folder["count"] == 1
+
+
+async def test_failed_commit_round_is_undone(monkeypatch):
+    from app.core import actions
+    from app.core.usage import get_month_usage
+    from app.core.utils import new_id
+    from app.db import db
+    from app.schemas import ActionRunIn, CurrentUser
+    user = CurrentUser(id=new_id(), email="f@x.com", role="user")
+    body = ActionRunIn(scope={"type": "files", "ids": []}, messages=[{"role": "user", "content": "both"}],
+                       actions=["make_document", "make_csv"])
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("tag_members unavailable")
+
+    # round 2: the charge and the links go in, the members do not
+    monkeypatch.setattr(actions, "add_members", broken)
+    with pytest.raises(RuntimeError):
+        await actions.run_action(user, body)
+    assert await db.documents.count_documents({"owner_id": user.id}) == 0
+    assert await db.search_postings.count_documents({"owner_id": user.id}) == 0
+    assert await db.usages.count_documents({"user_id": user.id}) == 0
+    assert (await get_month_usage(user.id))["credits"] == 0
+    assert not await db.folder_counts.find_one({"owner_id": user.id, "name": "generated", "count": {"$ne": 0}})
+
+    # round 1: documents inserted, postings not
+    monkeypatch.undo()
+    monkeypatch.setattr(actions, "index_many", broken)
+    with pytest.raises(RuntimeError):
+        await actions.run_action(user, body)
+    assert await db.documents.count_documents({"owner_id": user.id}) == 0
+    assert await db.usages.count_documents({"user_id": user.id}) == 0
+
+
+async def test_action_context_samples_every_body_kind(tmp_path, monkeypatch):
+    from app.config import settings
+    from app.core import content
+    from app.core.actions import SAMPLE_LEN, iter_context, run_action
+    from app.core.content import load_text, move_to_cold
+    from app.core.ingest import commit_documents, stage_text
+    from app.core.utils import new_id
+    from app.db import db
+    from app.schemas import ActionRunIn, ActionScope, CurrentUser
+    monkeypatch.setattr(settings, "INLINE_TEXT_MAX", 100)
+    monkeypatch.setattr(settings, "CONTENT_CHUNK_SIZE", 256)
+    monkeypatch.setattr(content.cold_store, "root", str(tmp_path))
+    user = CurrentUser(id=new_id(), email="s@x.com", role="user")
+    words = "ledger balance invoice remittance statement account quarter audit payment reference".split()
+    long_a = " ".join(f"{w}{i}" for i, w in enumerate(words * 40))
+    long_b = " ".join(f"{w}-{i}" for i, w in enumerate(reversed(words * 40)))
+    texts = {"inline.txt": "short inline body", "chunked.txt": long_a, "cold.txt": long_b}
+
+    staged = [await stage_text(i, name, None, "sampled", [], text) for i, (name, text) in enumerate(texts.items())]
+    docs, _ = await commit_documents(user.id, staged, "off")
+    ids = {d["filename"]: d["_id"] for d in docs}
+    assert await move_to_cold(await db.documents.find_one({"_id": ids["cold.txt"]}))
+    # a rescan of chunked.txt stored as a link: no body, the original's sample
+    _, results = await commit_documents(user.id, [await stage_text(0, "linked.txt", None, "sampled", [],
+                                                                   long_a.replace("audit7", "audlt7"))], "link")
+    assert results[0]["duplicate_of"] == ids["chunked.txt"]
+    texts["linked.txt"] = long_a
+
+    scope = ActionScope(type="folder", name="sampled")
+    samples = {c["title"]: c["sample"] async for batch in iter_context(user, scope) for c in batch}
+    assert samples == {name: text[:SAMPLE_LEN] for name, text in texts.items()}
+
+    body = ActionRunIn(scope=scope, messages=[{"role": "user", "content": "both"}],
+                       actions=["make_document", "make_csv"])
+    created = {c["type"]: c["id"] for c in (await run_action(user, body))["created"]}
+    csv = await load_text(await db.documents.find_one({"_id": created["csv"]}))
+    lengths = {row.split(",")[1].strip('"'): row.split(",")[2] for row in csv.splitlines()[1:]}
+    assert lengths == {name: f"{len(text[:SAMPLE_LEN])})" for name, text in texts.items()}
+    summary = await load_text(await db.documents.find_one({"_id": created["document"]}))
+    assert summary.endswith(f"Seed={sum(len(t[:SAMPLE_LEN]) for t in texts.values())}")
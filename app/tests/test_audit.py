@@ -0,0 +1,116 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.audit_sink import AuditSink
+from app.core.audit_store import build_filter, decode_cursor, encode_cursor, insert_entries, iter_entries, partition_name
+from app.core.utils import audit_entry, new_id
+from app.db import db
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def admin_token():
+    return base64.b64encode(json.dumps({"sub": "admin1", "email": "admin@demo.com", "role": "admin"}).encode()).decode()
+
+
+async def test_audit_sink_batches_and_flushes_on_stop():
+    sink = AuditSink(batch_size=50, flush_interval=5.0, max_queue=10)
+    sink.start()
+    entries = [audit_entry("u_sink", "test.sink", "Test", str(i)) for i in range(25)]
+    # more entries than the queue holds: submit applies backpressure instead of dropping
+    await sink.submit(entries)
+    await sink.stop()
+    assert sink.stats["written"] == 25
+    assert sink.queue_depth() == 0
+    partition = db[partition_name(entries[0]["at"])]
+    assert await partition.count_documents({"_id": {"$in": [e["_id"] for e in entries]}}) == 25
+
+
+async def test_audit_sink_durable_submit_waits_for_write():
+    sink = AuditSink(batch_size=50, flush_interval=0.05, max_queue=100)
+    sink.start()
+    entry = audit_entry("u_sink", "test.durable", "Test", None)
+    await asyncio.wait_for(sink.submit([entry], wait=True), 5)
+    assert await db[partition_name(entry["at"])].find_one({"_id": entry["_id"]})
+    await sink.stop()
+
+
+async def test_audit_partitions_and_keyset_pages():
+    user = new_id()
+    jan, feb = datetime(2024, 1, 31, 23, 59), datetime(2024, 2, 1, 0, 1)
+    entries = [{**audit_entry(user, "test.page", "Test", str(i)), "at": jan if i < 3 else feb} for i in range(5)]
+    await insert_entries(entries)
+    assert await db[partition_name(jan)].count_documents({"userId": user}) == 3
+    assert await db[partition_name(feb)].count_documents({"userId": user}) == 2
+
+    seen, after = [], None
+    while True:
+        page = [r async for r in iter_entries(build_filter(user_id=user, after=after), after=after, limit=2)]
+        seen += page
+        if len(page) < 2:
+            break
+        after = decode_cursor(encode_cursor(page[-1]))
+    assert sorted(r["_id"] for r in seen) == sorted(e["_id"] for e in entries)
+    keys = [(r["at"], r["_id"]) for r in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    since = datetime(2024, 2, 1)
+    recent = [r async for r in iter_entries(build_filter(user_id=user, since=since), since=since)]
+    assert len(recent) == 2
+
+
+def test_audit_route_filters_cursor_and_ndjson(client, admin_token):
+    user = new_id()
+    token = base64.b64encode(json.dumps({"sub": user, "email": "a@x.com", "role": "user"}).encode()).decode()
+    for i in range(3):
+        res = client.post("/v1/docs", data={"primaryTag": "audited"},
+                          files={"file": (f"a{i}.txt", b"hello", "text/plain")},
+                          headers={"Authorization": f"Bearer {token}"})
+        assert res.status_code == 200
+    admin = {"Authorization": f"Bearer {admin_token}"}
+
+    res = client.get("/v1/audit", params={"userId": user, "limit": 2}, headers=admin)
+    assert res.status_code == 200
+    first = res.json()
+    assert len(first) == 2 and all(r["userId"] == user for r in first)
+    res = client.get("/v1/audit", params={"userId": user, "limit": 2, "cursor": res.headers["X-Next-Cursor"]},
+                     headers=admin)
+    rest = res.json()
+    assert len(rest) == 1 and "X-Next-Cursor" not in res.headers
+    assert {r["_id"] for r in first}.isdisjoint(r["_id"] for r in rest)
+
+    res = client.get("/v1/audit", params={"userId": user, "format": "ndjson"}, headers=admin)
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [r["_id"] for r in lines] == [r["_id"] for r in first + rest]
+
+    assert client.get("/v1/audit", params={"cursor": "nope"}, headers=admin).status_code == 400
+
+
+def test_audit_route_offset_timestamps_with_cursor(client, admin_token):
+    user = new_id()
+    token = base64.b64encode(json.dumps({"sub": user, "email": "t@x.com", "role": "user"}).encode()).decode()
+    for i in range(3):
+        client.post("/v1/docs", data={"primaryTag": "audited-tz"}, files={"file": (f"t{i}.txt", b"hello", "text/plain")},
+                    headers={"Authorization": f"Bearer {token}"})
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    now = datetime.utcnow()
+    # an offset-aware window that covers now only when read as UTC
+    params = {"userId": user, "limit": 2, "since": f"{now - timedelta(hours=1):%Y-%m-%dT%H:%M:%S}Z",
+              "until": f"{now + timedelta(hours=1):%Y-%m-%dT%H:%M:%S}+00:00"}
+    res = client.get("/v1/audit", params=params, headers=admin)
+    assert res.status_code == 200 and len(res.json()) == 2
+    res = client.get("/v1/audit", params={**params, "cursor": res.headers["X-Next-Cursor"]}, headers=admin)
+    assert res.status_code == 200 and len(res.json()) == 1
+    # the same instant written with another offset selects the same rows
+    later = (now + timedelta(hours=1)).replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-5)))
+    res = client.get("/v1/audit", params={**params, "until": later.isoformat()}, headers=admin)
+    assert len(res.json()) == 2
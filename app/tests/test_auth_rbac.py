@@ -39,4 +39,26 @@ def test_jwt_isolation_and_role_enforcement(client, user_token, admin_token):
     # admin can see all docs
     res = client.get("/v1/folders/letters/docs",
                      headers={"Authorization": f"Bearer {admin_token}"})
-    assert any(d["_id"] == doc_id for d in res.json())
\ No newline at end of file
+    assert any(d["_id"] == doc_id for d in res.json())
+
+def test_signed_tokens_are_verified_and_cached(client, monkeypatch):
+    import time
+    from jose import jwt
+    from app.config import settings
+    from app.core.auth import token_cache
+    monkeypatch.setattr(settings, "JWT_SECRET", "test-secret")
+    monkeypatch.setattr(settings, "JWT_ALGORITHMS", ["HS256"])
+    claims = {"sub": "signed_user", "email": "s@demo.com", "role": "user", "exp": int(time.time()) + 60}
+
+    good = jwt.encode(claims, "test-secret", algorithm="HS256")
+    res = client.get("/v1/folders", headers={"Authorization": f"Bearer {good}"})
+    assert res.status_code == 200
+    assert token_cache.get(good).id == "signed_user"
+
+    forged = jwt.encode(claims, "wrong-secret", algorithm="HS256")
+    res = client.get("/v1/folders", headers={"Authorization": f"Bearer {forged}"})
+    assert res.status_code == 401
+
+    expired = jwt.encode({**claims, "exp": int(time.time()) - 1}, "test-secret", algorithm="HS256")
+    res = client.get("/v1/folders", headers={"Authorization": f"Bearer {expired}"})
+    assert res.status_code == 401
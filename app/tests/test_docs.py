@@ -46,4 +46,271 @@ def test_folder_vs_file_scope_rule(client, user_token):
     res = client.get("/v1/search", params=qparams,
                      headers={"Authorization": f"Bearer {user_token}"})
     assert res.status_code == 400
-    assert "either folder or files" in res.text
\ No newline at end of file
+    assert "either folder or files" in res.text
+
+def test_folder_listing_resolves_all_primary_docs(client, user_token):
+    ids = set()
+    for i in range(3):
+        files = {"file": (f"scoped_{i}.txt", b"scoped content", "text/plain")}
+        res = client.post("/v1/docs", data={"primaryTag": "scoped-folder", "secondaryTags": ["other"]}, files=files,
+                          headers={"Authorization": f"Bearer {user_token}"})
+        ids.add(res.json()["_id"])
+
+    res = client.get("/v1/folders/scoped-folder/docs", headers={"Authorization": f"Bearer {user_token}"})
+    assert res.status_code == 200
+    assert ids <= {d["_id"] for d in res.json()}
+
+    # secondary links are not part of the folder scope
+    res = client.get("/v1/folders/other/docs", headers={"Authorization": f"Bearer {user_token}"})
+    assert not ids & {d["_id"] for d in res.json()}
+
+
+def test_folder_counts_track_uploads(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    def count():
+        folders = client.get("/v1/folders", headers=headers).json()
+        return next((f["count"] for f in folders if f["name"] == "counted"), 0)
+
+    before = count()
+    for i in range(2):
+        files = {"file": (f"counted_{i}.txt", b"body", "text/plain")}
+        client.post("/v1/docs", data={"primaryTag": "counted", "secondaryTags": ["extra"]}, files=files, headers=headers)
+    assert count() == before + 2
+
+
+def test_large_upload_is_chunked_and_capped(client, user_token, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "INLINE_TEXT_MAX", 1024)
+    monkeypatch.setattr(settings, "CONTENT_CHUNK_SIZE", 512)
+    monkeypatch.setattr(settings, "UPLOAD_READ_SIZE", 300)
+    headers = {"Authorization": f"Bearer {user_token}"}
+
+    body = b"filler text " * 400 + b"needleword at the end"
+    files = {"file": ("big.txt", body, "text/plain")}
+    res = client.post("/v1/docs", data={"primaryTag": "big-uploads"}, files=files, headers=headers)
+    assert res.status_code == 200
+    doc_id = res.json()["_id"]
+
+    # terms past the inline threshold are still indexed
+    res = client.get("/v1/search", params={"q": "needleword", "scope": "files", "ids": [doc_id]}, headers=headers)
+    assert res.json()["count"] == 1
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 1000)
+    res = client.post("/v1/docs", data={"primaryTag": "big-uploads"}, files=files, headers=headers)
+    assert res.status_code == 413
+
+
+def test_batch_upload_multipart_and_ndjson(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    files = [("files", ("batch_a.txt", b"alpha body", "text/plain")),
+             ("files", ("batch_b.txt", b"beta body", "text/plain"))]
+    res = client.post("/v1/docs/batch", data={"primaryTag": "batched", "secondaryTags": ["bulk"]}, files=files,
+                      headers=headers)
+    assert res.status_code == 200
+    out = res.json()
+    assert out["created"] == 2 and out["failed"] == 0
+    assert [i["filename"] for i in out["items"]] == ["batch_a.txt", "batch_b.txt"]
+
+    lines = [
+        json.dumps({"filename": "nd_1.txt", "text": "gamma body", "primaryTag": "batched"}),
+        "not json",
+        json.dumps({"filename": "nd_2.txt", "primaryTag": "batched"}),
+        json.dumps({"filename": "nd_3.txt", "text": "delta body", "primaryTag": "batched", "secondaryTags": ["bulk"]}),
+    ]
+    res = client.post("/v1/docs/batch", content="\n".join(lines).encode(),
+                      headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert res.status_code == 200
+    out = res.json()
+    assert out["created"] == 2 and out["failed"] == 2
+    assert [i["status"] for i in out["items"]] == ["created", "error", "error", "created"]
+
+    docs = client.get("/v1/folders/batched/docs", headers=headers).json()
+    names = {d["filename"] for d in docs}
+    assert {"batch_a.txt", "batch_b.txt", "nd_1.txt", "nd_3.txt"} <= names
+
+
+async def test_failed_side_writes_undo_the_upload(monkeypatch):
+    from app.db import db
+    from app.core import ingest
+    from app.core.folders import list_folder_counts
+    from app.core.utils import new_id
+
+    owner = new_id()
+
+    async def broken(entries):
+        raise RuntimeError("postings unavailable")
+
+    monkeypatch.setattr(ingest, "index_many", broken)
+    staged = [await ingest.stage_text(i, f"undo_{i}.txt", None, "undo", ["undo-extra"], "some body")
+              for i in range(2)]
+    docs, results = await ingest.commit_documents(owner, staged)
+    assert docs == [] and [r["code"] for r in results] == [503, 503]
+    ids = [s["writer"].document_id for s in staged]
+    assert await db.documents.count_documents({"_id": {"$in": ids}}) == 0
+    assert await db.document_tags.count_documents({"document_id": {"$in": ids}}) == 0
+    assert await list_folder_counts(owner) == []
+
+    # a broken audit write leaves the stored documents alone
+    monkeypatch.undo()
+    monkeypatch.setattr(ingest, "log_audit_many", broken)
+    staged = [await ingest.stage_text(0, "audited.txt", None, "undo", [], "some body")]
+    docs, results = await ingest.commit_documents(owner, staged)
+    assert results[0]["status"] == "created"
+    assert await list_folder_counts(owner) == [{"name": "undo", "count": 1}]
+
+
+def test_batch_upload_total_size_is_capped(client, user_token, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "MAX_BATCH_BYTES", 30)
+    headers = {"Authorization": f"Bearer {user_token}", "Content-Type": "application/x-ndjson"}
+    lines = [json.dumps({"filename": f"cap_{i}.txt", "text": "x" * 20, "primaryTag": "capped"}) for i in range(2)]
+    res = client.post("/v1/docs/batch", content="\n".join(lines).encode(), headers=headers)
+    assert res.status_code == 413
+    assert not any(f["name"] == "capped" for f in client.get("/v1/folders", headers=headers).json())
+
+
+def test_dashboard_cache_etag_and_invalidation(client, admin_token):
+    from app.core.utils import new_id
+    token = base64.b64encode(json.dumps({"sub": new_id(), "email": "c@x.com", "role": "user"}).encode()).decode()
+    user = {"Authorization": f"Bearer {token}"}
+    admin = {"Authorization": f"Bearer {admin_token}"}
+
+    def upload(name):
+        res = client.post("/v1/docs", data={"primaryTag": "cached"}, headers=user,
+                          files={"file": (name, b"hello", "text/plain")})
+        assert res.status_code == 200
+
+    upload("c1.txt")
+    res = client.get("/v1/folders/cached/docs", headers=user)
+    assert len(res.json()) == 1
+    etag = res.headers["ETag"]
+    assert client.get("/v1/folders/cached/docs", headers={**user, "If-None-Match": etag}).status_code == 304
+    admin_total = client.get("/v1/metrics", headers=admin).json()["docs_total"]
+
+    # an upload bumps the user's version and the admin-wide one
+    upload("c2.txt")
+    res = client.get("/v1/folders/cached/docs", headers={**user, "If-None-Match": etag})
+    assert res.status_code == 200 and len(res.json()) == 2 and res.headers["ETag"] != etag
+    assert {"name": "cached", "count": 2} in client.get("/v1/folders", headers=user).json()
+    assert client.get("/v1/metrics", headers=admin).json()["docs_total"] == admin_total + 1
+    assert client.get("/v1/metrics", headers=user).json()["docs_total"] == 2
+
+
+LETTER = ("Dear customer, this letter confirms that invoice number 4471 for consulting services delivered "
+          "in March has been received by our accounts department. Payment of the outstanding balance is due "
+          "within thirty days of the statement date. Please quote the reference shown above on every transfer "
+          "so that our finance team can reconcile the remittance against your account without delay. Should "
+          "you have questions about the charges listed, contact the billing office during business hours. "
+          "Kind regards, Accounts Receivable, Northwind Trading Company")
+
+
+def test_near_duplicate_upload_modes_and_clusters(client):
+    from app.core.utils import new_id
+    token = base64.b64encode(json.dumps({"sub": new_id(), "email": "d@x.com", "role": "user"}).encode()).decode()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def upload(name, text, mode=None):
+        return client.post("/v1/docs", params={"dedupe": mode} if mode else None, headers=headers,
+                           data={"primaryTag": "letters"}, files={"file": (name, text.encode(), "text/plain")})
+
+    original = upload("letter.txt", LETTER).json()["_id"]
+    # an OCR re-scan: one word misread
+    rescan = LETTER.replace("remittance", "remittanse")
+
+    res = upload("rescan_1.txt", rescan, "reject")
+    assert res.status_code == 409 and original in res.text
+
+    flagged = upload("rescan_2.txt", rescan, "flag").json()
+    assert flagged["duplicate_of"] == original
+    linked = upload("rescan_3.txt", rescan, "link").json()
+    assert linked["duplicate_of"] == original
+    unrelated = upload("memo.txt", "Team lunch moved to Friday at noon, bring your own drinks please.", "reject")
+    assert unrelated.status_code == 200 and "duplicate_of" not in unrelated.json()
+
+    # a linked copy is found by its filename but has no body terms of its own
+    res = client.get("/v1/search", params={"q": "remittanse", "scope": "folder", "name": "letters"}, headers=headers)
+    assert {d["_id"] for d in res.json()["results"]} == {flagged["_id"]}
+
+    # a batch is checked against itself as well
+    lines = [json.dumps({"filename": f"nd_{i}.txt", "text": "Quarterly newsletter: new office opening in Leeds, "
+                         "welcome to our new hires, and a reminder about the security training deadline.",
+                         "primaryTag": "letters"}) for i in range(2)]
+    out = client.post("/v1/docs/batch", params={"dedupe": "reject"}, content="\n".join(lines).encode(),
+                      headers={**headers, "Content-Type": "application/x-ndjson"}).json()
+    assert [i["status"] for i in out["items"]] == ["created", "error"]
+    assert out["items"][1]["duplicate_of"] == out["items"][0]["id"]
+
+    listed = {d["_id"]: d for d in client.get("/v1/folders/letters/docs", headers=headers).json()}
+    assert listed[flagged["_id"]]["duplicate_of"] == original and "duplicate_of" not in listed[original]
+
+    res = client.get("/v1/folders/letters/duplicates", headers=headers)
+    assert res.status_code == 200
+    clusters = res.json()["clusters"]
+    assert len(clusters) == 1
+    assert [d["_id"] for d in clusters[0]["documents"]] == [original, flagged["_id"], linked["_id"]]
+    assert client.get("/v1/folders/letters/duplicates", params={"maxDistance": 9}, headers=headers).status_code == 422
+
+
+async def test_bodies_are_compressed_migrated_and_tiered(tmp_path, monkeypatch):
+    from app.db import db
+    from app.core import content
+    from app.core.content import ContentWriter, load_text, migrate_content, move_to_cold, read_samples
+    from app.core.utils import new_id
+    monkeypatch.setattr(content.cold_store, "root", str(tmp_path))
+    body = "statement of account, balance carried forward " * 200
+    new_doc, inline_doc, chunked_doc = new_id(), new_id(), new_id()
+
+    writer = ContentWriter(new_doc)
+    await writer.write(body)
+    fields = await writer.close(head="HEAD ")
+    assert "text_content" not in fields and fields["stored"] < fields["size"] // 10
+    new = {"_id": new_doc, **fields}
+    await db.documents.insert_one(dict(new))
+    assert await load_text(new) == "HEAD " + body
+
+    # written before compression: a long inline body and uncompressed chunks
+    await db.documents.insert_many([{"_id": inline_doc, "text_content": body},
+                                    {"_id": chunked_doc, "chunked": True, "chunks": 1}])
+    await db.document_chunks.insert_one({"_id": f"{chunked_doc}:0", "document_id": chunked_doc, "seq": 0,
+                                        "data": body})
+    await migrate_content()
+    for doc_id in (inline_doc, chunked_doc):
+        doc = await db.documents.find_one({"_id": doc_id})
+        assert "text_content" not in doc and await load_text(doc) == body
+        assert all("z" in c and "data" not in c for c in await db.document_chunks.find({"document_id": doc_id}).to_list(None))
+
+    assert await move_to_cold(new)
+    cold = await db.documents.find_one({"_id": new_doc})
+    assert cold["tier"] == "cold" and await db.document_chunks.count_documents({"document_id": new_doc}) == 0
+    assert await load_text(cold) == "HEAD " + body
+    assert (await read_samples([cold], 20))[new_doc] == ("HEAD " + body)[:20]
+
+
+async def test_demo_seed_is_explicit_and_runs_once(monkeypatch):
+    from app.config import settings
+    from app.db import db, get_client
+    from app.core import seed
+    from app.core.folders import list_folder_counts
+    from app.core.utils import new_id
+    # a database of its own, so the run-once marker and row counts start from nothing
+    name = f"seed_{new_id()[:8]}"
+    monkeypatch.setattr(settings, "DB_NAME", name)
+    try:
+        async def broken(*args, **kwargs):
+            raise RuntimeError("database unavailable")
+
+        # a failed seed releases its marker and can be run again
+        with monkeypatch.context() as m:
+            m.setattr(seed, "commit_documents", broken)
+            with pytest.raises(RuntimeError):
+                await seed.seed_demo()
+        assert await db.app_state.find_one({"_id": "demo_seed"}) is None
+
+        assert await seed.seed_demo() is True
+        assert await seed.seed_demo() is False
+        assert await db.users.count_documents({}) == 2
+        folders = {f["name"]: f["count"] for f in await list_folder_counts(seed.DEMO_USER)}
+        assert folders == {"invoices-2025": 1, "letters": 1}
+    finally:
+        await get_client().drop_database(name)
\ No newline at end of file
@@ -0,0 +1,47 @@
+import asyncio
+from app.core.indexes import INDEXES, _stages, ensure_indexes
+from app.core.utils import find_or_create_tag
+
+
+def test_tags_have_unique_owner_name_index():
+    specs = {m.document["name"]: m.document for m in INDEXES["tags"]}
+    assert specs["owner_name_unique"]["unique"] is True
+    assert list(specs["owner_name_unique"]["key"].keys()) == ["owner_id", "name"]
+
+
+def test_explain_stage_walk_finds_nested_collscan():
+    plan = {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]}}
+    assert _stages(plan) == {"FETCH", "OR", "IXSCAN", "COLLSCAN"}
+
+
+async def test_find_or_create_tag_is_idempotent():
+    await ensure_indexes()
+    tags = await asyncio.gather(*[find_or_create_tag("u_idx", "concurrent-tag") for _ in range(5)])
+    assert len({t["_id"] for t in tags}) == 1
+
+
+async def test_ensure_indexes_merges_duplicate_tags():
+    from datetime import datetime, timedelta
+    from app.db import db
+    from app.core.utils import new_id
+
+    await ensure_indexes()
+    # a database from before the unique index: the same folder created twice
+    await db.tags.drop_index("owner_name_unique")
+    owner, doc_a, doc_b = new_id(), new_id(), new_id()
+    old, dupe = new_id(), new_id()
+    now = datetime.utcnow()
+    await db.tags.insert_many([{"_id": old, "owner_id": owner, "name": "twice", "created_at": now - timedelta(days=1)},
+                               {"_id": dupe, "owner_id": owner, "name": "twice", "created_at": now}])
+    await db.document_tags.insert_many([
+        {"_id": new_id(), "document_id": doc_a, "tag_id": dupe, "is_primary": True},
+        {"_id": new_id(), "document_id": doc_b, "tag_id": old, "is_primary": True},
+        {"_id": new_id(), "document_id": doc_b, "tag_id": dupe, "is_primary": False},
+    ])
+
+    await ensure_indexes()
+    assert [t["_id"] async for t in db.tags.find({"owner_id": owner})] == [old]
+    links = await db.document_tags.find({"document_id": {"$in": [doc_a, doc_b]}}).to_list(None)
+    assert sorted((link["document_id"] == doc_a, link["tag_id"], link["is_primary"]) for link in links) == \
+        [(False, old, True), (True, old, True)]
+    assert "owner_name_unique" in await db.tags.index_information()
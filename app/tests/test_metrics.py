@@ -0,0 +1,47 @@
+import base64
+import json
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core import telemetry
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def _token(sub: str, role: str) -> str:
+    return base64.b64encode(json.dumps({"sub": sub, "email": f"{sub}@demo.com", "role": role}).encode()).decode()
+
+
+def test_server_timing_and_runtime_metrics(client):
+    user = {"Authorization": f"Bearer {_token('u_metrics', 'user')}"}
+    res = client.get("/v1/folders/invoices/docs", headers=user)
+    assert res.status_code == 200
+    timing = res.headers["server-timing"]
+    assert timing.startswith("app;dur=") and "db;dur=" in timing
+
+    # non-admins don't get the runtime metrics
+    assert client.get("/v1/metrics/runtime", headers=user).status_code == 403
+    res = client.get("/v1/metrics/runtime", headers={"Authorization": f"Bearer {_token('admin1', 'admin')}"})
+    assert res.status_code == 200 and res.headers["content-type"].startswith("text/plain")
+    # labelled by route template, not by the concrete path
+    assert 'docflow_http_requests_total{method="GET",route="/v1/folders/{tag}/docs",status="200"}' in res.text
+    assert 'route="/v1/folders/invoices/docs"' not in res.text
+
+
+def test_command_listener_attributes_commands_to_request():
+    stats = telemetry.RequestStats()
+    token = telemetry._current.set(stats)
+    try:
+        for name in ("find", "find", "insert"):
+            telemetry.command_listener.succeeded(SimpleNamespace(command_name=name, duration_micros=1500))
+    finally:
+        telemetry._current.reset(token)
+    # outside a request only the global counters move
+    telemetry.command_listener.failed(SimpleNamespace(command_name="insert", duration_micros=500))
+    assert stats.commands == 3 and abs(stats.db_seconds - 0.0045) < 1e-9
+    text = telemetry.render_prometheus()
+    assert 'docflow_mongo_command_failures_total{command="insert"} 1' in text
@@ -0,0 +1,102 @@
+import json
+import base64
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.search_index import tokenize, query_terms, term_counts, TermCounter
+import pytest
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture
+async def user_token():
+    return "eyJzdWIiOiAidV9kZW1vIiwgImVtYWlsIjogImRlbW9AZXhhbXBsZS5jb20iLCAicm9sZSI6ICJ1c2VyIn0="
+
+
+def test_tokenize_and_query_terms():
+    assert tokenize("Invoice #1001, Bank-transfer GST") == ["invoice", "1001", "bank", "transfer", "gst"]
+    assert tokenize(None) == []
+    assert query_terms("GST gst bank") == ["gst", "bank"]
+
+
+def test_search_uses_index_and_isolates_tenants(client, user_token):
+    files = {"file": ("zebra_memo.txt", b"quarterly zebrafish report", "text/plain")}
+    res = client.post("/v1/docs", data={"primaryTag": "memos"}, files=files,
+                      headers={"Authorization": f"Bearer {user_token}"})
+    assert res.status_code == 200
+    doc_id = res.json()["_id"]
+
+    res = client.get("/v1/search", params={"q": "zebrafish quarterly", "scope": "folder", "name": "memos"},
+                     headers={"Authorization": f"Bearer {user_token}"})
+    assert res.status_code == 200
+    assert any(d["_id"] == doc_id for d in res.json()["results"])
+    # same shape as DocOut (duplicate_of only on stored copies), bodies never leave the database
+    assert all({"_id", "filename", "created_at"} <= set(d) <= {"_id", "filename", "created_at", "duplicate_of"}
+               for d in res.json()["results"])
+
+    # filename tokens are indexed too
+    res = client.get("/v1/search", params={"q": "zebra", "scope": "files", "ids": [doc_id]},
+                     headers={"Authorization": f"Bearer {user_token}"})
+    assert res.json()["count"] == 1
+
+    other_token = base64.b64encode(json.dumps({
+        "sub": "other_user", "email": "x@demo.com", "role": "user"
+    }).encode()).decode()
+    res = client.get("/v1/search", params={"q": "zebrafish", "scope": "files", "ids": [doc_id]},
+                     headers={"Authorization": f"Bearer {other_token}"})
+    assert res.json()["count"] == 0
+
+
+def test_term_counter_matches_tokenize_across_pieces():
+    text = "Invoice #1001 bank-transfer GST " * 3
+    counter = TermCounter()
+    for i in range(0, len(text), 7):
+        counter.feed(text[i:i + 7])
+    assert counter.finish() == term_counts(text)
+
+
+def test_facets_intersect_secondary_tags(client):
+    from app.core.utils import new_id
+    token = base64.b64encode(json.dumps({"sub": new_id(), "email": "f@x.com", "role": "user"}).encode()).decode()
+    headers = {"Authorization": f"Bearer {token}"}
+    for i, secondary in enumerate([["tax", "2024"], ["tax", "2025"], ["2025"], []]):
+        res = client.post("/v1/docs", data={"primaryTag": "bills", "secondaryTags": secondary}, headers=headers,
+                          files={"file": (f"bill{i}.txt", b"electricity bill", "text/plain")})
+        assert res.status_code == 200
+    client.post("/v1/docs", data={"primaryTag": "other", "secondaryTags": ["tax"]}, headers=headers,
+                files={"file": ("o.txt", b"electricity", "text/plain")})
+
+    res = client.get("/v1/facets", params={"folder": "bills"}, headers=headers).json()
+    assert res["count"] == 4
+    assert res["facets"] == [{"name": "2025", "count": 2}, {"name": "tax", "count": 2}, {"name": "2024", "count": 1}]
+    res = client.get("/v1/facets", params={"folder": "bills", "tags": ["tax", "2025"]}, headers=headers).json()
+    assert res["count"] == 1 and res["results"][0]["filename"] == "bill1.txt"
+    # no folder: all of the owner's documents
+    assert client.get("/v1/facets", params={"tags": "tax"}, headers=headers).json()["count"] == 3
+
+    res = client.get("/v1/search", params={"q": "electricity", "scope": "folder", "name": "bills", "tags": "tax"},
+                     headers=headers).json()
+    assert sorted(d["filename"] for d in res["results"]) == ["bill0.txt", "bill1.txt"]
+    assert client.get("/v1/facets", params={"ownerId": "u_demo"}, headers=headers).status_code == 403
+
+
+async def test_rebuild_facets_matches_incremental_index():
+    from app.db import db
+    from app.core.facets import facet_cache, rebuild_facets
+    from app.core.ingest import commit_documents, stage_text
+    from app.core.utils import new_id
+    owner = new_id()
+    staged = [await stage_text(i, f"r{i}.txt", None, "bills", secondary, "water bill")
+              for i, secondary in enumerate([["tax", "2024"], ["tax"], ["2025"]])]
+    await commit_documents(owner, staged)
+    before = await facet_cache.get(owner)
+    expected = (before.select("bills", ["tax"]).bit_count(), before.facet_counts(before.select("bills")))
+    # a counter ahead of the rebuilt ordinals is left where it is
+    await db.doc_ordinals.update_one({"_id": owner}, {"$set": {"n": 100}})
+
+    assert await rebuild_facets(batch_size=2) >= 3
+    after = await facet_cache.get(owner)
+    assert (after.select("bills", ["tax"]).bit_count(), after.facet_counts(after.select("bills"))) == expected
+    assert expected[0] == 2
+    assert (await db.doc_ordinals.find_one({"_id": owner}))["n"] == 100
\ No newline at end of file
@@ -1,8 +1,13 @@
 
+import asyncio
 import json
+from datetime import datetime, timedelta
 import base64
+import httpx
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.ratelimit import DailyLimiter, ocr_task_limiter
+from app.db import db
 import pytest
 
 @pytest.fixture
@@ -53,4 +58,75 @@ def test_webhook_classification_and_rate_limit(client, user_token):
                     headers={"Authorization": f"Bearer {user_token}"})
     r = client.post("/v1/webhooks/ocr", json=ad_payload,
                     headers={"Authorization": f"Bearer {user_token}"})
-    assert r.json()["task_created"] is False
\ No newline at end of file
+    assert r.json()["task_created"] is False
+
+def test_ocr_batch_classifies_dedupes_and_rate_limits(client):
+    from app.core.utils import new_id
+    token = base64.b64encode(json.dumps({"sub": new_id(), "email": "o@x.com", "role": "user"}).encode()).decode()
+    headers = {"Authorization": f"Bearer {token}"}
+    ad = "Big SALE today, unsubscribe: mailto:stop@brand.com"
+    items = [{"source": "scan-b", "imageId": f"p{i}", "text": ad} for i in range(5)]
+    items += [
+        {"source": "scan-b", "imageId": "bill", "text": "Your bank statement is ready"},
+        {"source": "scan-b", "imageId": "p0", "text": ad},
+        {"source": "scan-b", "imageId": "empty", "text": ""},
+        {"imageId": "no-source"},
+    ]
+    res = client.post("/v1/webhooks/ocr/batch", json=items, headers=headers)
+    assert res.status_code == 200
+    j = res.json()
+    assert (j["processed"], j["duplicates"], j["failed"]) == (6, 1, 2)
+    by_index = {r["index"]: r for r in j["items"]}
+    # 3 tasks/day/source across the whole batch
+    assert [by_index[i]["task_created"] for i in range(5)] == [True, True, True, False, False]
+    assert by_index[5]["classification"] == "official"
+    assert by_index[6]["status"] == "duplicate" and by_index[6]["task"] == by_index[0]["task"]
+
+    # a retry (as NDJSON) is idempotent: same results, no new tasks
+    body = "\n".join(json.dumps(i) for i in items[:6]).encode()
+    res = client.post("/v1/webhooks/ocr/batch", content=body,
+                      headers={**headers, "Content-Type": "application/x-ndjson"})
+    j = res.json()
+    assert j["duplicates"] == 6 and j["processed"] == 0
+    assert [r["task"] for r in j["items"][:3]] == [by_index[i]["task"] for i in range(3)]
+
+
+async def test_task_rate_limit_holds_under_concurrent_webhooks():
+    from app.core.utils import new_id
+    user = new_id()
+    token = base64.b64encode(json.dumps({"sub": user, "email": "b@x.com", "role": "user"}).encode()).decode()
+    headers = {"Authorization": f"Bearer {token}"}
+    text = "Flash SALE, unsubscribe: mailto:stop@brand.com"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        responses = await asyncio.gather(*[
+            ac.post("/v1/webhooks/ocr", json={"source": "scan-burst", "imageId": f"b{i}", "text": text}, headers=headers)
+            for i in range(300)
+        ])
+    assert all(r.status_code == 200 for r in responses)
+    limit = ocr_task_limiter.limit_for("scan-burst")
+    assert sum(r.json()["task_created"] for r in responses) == limit
+    assert await db.tasks.count_documents({"user_id": user, "source": "scan-burst"}) == limit
+
+
+async def test_rate_limiter_reserves_partially_and_releases():
+    from app.core.utils import new_id
+    limiter, user = DailyLimiter("test", 3, {"big": 5}), new_id()
+    assert await limiter.reserve(user, "s", 2) == 2
+    assert await limiter.reserve(user, "s", 2) == 1
+    assert await limiter.reserve(user, "s") == 0
+    await limiter.release(user, "s", 1, at=datetime.utcnow())
+    assert await limiter.reserve(user, "s", 4) == 1
+    assert await limiter.reserve(user, "big", 9) == 5
+
+
+async def test_rate_limiter_releases_to_the_reserved_day():
+    from app.core.utils import new_id
+    limiter, user = DailyLimiter("test", 2), new_id()
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    assert await limiter.reserve(user, "s", 2, at=yesterday) == 2
+    assert await limiter.reserve(user, "s", 1) == 1
+    # handed back after midnight: yesterday's counter goes down, today's is untouched
+    await limiter.release(user, "s", 2, at=yesterday)
+    assert await limiter.reserve(user, "s", 2) == 1
+    assert await limiter.reserve(user, "s", 2, at=yesterday) == 2
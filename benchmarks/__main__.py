@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from app.config import settings
+from app import db as db_module
+
+# Benchmark suite runner. Seeds a synthetic corpus, then runs the endpoint, micro, auth,
+# classifier, serialization and cold-start benchmarks and writes one JSON document, so runs can be diffed across commits.
+#
+#   python -m benchmarks --backend memory --out bench.json        # in-memory stand-in (mongomock-motor)
+#   python -m benchmarks --backend mongo --out bench.json         # MONGO_URL, database docflow_bench (dropped first)
+#   python -m benchmarks --backend memory --compare bench.json    # run and diff against an earlier result
+
+SUITES = ("endpoints", "micro", "auth", "classifier", "serialize", "startup")
+LOWER_IS_BETTER = ("_us", "_ms")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _use_backend(backend: str, db_name: str) -> None:
+    settings.DB_NAME = db_name
+    if backend == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--backend memory needs mongomock-motor: pip install -r benchmarks/requirements.txt")
+        _substr_cp()
+        db_module.set_client(AsyncMongoMockClient())
+
+
+def _substr_cp() -> None:
+    # mongomock implements $substr by slicing the Python string, i.e. by code point, but not
+    # $substrCP (action context samples): route one to the other so actions_run is measured
+    from mongomock.aggregate import _Parser
+
+    handle = _Parser._handle_string_operator
+    if getattr(handle, "substr_cp", False):
+        return
+
+    def patched(self, operator, values):
+        return handle(self, "$substr" if operator == "$substrCP" else operator, values)
+
+    patched.substr_cp = True
+    _Parser._handle_string_operator = patched
+
+
+async def _seed_and_endpoints(args, results: dict) -> None:
+    from app.core.indexes import ensure_indexes
+    from benchmarks import bench_endpoints, corpus
+
+    if args.backend == "mongo" and not args.keep:
+        await db_module.get_client().drop_database(args.db)
+    await ensure_indexes()
+    start = time.perf_counter()
+    counts = await corpus.generate(users=args.users, docs_per_user=args.docs, large_every=args.large_every,
+                                   seed=args.seed)
+    results["corpus"] = {**counts, "seed_seconds": round(time.perf_counter() - start, 2)}
+    if "endpoints" in args.suites:
+        results["endpoints"] = await bench_endpoints.run(args.iterations, args.concurrency)
+    await db_module.close()
+
+
+def _flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}{key}"] = value
+    return out
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    # latency-style keys (_us/_ms) regress upwards, throughput (ops_per_s) downwards
+    cur, base = _flatten(current), _flatten(baseline)
+    regressions = []
+    for key in sorted(cur.keys() & base.keys()):
+        if not key.endswith(LOWER_IS_BETTER + ("ops_per_s",)) or key.startswith("corpus.") or not base[key]:
+            continue
+        change = (cur[key] - base[key]) / base[key]
+        worse = change > threshold if key.endswith(LOWER_IS_BETTER) else \
+            change < -threshold if key.endswith("ops_per_s") else False
+        flag = "REGRESSION" if worse else ""
+        print(f"{key:60} {base[key]:>12.3f} -> {cur[key]:>12.3f}  {change:+7.1%} {flag}")
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="DocFlow benchmark suite")
+    parser.add_argument("--backend", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--db", default="docflow_bench", help="database to seed (dropped first with --backend mongo)")
+    parser.add_argument("--keep", action="store_true", help="don't drop the benchmark database first")
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--docs", type=int, default=50, help="documents per user")
+    parser.add_argument("--large-every", type=int, default=0, help="every Nth document gets a chunked 300KB body")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    args = parser.parse_args(argv)
+    args.suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+
+    results = {"meta": {
+        "commit": _git_rev(), "at": datetime.utcnow().isoformat(), "python": platform.python_version(),
+        "platform": platform.platform(), "backend": args.backend,
+        "params": {k: getattr(args, k) for k in ("users", "docs", "large_every", "seed", "iterations", "concurrency")},
+    }}
+    _use_backend(args.backend, args.db)
+    asyncio.run(_seed_and_endpoints(args, results))
+    if "micro" in args.suites:
+        from benchmarks import bench_micro
+        results["micro"] = bench_micro.run()
+    if "auth" in args.suites:
+        from benchmarks import bench_auth
+        results["auth"] = bench_auth.run()
+    if "classifier" in args.suites:
+        from benchmarks import bench_classifier
+        results["classifier"] = bench_classifier.run()
+    if "serialize" in args.suites:
+        from benchmarks import bench_serialize
+        results["serialize"] = bench_serialize.run()
+    if "startup" in args.suites:
+        from benchmarks import bench_startup
+        results["startup"] = bench_startup.run(backend=args.backend, db_name=args.db)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
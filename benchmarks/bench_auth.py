@@ -0,0 +1,52 @@
+import base64
+import json
+import time
+from jose import jwt
+from app.config import settings
+from app.core.auth import resolve_token, token_cache
+from app.schemas import CurrentUser
+
+# Per-request auth cost: the previous per-request decode vs the cached resolver.
+# python -m benchmarks.bench_auth [iterations]
+
+
+def _legacy_resolve(token: str) -> CurrentUser:
+    # what every request used to do: decode and build the user from scratch
+    if token.count('.') == 2:
+        claims = jwt.get_unverified_claims(token)
+    else:
+        claims = json.loads(base64.b64decode(token).decode())
+    return CurrentUser(id=claims["sub"], email=claims["email"], role=claims["role"])
+
+
+def _per_call_us(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def _uncached(token: str):
+    def call():
+        token_cache.clear()
+        resolve_token(token)
+    return call
+
+
+def run(n: int = 20000) -> dict:
+    claims = {"sub": "u_bench", "email": "bench@example.com", "role": "user", "exp": int(time.time()) + 3600}
+    b64 = base64.b64encode(json.dumps(claims).encode()).decode()
+    settings.JWT_SECRET = settings.JWT_SECRET or "bench-secret"
+    signed = jwt.encode(claims, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHMS[0])
+
+    results = {}
+    for name, token in (("base64", b64), ("jwt", signed)):
+        results[f"{name}.legacy_unverified_us"] = _per_call_us(lambda: _legacy_resolve(token), n)
+        results[f"{name}.verify_us"] = _per_call_us(_uncached(token), max(n // 10, 1))
+        results[f"{name}.cached_us"] = _per_call_us(lambda: resolve_token(token), n)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000), indent=2))
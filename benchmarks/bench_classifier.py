@@ -0,0 +1,112 @@
+import json
+import random
+import re
+import time
+from app.core.classifier import Classifier, DEFAULT_TERMS, FINANCIAL_TERMS, PROMO_TERMS, _trie_pattern, normalize_terms
+
+# classify_text / extract_unsubscribe over synthetic multi-page OCR text: the previous
+# implementation vs the classifier engine, with the default and a large tenant term list.
+# Also the rejected single-pass alternatives: every category in one pattern with named
+# groups, and the unsubscribe pre-checks as one pattern instead of three find()s.
+# python -m benchmarks.bench_classifier [texts]
+
+WORDS = ("the of and to in for on with at by from your our this that please dear customer reference number "
+         "date page total amount due payment received thank you regards team service update notice").split()
+TAILS = ["", "mailto:stop@brand.example", "https://brand.example/unsubscribe?u=1", "contact stop@brand.example"]
+
+
+def corpus(n: int, pages: int = 3, seed: int = 7) -> list[str]:
+    # a third official, a third ads, a third with no category term; a quarter of them end
+    # in each kind of unsubscribe footer (or none)
+    rnd = random.Random(seed)
+    texts = []
+    for i in range(n):
+        words = [rnd.choice(WORDS) for _ in range(pages * 350)]
+        terms = (FINANCIAL_TERMS, PROMO_TERMS, None)[i % 3]
+        if terms:
+            words[rnd.randrange(len(words))] = rnd.choice(terms)
+        texts.append(" ".join(words).capitalize() + " " + TAILS[i % len(TAILS)])
+    return texts
+
+
+def _legacy(financial: list[str], promo: list[str]):
+    def classify(text: str) -> str:
+        t = (text or "").lower()
+        if any(w in t for w in financial):
+            return 'official'
+        if any(w in t for w in promo):
+            return 'ad'
+        return 'unknown'
+
+    def unsubscribe(text: str):
+        m = re.search(r'mailto:([^\s>]+)', text, flags=re.I)
+        if m:
+            return {"channel":"email","target":m.group(1)}
+        m = re.search(r'https?://[^\s>]+', text, flags=re.I)
+        if m:
+            return {"channel":"url","target":m.group(0)}
+        m = re.search(r'[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}', text, flags=re.I)
+        if m:
+            return {"channel":"email","target":m.group(0)}
+        return None
+    return classify, unsubscribe
+
+
+def _one_pass(terms: dict[str, list[str]]):
+    # one search finds the leftmost term of either category; an ad term first still needs
+    # a look for an official one after it, since earlier categories win
+    official = re.compile(_trie_pattern(normalize_terms(terms["official"])))
+    both = re.compile(f"(?P<official>{official.pattern})|(?P<ad>{_trie_pattern(normalize_terms(terms['ad']))})")
+
+    def classify(text: str) -> str:
+        t = (text or "").lower()
+        m = both.search(t)
+        if not m:
+            return 'unknown'
+        if m.lastgroup == "official" or official.search(t, m.start()):
+            return 'official'
+        return 'ad'
+    return classify
+
+
+PRECHECKS_RE = re.compile(r"(?P<mailto>mailto:)|(?P<http>http)|(?P<at>@)")
+
+
+def _per_text_us(fn, texts: list[str]) -> float:
+    start = time.perf_counter()
+    for t in texts:
+        fn(t)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+
+def run(n: int = 500) -> dict:
+    texts = corpus(n)
+    rnd = random.Random(11)
+    big = {
+        "official": FINANCIAL_TERMS + [f"ref{rnd.randrange(10**6):06d}" for _ in range(500)],
+        "ad": PROMO_TERMS + [f"promo{rnd.randrange(10**6):06d}" for _ in range(500)],
+    }
+    results = {"texts": n, "avg_chars": sum(map(len, texts)) // n}
+    for name, terms in (("default", DEFAULT_TERMS), ("tenant_1000_terms", big)):
+        classify, unsubscribe = _legacy(terms["official"], terms["ad"])
+        engine = Classifier(terms)
+        # same answers as before
+        assert all(engine.classify(t) == classify(t) for t in texts)
+        assert all(engine.unsubscribe(t) == unsubscribe(t) for t in texts)
+        results[f"{name}.classify.legacy_us"] = _per_text_us(classify, texts)
+        results[f"{name}.classify.engine_us"] = _per_text_us(engine.classify, texts)
+        one_pass = _one_pass(terms)
+        assert all(one_pass(t) == classify(t) for t in texts)
+        results[f"{name}.classify.one_pass_us"] = _per_text_us(one_pass, texts)
+        results[f"{name}.unsubscribe.legacy_us"] = _per_text_us(unsubscribe, texts)
+        results[f"{name}.unsubscribe.engine_us"] = _per_text_us(engine.unsubscribe, texts)
+    lowered = [t.lower() for t in texts]
+    results["unsubscribe.prechecks.find_us"] = _per_text_us(lambda t: (t.find("mailto:"), t.find("http"), t.find("@")),
+                                                            lowered)
+    results["unsubscribe.prechecks.one_pass_us"] = _per_text_us(PRECHECKS_RE.search, lowered)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(run(int(sys.argv[1]) if len(sys.argv) > 1 else 500), indent=2))
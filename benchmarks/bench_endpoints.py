@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+import httpx
+from app.main import app
+from benchmarks.corpus import token, user_id
+
+# Per-endpoint benchmarks, in-process over ASGI (no sockets, so the numbers are the app
+# and the database, not the HTTP stack). Run after benchmarks.corpus.generate().
+# Each endpoint is called `iterations` times with `concurrency` requests in flight.
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))] if values else 0.0
+
+
+async def _measure(make_request, iterations: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            res = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if res.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(iterations)])
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": iterations,
+        "errors": errors,
+        "ops_per_s": round(iterations / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(iterations: int = 200, concurrency: int = 8) -> dict:
+    uid = user_id(0)
+    user = {"Authorization": f"Bearer {token(uid)}"}
+    admin = {"Authorization": f"Bearer {token('admin_bench', 'admin')}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        folders = (await client.get("/v1/folders", headers=user)).json()
+        folder = max(folders, key=lambda f: f["count"])["name"] if folders else "invoices"
+        stamp = int(time.time() * 1000)
+        ad = "Limited time SALE on everything. To unsubscribe: mailto:stop@brand.example"
+
+        cases = {
+            "upload": lambda i: client.post(
+                "/v1/docs", data={"primaryTag": folder, "secondaryTags": ["bench"]}, headers=user,
+                files={"file": (f"bench_{i}.txt", f"Invoice {i} bank transfer account statement".encode() * 40,
+                                "text/plain")}),
+            "folders": lambda i: client.get("/v1/folders", headers=user),
+            "folder_docs": lambda i: client.get(f"/v1/folders/{folder}/docs", headers=user),
+            "search": lambda i: client.get("/v1/search", headers=user,
+                                           params={"q": "invoice bank", "scope": "folder", "name": folder}),
+            "actions_run": lambda i: client.post("/v1/actions/run", headers=user, json={
+                "scope": {"type": "folder", "name": folder}, "messages": [{"role": "user", "content": "csv"}],
+                "actions": ["make_csv"]}),
+            "ocr": lambda i: client.post("/v1/webhooks/ocr", headers=user, json={
+                "source": f"bench-{stamp}", "imageId": f"img-{i}", "text": ad}),
+            "ocr_batch_100": lambda i: client.post("/v1/webhooks/ocr/batch", headers=user, json=[
+                {"source": f"bench-batch-{stamp}", "imageId": f"img-{i}-{n}", "text": ad} for n in range(100)]),
+            "metrics": lambda i: client.get("/v1/metrics", headers=user),
+            "audit": lambda i: client.get("/v1/audit", headers=admin, params={"limit": 200}),
+            "audit_user": lambda i: client.get("/v1/audit", headers=admin, params={"userId": uid, "limit": 200}),
+        }
+        results = {}
+        for name, make_request in cases.items():
+            # batch endpoints do 100x the work per call
+            n = max(1, iterations // 20) if name.endswith("_100") or name == "actions_run" else iterations
+            try:
+                results[name] = await _measure(make_request, n, concurrency)
+            except NotImplementedError as e:
+                # the in-memory stand-in lacks a few server operators
+                results[name] = {"skipped": str(e)}
+        return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run()), indent=2))
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import random
+import time
+from app.core.content import _chunk_text, _encode_chunks
+from app.core.facets import PRIMARY, SECONDARY, OwnerFacets
+from app.core.search_index import term_counts
+from app.core.similarity import clusters, simhash, to_stored
+from app.core.utils import classify_text, extract_unsubscribe, mock_processor, naive_match
+from benchmarks.bench_classifier import corpus
+from benchmarks.corpus import text_of
+
+# Micro-benchmarks for the pure-Python hot spots, no database involved.
+# python -m benchmarks.bench_micro
+
+
+class _Sink:
+    # stands in for ContentWriter: keeps only the size of what was written
+    def __init__(self):
+        self.size = 0
+
+    async def write(self, text: str) -> None:
+        self.size += len(text)
+
+    async def close(self, head: str = "") -> dict:
+        return {"size": self.size + len(head)}
+
+
+def _per_call_us(fn, items: list, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (len(items) * repeat) * 1e6
+
+
+async def _processor_ms(docs: int, batch_size: int) -> float:
+    rnd = random.Random(5)
+    context = [{"id": f"d{i}", "title": f"doc_{i}.txt", "sample": text_of(rnd, 200)} for i in range(docs)]
+
+    async def batches():
+        for i in range(0, docs, batch_size):
+            yield context[i:i + batch_size]
+
+    scope = {"type": "folder", "name": "bench"}
+    start = time.perf_counter()
+    await mock_processor(scope, batches(), text_out=_Sink(), csv_out=_Sink())
+    return (time.perf_counter() - start) * 1000
+
+
+def _facets(docs: int = 100_000, folders: int = 8, tags: int = 50) -> dict:
+    # one tenant with `docs` documents, a primary folder each and 0-4 secondary tags
+    rnd = random.Random(9)
+    members: dict[tuple[str, str], list[int]] = {}
+    for o in range(docs):
+        members.setdefault((PRIMARY, f"f{rnd.randrange(folders)}"), []).append(o)
+        for t in rnd.sample(range(tags), rnd.randint(0, 4)):
+            members.setdefault((SECONDARY, f"t{t}"), []).append(o)
+    start = time.perf_counter()
+    index = OwnerFacets(0, members, {o: f"d{o}" for o in range(docs)})
+    build_ms = (time.perf_counter() - start) * 1000
+    queries = [(f"f{i % folders}", [f"t{i % tags}", f"t{(i * 7) % tags}"]) for i in range(200)]
+    bits = [index.select(*q) for q in queries]
+    return {
+        "facets_100k_build_ms": build_ms,
+        "facets_100k_select_us": _per_call_us(lambda q: index.select(*q), queries),
+        "facets_100k_counts_us": _per_call_us(index.facet_counts, bits[:20]),
+        "facets_100k_page_us": _per_call_us(lambda b: index.document_ids(b, 0, 50), bits[:20]),
+    }
+
+
+def _simhash(pages: list[str]) -> dict:
+    counts = [term_counts(p) for p in pages]
+    signatures = [{"_id": str(i), "simhash": to_stored(simhash(c))} for i, c in enumerate(counts) if c]
+    return {
+        "simhash_us": _per_call_us(simhash, counts),
+        "simhash_clusters_ms": _per_call_us(clusters, [signatures]) / 1000,
+    }
+
+
+def _content(chunk_chars: int = 256 * 1024) -> dict:
+    # one full content chunk of corpus text: compression cost, ratio, and a 200-char sample read
+    text = text_of(random.Random(5), chunk_chars)[:chunk_chars]
+    start = time.perf_counter()
+    row = _encode_chunks("d", 0, [text], "zlib")[0]
+    encode_ms = (time.perf_counter() - start) * 1000
+    return {
+        "content_256k_compress_ms": encode_ms,
+        "content_256k_ratio": len(text.encode()) / len(row["z"]),
+        "content_256k_decompress_ms": _per_call_us(_chunk_text, [row] * 5) / 1000,
+        "content_sample_us": _per_call_us(lambda r: _chunk_text(r, 200), [row] * 50),
+    }
+
+
+def run(texts: int = 300) -> dict:
+    pages = corpus(texts)
+    queries = [(t, q) for t, q in zip(pages, ["invoice", "bank transfer", "not-present", "Sale"] * len(pages))]
+    return {
+        "naive_match_us": _per_call_us(lambda tq: naive_match(*tq), queries),
+        "classify_text_us": _per_call_us(classify_text, pages),
+        "extract_unsubscribe_us": _per_call_us(extract_unsubscribe, pages),
+        "mock_processor_10k_docs_ms": asyncio.run(_processor_ms(10000, 500)),
+        **_facets(),
+        **_simhash(pages),
+        **_content(),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(run(int(sys.argv[1]) if len(sys.argv) > 1 else 300), indent=2))
@@ -0,0 +1,65 @@
+import json
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.core.fastjson import dumps
+from app.schemas import AuditOut, DocOut
+
+# Per-item cost of serializing large list responses: the model path (build models, then
+# FastAPI dumps and re-validates them against response_model and encodes with json) vs the
+# fast path (projected Mongo rows straight to orjson).
+# python -m benchmarks.bench_serialize [items]
+
+
+def _docs(n: int) -> list[dict]:
+    at = datetime(2025, 1, 1)
+    # as projected: `duplicate_of` only on stored copies (every tenth row here)
+    return [{"_id": f"d{i:08d}", "filename": f"invoice_{i}.txt", "created_at": at + timedelta(seconds=i),
+             **({"duplicate_of": f"d{i - 1:08d}"} if i % 10 == 9 else {})}
+            for i in range(n)]
+
+
+def _audits(n: int) -> list[dict]:
+    at = datetime(2025, 1, 1)
+    return [{"_id": f"a{i:08d}", "at": at + timedelta(seconds=i), "userId": "u_1", "action": "document.upload",
+             "entityType": "Document", "entityId": f"d{i:08d}", "metadata": {"filename": f"f{i}.txt", "primaryTag": "x"}}
+            for i in range(n)]
+
+
+def _model_path(model, rows: list[dict]) -> bytes:
+    adapter = TypeAdapter(list[model])
+    # what the routes used to do: models built in the handler ...
+    built = [model(**r) for r in rows]
+    # ... then FastAPI's response_model handling: dump, validate again, serialize
+    content = adapter.validate_python([m.model_dump(by_alias=True) for m in built])
+    data = jsonable_encoder(adapter.dump_python(content, mode="json", by_alias=True))
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def _per_item_us(fn, rows: list[dict], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def run(items: int = 10000) -> dict:
+    results = {}
+    for name, model, rows in (("docs", DocOut, _docs(items)), ("audit", AuditOut, _audits(items))):
+        # same documents either way; unset optional fields are absent on the fast path, null on the model path
+        parse = TypeAdapter(list[model]).validate_json
+        assert parse(_model_path(model, rows)) == parse(dumps(rows))
+        results[name] = {
+            "items": items,
+            "model_path_us": _per_item_us(lambda r: _model_path(model, r), rows),
+            "fast_path_us": _per_item_us(dumps, rows),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000), indent=2))
@@ -0,0 +1,76 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+# Cold start of one worker, each run in a fresh interpreter: importing app.main, the lifespan
+# startup, the first request (token, client and route state all cold) and the one after it,
+# and shutdown. Runs with and without STARTUP_ENSURE_INDEXES; medians are reported.
+# python -m benchmarks.bench_startup [runs] [memory|mongo]
+
+FIRST_PATH = "/v1/folders"
+
+
+async def _serve(app, token: str) -> dict:
+    import httpx
+
+    out = {}
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        out["startup_ms"] = (time.perf_counter() - start) * 1000
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for key in ("first_request_ms", "second_request_ms"):
+                start = time.perf_counter()
+                res = await client.get(FIRST_PATH, headers={"Authorization": f"Bearer {token}"})
+                out[key] = (time.perf_counter() - start) * 1000
+                res.raise_for_status()
+        start = time.perf_counter()
+    out["shutdown_ms"] = (time.perf_counter() - start) * 1000
+    return out
+
+
+def _child(backend: str) -> None:
+    import asyncio
+
+    start = time.perf_counter()
+    from app.main import app
+    import_ms = (time.perf_counter() - start) * 1000
+    from app import db as db_module
+    from app.core.seed import demo_tokens
+    if backend == "memory":
+        from mongomock_motor import AsyncMongoMockClient
+        db_module.set_client(AsyncMongoMockClient())
+    out = asyncio.run(_serve(app, demo_tokens()["user"]))
+    print(json.dumps({"import_ms": import_ms, **out}))
+
+
+def _spawn(backend: str, ensure_indexes: bool, db_name: Optional[str]) -> dict:
+    env = {**os.environ, "STARTUP_ENSURE_INDEXES": "1" if ensure_indexes else "0"}
+    if db_name:
+        env["DB_NAME"] = db_name
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", backend],
+                          env=env, capture_output=True, text=True, check=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    return {**json.loads(proc.stdout.strip().splitlines()[-1]), "process_ms": process_ms}
+
+
+def run(runs: int = 5, backend: str = "memory", db_name: Optional[str] = None) -> dict:
+    results = {}
+    for ensure_indexes, suffix in ((True, ""), (False, "_skip_indexes")):
+        samples = [_spawn(backend, ensure_indexes, db_name) for _ in range(runs)]
+        for key in samples[0]:
+            results[key.replace("_ms", f"{suffix}_ms")] = statistics.median(s[key] for s in samples)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(sys.argv[2])
+    else:
+        print(json.dumps(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+                             sys.argv[2] if len(sys.argv) > 2 else "memory"), indent=2))
@@ -0,0 +1,95 @@
+import base64
+import json
+import math
+import random
+from datetime import datetime, timedelta
+from app.db import db
+from app.core.audit_store import insert_entries
+from app.core.classifier import FINANCIAL_TERMS, PROMO_TERMS
+from app.core.ingest import commit_documents, stage_text
+from app.core.usage import backfill_rollups
+from app.core.utils import audit_entry, new_id
+
+# Deterministic synthetic corpus: N users, each with folders, documents of realistic size
+# (log-normal around ~2KB, plus the odd large body that gets chunked), and a history of
+# usage, audit entries and tasks spread over the past `history_days`.
+# Documents go through the normal ingest path, so postings, folder counts and audits exist.
+
+FOLDERS = ["invoices", "statements", "letters", "receipts", "contracts", "promotions", "tax", "misc"]
+FILLER = ("the of and to in for on with at by from your our this that please dear customer reference number date "
+          "page total amount due payment received thank you regards team service update notice order delivery "
+          "address phone balance period summary details attached review").split()
+
+
+def user_id(i: int) -> str:
+    return f"u_bench_{i:04d}"
+
+
+def token(uid: str, role: str = "user") -> str:
+    return base64.b64encode(json.dumps({"sub": uid, "email": f"{uid}@bench.example", "role": role}).encode()).decode()
+
+
+def text_of(rnd: random.Random, chars: int) -> str:
+    words, size = [], 0
+    while size < chars:
+        r = rnd.random()
+        word = rnd.choice(FINANCIAL_TERMS) if r < 0.02 else rnd.choice(PROMO_TERMS) if r < 0.03 else rnd.choice(FILLER)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def doc_size(rnd: random.Random, large_every: int, i: int) -> int:
+    if large_every and i % large_every == large_every - 1:
+        return 300 * 1024
+    return min(64 * 1024, max(80, int(rnd.lognormvariate(math.log(2000), 0.9))))
+
+
+async def generate(users: int = 10, docs_per_user: int = 50, history_days: int = 60, large_every: int = 0,
+                   seed: int = 42, batch: int = 100) -> dict:
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    counts = {"users": users, "documents": 0, "usages": 0, "audits": 0, "tasks": 0}
+    for u in range(users):
+        uid = user_id(u)
+        folders = rnd.sample(FOLDERS, 4)
+        staged = []
+        for i in range(docs_per_user):
+            secondary = rnd.sample([f for f in FOLDERS if f != folders[i % 4]], rnd.randint(0, 2))
+            staged.append(await stage_text(len(staged), f"{folders[i % 4]}_{i}.txt", "text/plain", folders[i % 4],
+                                           secondary, text_of(rnd, doc_size(rnd, large_every, i))))
+            if len(staged) >= batch:
+                docs, _ = await commit_documents(uid, staged)
+                counts["documents"] += len(docs)
+                staged = []
+        if staged:
+            docs, _ = await commit_documents(uid, staged)
+            counts["documents"] += len(docs)
+
+        # history, backdated across the window
+        def at() -> datetime:
+            return now - timedelta(seconds=rnd.randrange(max(1, history_days * 86400)))
+
+        usages = [{"_id": new_id(), "user_id": uid, "credits": 5, "at": at(), "kind": "actions_run"}
+                  for _ in range(rnd.randint(5, 30))]
+        await db.usages.insert_many(usages)
+        counts["usages"] += len(usages)
+
+        audits = []
+        for _ in range(rnd.randint(50, 200)):
+            entry = audit_entry(uid, rnd.choice(["doc.create", "action.run", "webhook.ocr.ingest", "task.create"]),
+                                rnd.choice(["Document", "Action", "WebhookEvent", "Task"]), new_id())
+            entry["at"] = at()
+            audits.append(entry)
+        await insert_entries(audits)
+        counts["audits"] += len(audits)
+
+        tasks = [{"_id": new_id(), "user_id": uid, "status": "pending", "channel": "email",
+                  "target": f"stop{n}@brand.example", "source": f"scanner-{rnd.randint(1, 3):02d}", "at": at()}
+                 for n in range(rnd.randint(0, 20))]
+        if tasks:
+            await db.tasks.insert_many(tasks)
+        counts["tasks"] += len(tasks)
+
+    await backfill_rollups()
+    return counts
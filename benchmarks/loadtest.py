@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import httpx
+
+# Closed-loop load test: `concurrency` clients hit a mix of endpoints for `duration` seconds
+# and we report requests/second and p50/p99 latency per endpoint.
+#
+#   python -m benchmarks.loadtest --url http://127.0.0.1:8000          # against a running server
+#   python -m benchmarks.loadtest --workers 1,2,4 --concurrency 64     # start gunicorn per worker count
+#
+# Needs a reachable MongoDB (MONGO_URL) and the dev token mode (AUTH_ALLOW_UNSIGNED=1),
+# or pass --token.
+
+DEFAULT_TOKEN = base64.b64encode(json.dumps(
+    {"sub": "u_load", "email": "load@example.com", "role": "user"}).encode()).decode()
+
+
+def endpoints(run_id: str) -> list[tuple[str, str, str, dict]]:
+    # (name, method, path, request kwargs); OCR image ids are unique per request
+    return [
+        ("GET /v1/folders", "GET", "/v1/folders", {}),
+        ("GET /v1/folders/{tag}/docs", "GET", "/v1/folders/load-invoices/docs", {}),
+        ("GET /v1/search", "GET", "/v1/search", {"params": {"q": "invoice bank", "scope": "folder",
+                                                            "name": "load-invoices"}}),
+        ("GET /v1/metrics", "GET", "/v1/metrics", {}),
+        ("POST /v1/webhooks/ocr", "POST", "/v1/webhooks/ocr",
+         {"json": {"source": f"load-{run_id}", "text": "Statement from your bank, account summary"}}),
+    ]
+
+
+async def _prepare(client: httpx.AsyncClient, docs: int) -> None:
+    for i in range(docs):
+        files = {"file": (f"load_{i}.txt", f"Invoice {i} bank transfer GST account".encode(), "text/plain")}
+        res = await client.post("/v1/docs", data={"primaryTag": "load-invoices"}, files=files)
+        res.raise_for_status()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def run_load(url: str, token: str, concurrency: int, duration: float, prepare_docs: int = 20) -> dict:
+    run_id = str(int(time.time() * 1000))
+    targets = endpoints(run_id)
+    latencies: dict[str, list[float]] = {name: [] for name, *_ in targets}
+    errors: dict[str, int] = {name: 0 for name, *_ in targets}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers={"Authorization": f"Bearer {token}"}, limits=limits,
+                                 timeout=30) as client:
+        await _prepare(client, prepare_docs)
+        deadline = time.perf_counter() + duration
+        counter = 0
+
+        async def worker(offset: int) -> None:
+            nonlocal counter
+            i = offset
+            while time.perf_counter() < deadline:
+                name, method, path, kwargs = targets[i % len(targets)]
+                i += 1
+                if method == "POST":
+                    counter += 1
+                    kwargs = {"json": {**kwargs["json"], "imageId": f"img-{counter}"}}
+                start = time.perf_counter()
+                try:
+                    res = await client.request(method, path, **kwargs)
+                    ok = res.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[name].append(time.perf_counter() - start)
+                else:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    report = {}
+    for name, values in latencies.items():
+        report[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(_percentile(values, 50) * 1000, 2),
+            "p99_ms": round(_percentile(values, 99) * 1000, 2),
+        }
+    total = sum(len(v) for v in latencies.values())
+    report["total"] = {"requests": total, "errors": sum(errors.values()), "rps": round(total / elapsed, 1),
+                       "p99_ms": round(_percentile([x for v in latencies.values() for x in v], 99) * 1000, 2)}
+    return report
+
+
+async def _wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get("/openapi.json")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.25)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def run_with_workers(worker_counts: list[int], port: int, token: str, concurrency: int, duration: float) -> dict:
+    url = f"http://127.0.0.1:{port}"
+    results = {}
+    for n in worker_counts:
+        env = {**os.environ, "WEB_CONCURRENCY": str(n), "BIND": f"127.0.0.1:{port}", "ACCESS_LOG": ""}
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            asyncio.run(_wait_ready(url))
+            results[f"workers={n}"] = asyncio.run(run_load(url, token, concurrency, duration))
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--url", help="target a running server instead of starting gunicorn")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated gunicorn worker counts")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--token", default=DEFAULT_TOKEN)
+    args = parser.parse_args(argv)
+    if args.url:
+        results = asyncio.run(run_load(args.url, args.token, args.concurrency, args.duration))
+    else:
+        counts = [int(n) for n in args.workers.split(",") if n.strip()]
+        results = run_with_workers(counts, args.port, args.token, args.concurrency, args.duration)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
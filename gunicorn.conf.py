@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+# Production serving profile: gunicorn supervises N uvicorn workers, one event loop and
+# one Motor client per worker (created in the app lifespan, after the fork).
+#   gunicorn -c gunicorn.conf.py app.main:app
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+# don't import the app in the master: every worker builds its own client and background tasks
+preload_app = False
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# recycle workers now and then so slow leaks can't accumulate; jitter avoids restarting all at once
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+loglevel = os.getenv("LOG_LEVEL", "info")